@@ -0,0 +1,85 @@
+# Copyright © 2020 Hashmap, Inc
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+"""
+Micro-benchmark of the cost of a state transition in the StateManager.
+
+Compares the git SHA lookup every transition used to make - two git.Repo scans and rev-parse calls, one to build the
+state and one to write it - with a transition using the SHA resolved once per process. Both are measured: the uncached
+transitions drop the SHA resolved for the process and resolve it again twice before each insert and update. Transitions
+are buffered with write_behind and never flushed, so no database time is included.
+
+Run from the repository root, with hdm installed: python demos/state_manager_benchmark.py
+"""
+import os
+import timeit
+
+import git
+
+from hdm.core.state_management.sqlite_state_manager import SqLiteStateManager
+from hdm.core.state_management.state_manager import StateManager
+
+os.environ['HDM_HOME'] = os.path.abspath(os.path.join(os.path.dirname(__file__), '../tests/test_assets'))
+os.environ['HDM_ENV'] = 'unit-test'
+# The SHA is looked up in the repository, not read from the environment
+os.environ.pop('HDM_GIT_SHA', None)
+
+TRANSITIONS = 2000
+
+
+def git_sha_lookup() -> str:
+    repo = git.Repo(search_parent_directories=True)
+    return repo.git.rev_parse(repo.head.object.hexsha, short=True)
+
+
+def resolve_uncached(state_manager: StateManager) -> None:
+    """
+    Look the SHA up as every transition used to, once to build the state and once to write it.
+    """
+    for _ in range(2):
+        StateManager._StateManager__process_git_sha = None
+        state_manager._git_sha = state_manager._resolve_git_sha()
+    # the SHA is cached with the columns that are the same for every state
+    state_manager._StateManager__invariant_values = None
+
+
+def transition(state_manager: StateManager, uncached: bool = False) -> None:
+    if uncached:
+        resolve_uncached(state_manager)
+    state = state_manager.insert_state(source_entity='benchmark.csv', source_filter=[{'seq': '1'}],
+                                       action='sourcing pre-pull', status='in_progress')
+    if uncached:
+        resolve_uncached(state_manager)
+    state_manager.update_state(source_entity='benchmark.csv', source_filter=[{'seq': '1'}],
+                               action='sourcing post-pull', state_id=state['state_id'], status='success',
+                               record_count=200)
+
+
+if __name__ == "__main__":
+    state_manager = SqLiteStateManager(connection='state-manager-sqlite', write_behind=True,
+                                       flush_size=TRANSITIONS * 2, flush_interval=3600)
+    state_manager.job_id = StateManager.generate_id()
+    state_manager.source = {'name': 'benchmark_source', 'type': 'FSSource'}
+    state_manager.sink = {'name': 'benchmark_sink', 'type': 'FSSink'}
+
+    lookups = 50
+    lookup = timeit.timeit(git_sha_lookup, number=lookups) / lookups
+    # Each git lookup takes milliseconds, so fewer uncached transitions are enough
+    uncached_transitions = TRANSITIONS // 20
+    uncached = timeit.timeit(lambda: transition(state_manager, uncached=True),
+                             number=uncached_transitions) / (uncached_transitions * 2)
+    cached = timeit.timeit(lambda: transition(state_manager), number=TRANSITIONS) / (TRANSITIONS * 2)
+
+    print(f"{'git SHA lookup:':<42}{lookup * 1e6:10.1f} us")
+    print(f"{'per transition, SHA looked up twice:':<42}{uncached * 1e6:10.1f} us")
+    print(f"{'per transition, SHA resolved per process:':<42}{cached * 1e6:10.1f} us")
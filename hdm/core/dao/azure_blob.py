@@ -11,9 +11,12 @@
 # WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
 # See the License for the specific language governing permissions and
 # limitations under the License.
+import threading
+
 import azure
-from azure.storage.blob import BlobServiceClient
-from contextlib import contextmanager
+import requests
+from azure.core.pipeline.transport import RequestsTransport
+from azure.storage.blob import BlobServiceClient, ContainerClient
 import yaml
 
 from hdm.core.dao.object_store_dao import ObjectStoreDAO
@@ -21,14 +24,50 @@ from hdm.core.utils.project_config import ProjectConfig
 
 
 class AzureBLOB(ObjectStoreDAO):
+    """
+    Azure blob storage DAO
+
+    Clients are created once per process for each connection, from a profile read once, and all share one HTTP
+    transport - one pool of connections to the storage accounts - so a blob operation costs a request, not a TLS
+    handshake. The container of a connection is checked, and created when missing, once per process.
+    Closing a client, e.g. by using it as a context manager, leaves the shared transport open.
+    """
+    # Connections kept open to each storage account
+    POOL_SIZE = 32
+
+    # (connection name, block size, single put size) -> (client, container name of the profile)
+    __clients = {}
+    # (connection name, container name) of the containers known to exist
+    __containers = set()
+    __transport = None
+    __lock = threading.Lock()
 
     def __init__(self, **kwargs):
+        """
+        Args:
+            **kwargs:
+                connection: section name in hdm profile yml file for connection information
+                container: container name | default container_name of the profile
+                max_block_size: size in bytes of the blocks a large blob is uploaded in | default azure's
+                max_single_put_size: size in bytes up to which a blob is uploaded in a single request | default azure's
+        """
         super().__init__(**kwargs)
-        self._container = None
+        self._container = kwargs.get('container')
+        # Transfer settings are settings of the client, clients with other settings are separate clients
+        self.__client_settings = {name: kwargs[name] for name in ('max_block_size', 'max_single_put_size')
+                                  if kwargs.get(name)}
+
+    @property
+    def container(self) -> ContainerClient:
+        """
+        Client of the container, checked to exist.
+        """
+        return self._get_connection().get_container_client(self._container)
 
-    def _get_connection(self):
+    def _get_connection(self) -> BlobServiceClient:
         """
-        Obtain a context managed azure connection
+        Obtain the azure connection - the blob service client shared by the process - with the container checked to
+        exist
 
         Returns: azure connection
 
@@ -36,14 +75,42 @@ class AzureBLOB(ObjectStoreDAO):
             ConnectionError: azure connection could not be established
 
         """
-        with open(f"{ProjectConfig.hdm_home()}/{ProjectConfig.profile_path()}", 'r') as stream:
-            conn_conf = yaml.safe_load(stream)[ProjectConfig.hdm_env()][self._connection_name]
-
-        self._container = conn_conf['container_name']
-        connection = BlobServiceClient(account_url=conn_conf['url'], credential=conn_conf['sas'])
-        self._test_blob_container_existence(connection)
+        key = (self._connection_name, self.__client_settings.get('max_block_size'),
+               self.__client_settings.get('max_single_put_size'))
+        with AzureBLOB.__lock:
+            if key not in AzureBLOB.__clients:
+                with open(f"{ProjectConfig.hdm_home()}/{ProjectConfig.profile_path()}", 'r') as stream:
+                    conn_conf = yaml.safe_load(stream)[ProjectConfig.hdm_env()][self._connection_name]
+
+                # An account key, e.g. of the Azurite emulator, in place of a sas token
+                credential = conn_conf['account_key'] if conn_conf.get('account_key') else conn_conf['sas']
+                connection = BlobServiceClient(account_url=conn_conf['url'], credential=credential,
+                                               transport=self.__get_transport(), **self.__client_settings)
+                AzureBLOB.__clients[key] = (connection, conn_conf['container_name'])
+            connection, container = AzureBLOB.__clients[key]
+
+        if not self._container:
+            self._container = container
+        if (self._connection_name, self._container) not in AzureBLOB.__containers:
+            self._test_blob_container_existence(connection)
+            with AzureBLOB.__lock:
+                AzureBLOB.__containers.add((self._connection_name, self._container))
         return connection
 
+    @classmethod
+    def __get_transport(cls) -> RequestsTransport:
+        """
+        HTTP transport shared by all the clients. Called with the lock held.
+        """
+        if not AzureBLOB.__transport:
+            session = requests.Session()
+            adapter = requests.adapters.HTTPAdapter(pool_connections=cls.POOL_SIZE, pool_maxsize=cls.POOL_SIZE)
+            session.mount('https://', adapter)
+            session.mount('http://', adapter)
+            # Not owned - a client closing its transport leaves the session, and its pool, open for the others
+            AzureBLOB.__transport = RequestsTransport(session=session, session_owner=False)
+        return AzureBLOB.__transport
+
     def _test_connection(self, connection) -> bool:
         """
         Validate that the connection is valid to azure blob storage account
@@ -64,7 +131,7 @@ class AzureBLOB(ObjectStoreDAO):
 
     def _test_blob_container_existence(self, connection) -> bool:
         """
-        check if blob container exists
+        check if blob container exists, and create it if it does not
 
         Returns: True if container is exists, False otherwise
 
@@ -74,7 +141,8 @@ class AzureBLOB(ObjectStoreDAO):
 
         try:
             # Throws exception if container not available
-            return bool(connection.get_container_client(self._container))
+            connection.get_container_client(self._container).get_container_properties()
+            return True
 
         except azure.core.exceptions.ResourceNotFoundError:
             self._create_blob_container(connection)
@@ -87,7 +155,11 @@ class AzureBLOB(ObjectStoreDAO):
         Returns:
 
         """
-        connection.create_container(self._container)
+        try:
+            connection.create_container(self._container)
+        except azure.core.exceptions.ResourceExistsError:
+            # created by another process since it was checked
+            pass
 
     def _validate_configuration(self) -> bool:
         # TODO
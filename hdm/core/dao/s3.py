@@ -37,7 +37,7 @@ class S3(ObjectStoreDAO):
             region_name
         """
         with open(f"{ProjectConfig.hdm_home()}/{ProjectConfig.profile_path()}", 'r') as stream:
-            conn_conf = yaml.safe_load(stream)[ProjectConfig.hdm_env()][kwargs.get('connection')]
+            conn_conf = yaml.safe_load(stream)[ProjectConfig.hdm_env()][self._connection_name]
 
         # TODO - Validation needed for all the correct keys present or not
         if 'profile' in conn_conf.keys():
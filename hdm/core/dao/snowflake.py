@@ -11,24 +11,145 @@
 # WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
 # See the License for the specific language governing permissions and
 # limitations under the License.
+import atexit
+import threading
 import time
 import traceback
+from collections import deque
+from contextlib import contextmanager
+
 import yaml
 import snowflake.connector as connector
-from contextlib import contextmanager
 
 from hdm.core.dao.db_dao import DBDAO
 from hdm.core.utils.project_config import ProjectConfig
 
 
 class Snowflake(DBDAO):
+    """
+    Snowflake DAO
+
+    Sessions are pooled per connection for the life of the process, from a profile read once. A session is taken from
+    the pool by the connection context manager and put back when it exits, instead of being closed, and is kept alive
+    while idle (client_session_keep_alive). A session is only checked, with a SELECT 1, when it is taken after being
+    idle for HEALTH_CHECK_IDLE seconds - a session that fails the check is closed and replaced. The idle sessions are
+    closed when the process exits.
+    """
+    # Seconds a session may be idle before it is checked when taken from the pool
+    HEALTH_CHECK_IDLE = 300
+    # Most idle sessions kept per connection, sessions put back beyond it are closed
+    MAX_IDLE = 8
+
+    # connection name -> idle sessions, as (session, time it was put back), most recently put back last
+    __pools = {}
+    # connection name -> profile of the connection
+    __profiles = {}
+    __lock = threading.Lock()
 
     def _create_engine(self):
         super()._create_engine()
 
+    @property
+    def connection(self):
+        """
+        Context managed session from the pool of the process. On exit the transaction is committed, or rolled back on
+        an error, as it is by a snowflake connection, and the session is put back in the pool.
+        """
+        return self.__checkout()
+
+    @contextmanager
+    def __checkout(self):
+        connection = self.__take()
+        try:
+            self._on_checkout(connection)
+            yield connection
+        except BaseException:
+            self.__put_back(connection, commit=False)
+            raise
+        self.__put_back(connection, commit=True)
+
+    def _on_checkout(self, connection) -> None:
+        """
+        Called with every session taken from the pool, before it is used. Nothing to do by default.
+        """
+        pass
+
+    def __take(self):
+        """
+        Take an idle session of the connection from the pool, or open one.
+        """
+        while True:
+            with Snowflake.__lock:
+                idle = Snowflake.__pools.get(self._connection_name)
+                if not idle:
+                    break
+                connection, put_back_on = idle.pop()
+
+            if connection.is_closed():
+                continue
+            if time.monotonic() - put_back_on < self.HEALTH_CHECK_IDLE:
+                return connection
+            try:
+                if self._test_connection(connection):
+                    return connection
+            except Exception:
+                self._logger.warning("Idle Snowflake session of %s failed its check, replaced", self._connection_name)
+            self.__close(connection)
+
+        return self._get_connection()
+
+    def __put_back(self, connection, commit: bool) -> None:
+        """
+        End the transaction of a session and put it back in the pool. A session that can not end it is closed.
+        """
+        try:
+            if connection.is_closed():
+                return
+            # as on exit of a snowflake connection
+            if not connection._session_parameters.get("AUTOCOMMIT", False):
+                connection.commit() if commit else connection.rollback()
+        except Exception:
+            self._logger.warning("Snowflake session of %s closed: %s", self._connection_name, traceback.format_exc())
+            self.__close(connection)
+            return
+
+        with Snowflake.__lock:
+            idle = Snowflake.__pools.setdefault(self._connection_name, deque())
+            if len(idle) < self.MAX_IDLE:
+                idle.append((connection, time.monotonic()))
+                return
+        self.__close(connection)
+
+    @classmethod
+    def _close_pools(cls) -> None:
+        """
+        Close the idle sessions of every connection, emptying the pools. Registered to run when the process exits.
+        """
+        with Snowflake.__lock:
+            pools = list(Snowflake.__pools.values())
+            Snowflake.__pools.clear()
+        for idle in pools:
+            for connection, _ in idle:
+                Snowflake.__close(connection)
+
+    @staticmethod
+    def __close(connection) -> None:
+        try:
+            connection.close()
+        except Exception:
+            pass
+
+    def __get_profile(self) -> dict:
+        with Snowflake.__lock:
+            if self._connection_name not in Snowflake.__profiles:
+                with open(f"{ProjectConfig.hdm_home()}/{ProjectConfig.profile_path()}", 'r') as stream:
+                    Snowflake.__profiles[self._connection_name] = \
+                        yaml.safe_load(stream)[ProjectConfig.hdm_env()][self._connection_name]
+            return Snowflake.__profiles[self._connection_name]
+
     def _get_connection(self):
         """
-        Obtain a context managed snowflake connection
+        Open a snowflake session
 
         Returns: Snowflake connection
 
@@ -36,14 +157,13 @@ class Snowflake(DBDAO):
             ConnectionError: Snowflake connection could not be established
 
         """
-        # Check if connection is valid, and if it isn't, then attempt create it with exponential fall of up to 3 times.
+        # Attempt to create the connection with exponential fall of up to 3 times.
         connection_invalid = True
         connection_attempt_count = 0
         timeout = self._timeout
         connection = None
 
-        with open(f"{ProjectConfig.hdm_home()}/{ProjectConfig.profile_path()}", 'r') as stream:
-            conn_conf = yaml.safe_load(stream)[ProjectConfig.hdm_env()][self._connection_name]
+        conn_conf = self.__get_profile()
 
         while connection_attempt_count < self._max_attempts:
             try:
@@ -56,16 +176,13 @@ class Snowflake(DBDAO):
                     database=conn_conf['database'],
                     schema=conn_conf['schema'],
                     role=conn_conf['role'],
-                    login_timeout=1
+                    login_timeout=conn_conf.get('login_timeout', 60),
+                    # Heartbeats keep an idle pooled session from expiring
+                    client_session_keep_alive=True
                 )
-                # If your connection is valid, then set it so and break from while loop
-                if self._test_connection(connection):
-                    connection_invalid = False
-                    break
-                # Otherwise, you must put program to sleep, wait for next time to obtain connection and carry on.
-                connection_attempt_count = self.__sleep_and_increment_counter(timeout,
-                                                                              connection_attempt_count,
-                                                                              connection_invalid)
+                # A session just opened is valid - it is checked when taken from the pool after being idle.
+                connection_invalid = False
+                break
 
             except Exception:
                 connection_attempt_count, connection_invalid = self.__manage_exception(timeout,
@@ -99,7 +216,8 @@ class Snowflake(DBDAO):
             error_message = f'While attempting to connect to Snowflake the follow error was encountered: ' \
                             f'{traceback.format_exc()}'
             self._logger.error(error_message)
-            connection_attempt_count = self.__sleep_and_increment_counter(timeout, connection_attempt_count, connection_invalid)
+            _, connection_attempt_count = self.__sleep_and_increment_counter(timeout, connection_attempt_count,
+                                                                             connection_invalid)
         else:
             connection_invalid = True
         return connection_attempt_count, connection_invalid
@@ -114,3 +232,6 @@ class Snowflake(DBDAO):
     def _validate_configuration(self) -> bool:
         # TODO
         return True
+
+
+atexit.register(Snowflake._close_pools)
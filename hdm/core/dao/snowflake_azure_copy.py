@@ -12,23 +12,24 @@
 # See the License for the specific language governing permissions and
 # limitations under the License.
 from hdm.core.dao.snowflake_copy import SnowflakeCopy
-from hdm.core.utils.project_config import ProjectConfig
-import yaml
 
 
 class SnowflakeAzureCopy(SnowflakeCopy):
+    """
+    Snowflake DAO loading from a stage on an azure blob container. The url and sas of the container are those of the
+    stage_env section of the hdm profile | default azure.
+    """
+    _DEFAULT_STAGE_ENV = 'azure'
 
     def _create_stage(self, stage_name, source_directory, connection):
-        # TODO: Check with John. How to get azure connection info- hardcoded below? Manefist or profile yml
-        with open(f"{ProjectConfig.hdm_home()}/{ProjectConfig.profile_path()}", 'r') as stream:
-            conn_conf = yaml.safe_load(stream)[ProjectConfig.hdm_env()]['azure'] # Fai: Pull from manifest "azure_env" the azure env name here instead of hardcode
+        conn_conf = self._get_stage_profile()
 
-        url = conn_conf['url'].replace("https","azure") + self._stage_directory
-        self.__external_stage_params = f"URL = '{url}' CREDENTIALS = ( AZURE_SAS_TOKEN = '{conn_conf['sas']}')"
+        url = conn_conf['url'].replace("https", "azure") + source_directory
+        external_stage_params = f"URL = '{url}' CREDENTIALS = ( AZURE_SAS_TOKEN = '{conn_conf['sas']}')"
         cursor = connection.cursor()
         # create stage
-        self._logger.info("Creating stage: %s", self._stage_name)
-        create_stage_sql = f"CREATE OR REPLACE STAGE {self._stage_name}"
-        create_stage_sql += f" {self.__external_stage_params}"
+        self._logger.info("Creating stage: %s", stage_name)
+        create_stage_sql = f"CREATE STAGE IF NOT EXISTS {stage_name}"
+        create_stage_sql += f" {external_stage_params}"
         cursor.execute(create_stage_sql)
         cursor.close()
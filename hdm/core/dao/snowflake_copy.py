@@ -11,35 +11,96 @@
 # WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
 # See the License for the specific language governing permissions and
 # limitations under the License.
+import threading
+import time
+
+import yaml
+
 from hdm.core.dao.snowflake import Snowflake
+from hdm.core.utils.project_config import ProjectConfig
 
 
 class SnowflakeCopy(Snowflake):
+    """
+    Snowflake DAO loading from an external stage.
+
+    The stage is provisioned once per process, on the first session taken for it: it is created if SHOW STAGES does
+    not find it, with CREATE STAGE IF NOT EXISTS, so sinks and processes loading from it at the same time never
+    replace it under each other. A stage that exists is used as is - drop it to change its location or credentials -
+    unless its credentials expire: a stage provisioned with credentials that expire is provisioned again, see
+    _refresh_stage, on the first session taken once they have expired.
+    """
+    # Section of the hdm profile with the storage of the stage, when stage_env is not given
+    _DEFAULT_STAGE_ENV = None
+
+    # (connection name, stage name) of the stages provisioned -> time.time() they expire at, None if they do not
+    __stages = {}
+    __stage_lock = threading.Lock()
 
     def __init__(self, **kwargs):
+        """
+        Args:
+            **kwargs:
+                connection: section name in hdm profile yml file for the snowflake connection
+                stage_directory: location of the stage in the storage, e.g. container or bucket, and path
+                stage_name: name of the stage
+                stage_env: section name in hdm profile yml file for the storage of the stage
+        """
         super().__init__(**kwargs)
         self._stage_directory = kwargs['stage_directory']
         self._stage_name = kwargs['stage_name']
+        self._stage_env = kwargs.get('stage_env') or self._DEFAULT_STAGE_ENV
 
-    @property
-    def connection(self):
+    def _on_checkout(self, connection) -> None:
+        key = (self._connection_name, self._stage_name)
+        if self.__provisioned(key):
+            return
+        # Sinks sharing the stage wait for it to be provisioned, rather than each provisioning it
+        with SnowflakeCopy.__stage_lock:
+            if not self.__provisioned(key):
+                if key not in SnowflakeCopy.__stages and self._stage_not_exist(connection):
+                    expiry = self._create_stage(self._stage_name, self._stage_directory, connection)
+                else:
+                    expiry = self._refresh_stage(self._stage_name, connection)
+                SnowflakeCopy.__stages[key] = expiry
 
-        connection = self._get_connection()
-
-        self._create_stage(self._stage_name, self._stage_directory, connection)
-
-        return connection
+    @classmethod
+    def __provisioned(cls, key: tuple) -> bool:
+        if key not in SnowflakeCopy.__stages:
+            return False
+        expiry = SnowflakeCopy.__stages[key]
+        return expiry is None or time.time() < expiry
 
     def _create_stage(self, stage_name, source_directory, connection):
+        """
+        Create the stage if it does not exist - CREATE STAGE IF NOT EXISTS.
+        Returns: time.time() the credentials of the stage expire at, None if they do not
+        """
         raise NotImplementedError(f'Method not implemented for {type(self).__name__}.')
 
-    def _stage_not_exist(self):
-        cursor = self._connection.cursor()
-        self._logger.info("Check for available stage: %s", self._stage_directory)
+    def _refresh_stage(self, stage_name, connection):
+        """
+        Bring a stage that exists up to date, once per process and again when its credentials expire - e.g. replace
+        them. Nothing to do by default.
+        Returns: time.time() the credentials of the stage expire at, None if they do not
+        """
+        return None
+
+    def _stage_not_exist(self, connection) -> bool:
+        """
+        Returns: True if the stage does not exist, False otherwise
+        """
+        cursor = connection.cursor()
+        self._logger.info("Check for available stage: %s", self._stage_name)
         show_stage_sql = f"SHOW STAGES LIKE '{self._stage_name}'"
         cursor.execute(show_stage_sql)
         record = cursor.fetchone()
         cursor.close()
-        if record:
-            return True
-        return False
+        return not record
+
+    def _get_stage_profile(self) -> dict:
+        """
+        Returns: the section of the hdm profile with the storage of the stage
+        """
+        with open(f"{ProjectConfig.hdm_home()}/{ProjectConfig.profile_path()}", 'r') as stream:
+            return yaml.safe_load(stream)[ProjectConfig.hdm_env()][self._stage_env]
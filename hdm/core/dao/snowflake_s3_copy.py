@@ -11,12 +11,69 @@
 # WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
 # See the License for the specific language governing permissions and
 # limitations under the License.
+from datetime import datetime
+
+from hdm.core.dao.s3 import S3
 from hdm.core.dao.snowflake_copy import SnowflakeCopy
-from hdm.core.utils.project_config import ProjectConfig
-import yaml
 
 
 class SnowflakeS3Copy(SnowflakeCopy):
+    """
+    Snowflake DAO loading from a stage on a S3 bucket, stage_directory being the bucket and, optionally, a path in it.
+    The stage authenticates with the storage_integration of the stage_env section of the hdm profile | default s3, or
+    else with the credentials of the section - keys or AWS profile, as for S3.
+    Temporary credentials, with a session token, expire: the credentials of a stage that exists are replaced with
+    ALTER STAGE once per process when the section's credentials are temporary, and again CREDENTIALS_REFRESH_MARGIN
+    seconds before they expire when they are refreshed by boto3, e.g. from an assumed role. Prefer a storage
+    integration.
+    """
+    _DEFAULT_STAGE_ENV = 's3'
+    # Seconds before temporary credentials expire that the stage is given new ones
+    CREDENTIALS_REFRESH_MARGIN = 300
 
     def _create_stage(self, stage_name, source_directory, connection):
-        raise NotImplementedError()
+        conn_conf = self._get_stage_profile()
+
+        url = f"s3://{source_directory.strip('/')}/"
+        if conn_conf.get('storage_integration'):
+            external_stage_params = f"URL = '{url}' STORAGE_INTEGRATION = {conn_conf['storage_integration']}"
+        else:
+            aws_credentials, expiry = self.__get_credentials()
+            external_stage_params = f"URL = '{url}' CREDENTIALS = ( {aws_credentials} )"
+        cursor = connection.cursor()
+        # create stage
+        self._logger.info("Creating stage: %s", stage_name)
+        create_stage_sql = f"CREATE STAGE IF NOT EXISTS {stage_name}"
+        create_stage_sql += f" {external_stage_params}"
+        cursor.execute(create_stage_sql)
+        cursor.close()
+        return None if conn_conf.get('storage_integration') else expiry
+
+    def _refresh_stage(self, stage_name, connection):
+        if self._get_stage_profile().get('storage_integration'):
+            return None
+        aws_credentials, expiry = self.__get_credentials()
+        if 'AWS_TOKEN' not in aws_credentials:
+            return None
+        cursor = connection.cursor()
+        self._logger.info("Refreshing the temporary credentials of stage: %s", stage_name)
+        cursor.execute(f"ALTER STAGE {stage_name} SET CREDENTIALS = ( {aws_credentials} )")
+        cursor.close()
+        return expiry
+
+    def __get_credentials(self) -> tuple:
+        """
+        Returns: CREDENTIALS of the stage, from the stage_env section, and the time.time() they are to be replaced at -
+                 None for long-term keys, and for temporary credentials boto3 does not refresh
+        """
+        credentials = S3(connection=self._stage_env).connection.get_credentials()
+        frozen = credentials.get_frozen_credentials()
+        aws_credentials = f"AWS_KEY_ID = '{frozen.access_key}' AWS_SECRET_KEY = '{frozen.secret_key}'"
+        if not frozen.token:
+            return aws_credentials, None
+        aws_credentials += f" AWS_TOKEN = '{frozen.token}'"
+        # Set on the credentials boto3 refreshes, e.g. of an assumed role
+        expiry_time = getattr(credentials, '_expiry_time', None)
+        if not isinstance(expiry_time, datetime):
+            return aws_credentials, None
+        return aws_credentials, expiry_time.timestamp() - self.CREDENTIALS_REFRESH_MARGIN
@@ -13,6 +13,7 @@
 # limitations under the License.
 import os
 import uuid
+from concurrent.futures import ThreadPoolExecutor, as_completed
 from copy import deepcopy
 
 from hdm.core.error.hdm_error import HDMError
@@ -27,28 +28,56 @@ from hdm.data_link_builder import DataLinkBuilder
 class BatchOrchestrator(Orchestrator):
 
     def __init__(self, **kwargs):
-        self._back_pressure_factor = kwargs.get('back_pressure_factor')
+        self._back_pressure_factor = kwargs.get('back_pressure_factor', 1)
         super().__init__()
+        if not isinstance(self._back_pressure_factor, int) or self._back_pressure_factor < 1:
+            error = f'back_pressure_factor must be a positive integer, got {self._back_pressure_factor}.'
+            self._logger.error(error)
+            raise HDMError(error)
 
     def run_pipelines(self):
-
-        # Run the declared data links - these are links that will always run.
-        _ = [hdm.run() for hdm in self._data_links if hdm.pressureless]
-        pressurable_links = [hdm for hdm in self._data_links if not hdm.pressureless]
-
-        # Track the number of pipelines running
-        running_count = 0
-
-        # This are the pipelines that
-        running_links = []
-        for link in pressurable_links:
-            if running_count < self._back_pressure_factor:
-                link.run()
-                running_links.append(link)
-
-            # If a pipeline has finished, then remove it. This makes room for another pipeline.
-            while running_count == self._back_pressure_factor:
-                _ = [running_links.pop(running_link) for running_link in running_links if not running_link.is_running]
+        # Links run in the order they were built. Consecutive pressurable (templated) links are run together on a pool
+        # of back_pressure_factor threads; a pressureless (declared) link waits for everything before it to finish.
+        pressurable_links = []
+        for link in self._data_links:
+            if not link.pressureless:
+                pressurable_links.append(link)
+                continue
+
+            self._run_pressurable_links(pressurable_links)
+            pressurable_links = []
+            link.run()
+
+        self._run_pressurable_links(pressurable_links)
+
+    def _run_pressurable_links(self, links: list) -> None:
+        """
+        Run data links concurrently, with at most back_pressure_factor of them running at any time.
+        Args:
+            links: data links to run
+
+        Raises:
+            HDMError: if any of the data links raised while running. All links are run before this is raised.
+        """
+        if not links:
+            return
+
+        failed_links = []
+        with ThreadPoolExecutor(max_workers=self._back_pressure_factor) as executor:
+            futures = {executor.submit(link.run): link for link in links}
+            for future in as_completed(futures):
+                link = futures[future]
+                try:
+                    future.result()
+                    self._logger.info("DataLink %s completed in %.3f seconds", link.name, link.wall_time)
+                except Exception:
+                    self._logger.exception("DataLink %s failed after %.3f seconds", link.name, link.wall_time)
+                    failed_links.append(link.name)
+
+        if failed_links:
+            error = f'{len(failed_links)} of {len(links)} data links failed: {", ".join(failed_links)}'
+            self._logger.error(error)
+            raise HDMError(error)
 
     def _build_data_links(self):
         config = ParseConfig.parse(config_path=os.getenv('HDM_MANIFEST'))
@@ -70,7 +99,7 @@ class BatchOrchestrator(Orchestrator):
             self._generate_data_links(link_configs=self._generate_configs(link_config), state_manager_config=state_manager_config, manifest_name=manifest_name, run_id=run_id,
                                       pressure=True)
 
-    def _generate_data_links(self, state_manager_config: dict, link_configs: list, manifest_name: str, run_id, pressure=True):
+    def _generate_data_links(self, state_manager_config: dict, link_configs: list, manifest_name: str, run_id, pressure=False):
         for link_config in link_configs:
 
             # Create New State Manager
@@ -95,14 +124,27 @@ class BatchOrchestrator(Orchestrator):
                 self._logger.error(error)
                 raise HDMError(error)
 
+            pipeline_config = link_config.get('pipeline') or {}
             self._data_links.append(
                 DataLink(
                     source=source,
                     sink=sink,
-                    pressureless=pressure
+                    pressureless=not pressure,
+                    name=self._generate_link_name(link_config),
+                    queue_depth=pipeline_config.get('queue_depth', 0),
+                    parallel_sinks=self._generate_parallel_sinks(link_config),
+                    state_manager=link_state
                 )
             )
 
+    @classmethod
+    def _generate_link_name(cls, link_config: dict) -> str:
+        name = f"{link_config['source']['name']} -> {link_config['sink']['name']}"
+        table_name = link_config['source']['conf'].get('table_name')
+        if table_name:
+            name += f" ({table_name})"
+        return name
+
     def _generate_configs(self, configuration: dict) -> list:
         batch_config = configuration['batch_definition']
         data_links_configurations = []
@@ -154,7 +196,8 @@ class BatchOrchestrator(Orchestrator):
             data_links_configurations.append(
                 dict(
                     source=source,
-                    sink=sink
+                    sink=sink,
+                    pipeline=deepcopy(configuration.get('pipeline'))
                 )
             )
 
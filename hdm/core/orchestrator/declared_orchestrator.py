@@ -59,9 +59,13 @@ class DeclaredOrchestrator(Orchestrator):
                 self._logger.error(error)
                 raise HDMError(error)
 
+            pipeline_config = link_config.get('pipeline') or {}
             self._data_links.append(
                 DataLink(
                     source=source,
-                    sink=sink
+                    sink=sink,
+                    queue_depth=pipeline_config.get('queue_depth', 0),
+                    parallel_sinks=self._generate_parallel_sinks(link_config),
+                    state_manager=link_state
                 )
             )
@@ -15,6 +15,7 @@ import logging
 import uuid
 
 from hdm.core.error.hdm_error import HDMError
+from hdm.core.sink.sink import Sink
 from hdm.core.state_management.state_manager import StateManager
 from hdm.data_link_builder import DataLinkBuilder
 
@@ -66,5 +67,33 @@ class Orchestrator:
 
         return state_manager
 
+    def _generate_parallel_sinks(self, data_link_config: dict) -> list:
+        """
+        Build the additional sinks used by a pipelined DataLink. The sink of the DataLink is the first sink worker, so
+        sink_workers - 1 further sinks are built from the same configuration.
+        Args:
+            data_link_config: data link configuration, with an optional pipeline section
+
+        Returns: list of Sink
+
+        """
+        pipeline_config = data_link_config.get('pipeline') or {}
+        sink_workers = pipeline_config.get('sink_workers', 1)
+        if not isinstance(sink_workers, int) or sink_workers < 1:
+            error = f'sink_workers must be a positive integer, got {sink_workers}.'
+            self._logger.error(error)
+            raise HDMError(error)
+
+        parallel_sinks = []
+        for _ in range(sink_workers - 1):
+            sink = DataLinkBuilder.build_sink(data_link_config['sink'])
+            if not isinstance(sink, Sink):
+                error = f'Sink {type(sink)} is not a Sink.'
+                self._logger.error(error)
+                raise HDMError(error)
+            parallel_sinks.append(sink)
+
+        return parallel_sinks
+
     def _build_data_links(self):
         raise NotImplementedError(f'Method not implemented for {type(self).__name__}.')
@@ -11,12 +11,13 @@
 # WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
 # See the License for the specific language governing permissions and
 # limitations under the License.
-import io
+import itertools
 import os
 import time
 import pandas as pd
 from azure.storage.blob import BlobClient
 
+from hdm.core.utils.file_format import FileFormat
 from hdm.core.utils.generic_functions import GenericFunctions
 from hdm.core.utils.project_config import ProjectConfig
 from hdm.core.dao.azure_blob import AzureBLOB
@@ -24,36 +25,105 @@ from hdm.core.sink.sink import Sink
 
 
 class AzureBlobSink(Sink):
+    """
+    Azure blob storage sink
+    Expected protocol for configuration:
+    env: section name in hdm profile yml file for connection information
+    container: container the blobs are written to
+    file_format: csv | parquet, format a dataframe is uploaded in | default csv
+    compression: gzip | zstd for csv, snappy | gzip | zstd | brotli | none for parquet
+    block_size: size in bytes of the blocks a blob is uploaded in | default 8 MiB
+    max_concurrency: number of blocks uploaded at the same time | default 10
+
+    A dataframe is encoded a slice of rows at a time straight into the upload, so at most max_concurrency blocks of it
+    are held in memory as bytes. A blob that fits in one block is uploaded in a single request.
+    """
 
     def __init__(self, **kwargs):
+        """
+        Construct an instance of the AzureBlobSink.
+        Args:
+            **kwargs:
+                env: section name in hdm profile yml file for connection information
+                container: container name
+                file_format: csv | parquet
+                compression: csv compression gzip | zstd, or parquet compression codec
+                block_size: size in bytes of the blocks a blob is uploaded in
+                max_concurrency: number of blocks uploaded at the same time
+
+        Raises:
+            ValueError: If the file format or csv compression is unknown
+        """
         super().__init__(**kwargs)
 
         self.__container_name = kwargs['container']
         self.__env = kwargs['env']
 
-        self.__azure_dao = AzureBLOB(connection=self.__env, container=self.__container_name)
-        self.__container = None
+        self.__file_format = kwargs.get('file_format', 'csv').lower()
+        self.__compression = kwargs.get('compression', None)
+        self.__compression = self.__compression.lower() if self.__compression else None
+        # Parquet compression is internal to the file, only csv compression is part of the file name
+        self.__csv_compression = self.__compression if self.__file_format == 'csv' else None
+        self.__extension = FileFormat.extension(self.__file_format, self.__csv_compression)
+
+        self.__block_size = kwargs.get('block_size', 8 * 1024 * 1024)
+        self.__max_concurrency = kwargs.get('max_concurrency', 10)
+
+        # Blobs larger than a block are uploaded in blocks, files passed through included
+        self.__azure_dao = AzureBLOB(connection=self.__env, container=self.__container_name,
+                                     max_block_size=self.__block_size, max_single_put_size=self.__block_size)
 
     def produce(self, **kwargs) -> None:
         self._run(**kwargs)
 
     def _set_data(self, **kwargs) -> dict:
-        df = kwargs['data_frame']
+        df = kwargs.get('data_frame')
+        file_path = kwargs.get('file_path')
         table_name: str = kwargs.get("table_name")
 
-        self._entity = kwargs.get('file_name', f"{ProjectConfig.file_prefix()}_{str(time.time_ns())}.csv")
+        self._entity = kwargs.get('file_name', f"{ProjectConfig.file_prefix()}_{str(time.time_ns())}{self.__extension}")
+        if df is not None and FileFormat.detect(self._entity) != (self.__file_format, self.__csv_compression):
+            self._entity = FileFormat.with_extension(self._entity, self.__file_format, self.__csv_compression)
         self._entity_filter = os.path.join(self._sink_name, GenericFunctions.table_to_folder(table_name))
-        with self.__azure_dao.connection as client:
-            self.__container = client.get_container_client(self.__container_name)
-            blob_client = self.__container.get_blob_client(os.path.join(self._sink_name, GenericFunctions.table_to_folder(table_name), self._entity))
-            self.__putFile(df, blob_client)
+        # The client of the container is shared by the process, see AzureBLOB
+        blob_client = self.__azure_dao.container.get_blob_client(os.path.join(self._sink_name, GenericFunctions.table_to_folder(table_name), self._entity))
+        if df is None and file_path:
+            self.__uploadFile(file_path, blob_client)
+            record_count = kwargs.get('record_count')
+            if record_count is None:
+                record_count = GenericFunctions.count_records(file_path)
+            return dict(record_count=record_count)
+
+        self.__putFile(df, blob_client)
         return dict(record_count=df.shape[0])
 
-    def __putFile(self, df: pd.DataFrame, blob_client: BlobClient) -> dict:
+    def __uploadFile(self, file_path: str, blob_client: BlobClient) -> None:
+        """
+        Upload a file passed through as is, streamed from disk.
+        """
+        self._logger.info("Uploading file: %s to %s", file_path, blob_client.blob_name)
+        with open(file_path, 'rb') as data:
+            blob_client.upload_blob(data, overwrite=True, max_concurrency=self.__max_concurrency)
+
+    def __putFile(self, df: pd.DataFrame, blob_client: BlobClient) -> None:
+        """
+        Upload a dataframe, encoded as it is uploaded.
+        """
         self._logger.info("Putting file: %s", blob_client.blob_name)
-        with io.StringIO() as buf:
-            df.to_csv(buf, index=False)
-            buf.seek(0)
-            # upload_blob can only take bytesio or file io, not stringio
-            with io.BytesIO(buf.read().encode('utf8')) as byte_buf:
-                blob_client.upload_blob(byte_buf, overwrite=True)
+        encoded = FileFormat.encode_data_frame(df, file_format=self.__file_format, compression=self.__compression)
+
+        # Up to a block is encoded before uploading - a small blob is uploaded with a single request rather than as a
+        # block and a block list.
+        head = []
+        size = 0
+        for data in encoded:
+            head.append(data)
+            size += len(data)
+            if size > self.__block_size:
+                break
+        else:
+            blob_client.upload_blob(b''.join(head), overwrite=True)
+            return
+
+        # Read by the client max_block_size bytes at a time, as the blocks are uploaded
+        blob_client.upload_blob(itertools.chain(head, encoded), overwrite=True, max_concurrency=self.__max_concurrency)
@@ -12,8 +12,10 @@
 # See the License for the specific language governing permissions and
 # limitations under the License.
 import os
+import shutil
 import pandas as pd
 from hdm.core.sink.sink import Sink
+from hdm.core.utils.file_format import FileFormat
 from hdm.core.utils.generic_functions import GenericFunctions
 from hdm.core.utils.project_config import ProjectConfig
 
@@ -24,8 +26,11 @@ class FSSink(Sink):
 
       Expected protocol for configuration:
       data_frame: Dataframe to be written to filesystem
+      file_path: File to be copied to filesystem as is, when there is no data_frame
       dest_path: Path where the file will be written
       file_format: csv | parquet
+      compression: gzip | zstd for csv, snappy | gzip | zstd | brotli | none for parquet
+      row_group_size: rows per parquet row group
       """
 
     def __init__(self, **kwargs):
@@ -36,8 +41,11 @@ class FSSink(Sink):
                       directory: Directory path used for offloading files from dataframe. Must be present
                       file_name: Will be used to create the landing file with this name
                       file_format: File format to be written csv | parquet
+                      compression: csv compression gzip | zstd, or parquet compression codec
+                      row_group_size: rows per parquet row group
         Raises:
             FileNotFoundError: If temp. directory for landing files is not created
+            ValueError: If the file format or csv compression is unknown
         """
         super().__init__(**kwargs)
         self.__dest_path = os.path.abspath(kwargs.get('directory'))
@@ -46,8 +54,13 @@ class FSSink(Sink):
             raise NotADirectoryError("Unable to create Sink landing at %s" % self.__dest_path)
 
         # If file format not specified hard coding it as csv for now
-        # TODO - More file types for later
-        self.__file_format = kwargs.get('file_format', 'csv')
+        self.__file_format = kwargs.get('file_format', 'csv').lower()
+        self.__compression = kwargs.get('compression', None)
+        self.__compression = self.__compression.lower() if self.__compression else None
+        self.__row_group_size = kwargs.get('row_group_size', None)
+        # Parquet compression is internal to the file, only csv compression is part of the file name
+        self.__csv_compression = self.__compression if self.__file_format == 'csv' else None
+        self.__extension = FileFormat.extension(self.__file_format, self.__csv_compression)
         # self._entity = self.__dest_path
 
     def produce(self, **kwargs) -> None:
@@ -55,28 +68,34 @@ class FSSink(Sink):
 
     def _set_data(self, **kwargs) -> dict:
         """
-        Creates a csv | parquet file from a Dataframe.
+        Creates a csv | parquet file from a Dataframe, or copies the file passed through without parsing it.
         Args:
             **kwargs: data_frame: Pandas dataframe which will be written to the filepath specified in configuration
-        Raises:
-            NotImplementedError: For file_format other than text/csv
+                      file_path: file copied to the filepath specified in configuration when there is no data_frame
         """
         df: pd.DataFrame = kwargs.get("data_frame")
         table_name: str = kwargs.get("table_name")
 
         # File name which will be used to create the sink file.
         # Create file name if not provided by the user
-        file_name = kwargs.get("file_name", f"{ProjectConfig.file_prefix()}_{kwargs.get('current_state')['correlation_id_out']}.csv")
+        file_name = kwargs.get("file_name", f"{ProjectConfig.file_prefix()}_{kwargs.get('current_state')['correlation_id_out']}{self.__extension}")
 
         self._entity = file_name
         self._entity_filter = None
 
-        # TODO Check for valid df
-        # TODO: Assumption made to create only CSV's for now
-        # State management should record that as failure for other file types.
-        if not self.__file_format == 'csv':
-            raise ValueError("Unknown output type: %s" % self.__file_format)
+        file_path = kwargs.get("file_path")
+        if df is None and file_path:
+            # copied as is, in whatever format it is
+            self.__copy_file(file_name, file_path, table_name)
+            record_count = kwargs.get("record_count")
+            if record_count is None:
+                record_count = GenericFunctions.count_records(file_path)
+            return dict(record_count=record_count)
 
+        # TODO Check for valid df
+        if FileFormat.detect(file_name) != (self.__file_format, self.__csv_compression):
+            file_name = FileFormat.with_extension(file_name, self.__file_format, self.__csv_compression)
+            self._entity = file_name
         self.__write_file(file_name, df, table_name)
         return dict(record_count=df.shape[0])
 
@@ -85,6 +104,29 @@ class FSSink(Sink):
         saves files to sink
         Returns: none
         """
+        file_to_create = self.__get_destination(file_name, table_name)
+        self._logger.info("Writing file: %s" % file_to_create)
+        FileFormat.write_data_frame(df, file_to_create, file_format=self.__file_format, compression=self.__compression,
+                                    row_group_size=self.__row_group_size)
+
+    def __copy_file(self, file_name, file_path, table_name):
+        """
+        copies a file passed through to sink, byte for byte
+        Returns: none
+        """
+        file_to_create = self.__get_destination(file_name, table_name)
+        if os.path.abspath(file_path) == file_to_create:
+            # already in place, e.g. chunk files written to the sink folder by FSChunkSource
+            self._logger.info("File already in place: %s" % file_to_create)
+            return
+        self._logger.info("Copying file: %s to %s" % (file_path, file_to_create))
+        shutil.copyfile(file_path, file_to_create)
+
+    def __get_destination(self, file_name, table_name) -> str:
+        """
+        path of the file to create in sink, creating its directory if needed
+        Returns: path of the file
+        """
         if table_name:
             destination_directory = os.path.join(self.__dest_path, self._sink_name, GenericFunctions.table_to_folder(table_name))
         else:
@@ -93,9 +135,7 @@ class FSSink(Sink):
         if not os.path.exists(destination_directory):
             os.makedirs(destination_directory)
         self._entity_filter = destination_directory
-        csv_to_create = os.path.abspath(os.path.join(destination_directory, file_name))
-        self._logger.info("Writing file: %s" % csv_to_create)
-        df.to_csv(csv_to_create, index=False)
+        return os.path.abspath(os.path.join(destination_directory, file_name))
 
     # TODO Fix this!
     def _error_handler(self, e: Exception) -> None:
@@ -12,20 +12,31 @@
 # See the License for the specific language governing permissions and
 # limitations under the License.
 import time
-from io import StringIO
+
 import boto3
+from boto3.s3.transfer import TransferConfig
+from botocore.exceptions import ClientError
 
 from hdm.core.dao.s3 import S3
 from hdm.core.sink.sink import Sink
+from hdm.core.utils.file_format import FileFormat
+from hdm.core.utils.generic_functions import GenericFunctions
 from hdm.core.utils.project_config import ProjectConfig
 
 
 class S3Sink(Sink):
     """
-    S3 Source
+    S3 Sink
     Expected protocol for configuration:
     connection: Connection choice to connect to different profiles.
-    bucket_name: Bucket name to scan for loading files into dataframes
+    bucket_name: Bucket name to write the objects to. Created when it does not exist.
+    multipart_threshold: Size in bytes from which an object is uploaded in parts | default 8 MiB
+    multipart_chunksize: Size in bytes of each part | default 8 MiB
+    max_concurrency: Number of parts uploaded at the same time | default 10
+
+    Objects are uploaded with the boto3 managed transfer. A dataframe is encoded to csv as it is uploaded, a part at a
+    time, without writing it to disk or holding all of it in memory. A file passed through is uploaded from disk. The
+    session, and whether the bucket exists, are kept for the life of the sink.
     """
     # Prefix for the created Sink bucket
     __bucket_prefix = 'hdm-'
@@ -36,12 +47,14 @@ class S3Sink(Sink):
 
     def __init__(self, **kwargs):
         """
-        Construct an instance of the S3Source.
+        Construct an instance of the S3Sink.
         Args:
             **kwargs:
                 connection: connection name to connect to a specific profile
                 bucket_name: bucket name to used for storing the object passed in the dataframe.
-                object_name: name of the created object
+                multipart_threshold: size in bytes from which an object is uploaded in parts
+                multipart_chunksize: size in bytes of each part
+                max_concurrency: number of parts uploaded at the same time
         """
         # Connections are lazy - they are only created when being used
         super().__init__(**kwargs)
@@ -54,6 +67,14 @@ class S3Sink(Sink):
         # TODO: Setting the bucket name as entity for now. Need to verify
         self._entity = self.__bucket_name
 
+        max_concurrency = kwargs.get('max_concurrency', 10)
+        self.__transfer_config = TransferConfig(multipart_threshold=kwargs.get('multipart_threshold', 8 * 1024 * 1024),
+                                                multipart_chunksize=kwargs.get('multipart_chunksize', 8 * 1024 * 1024),
+                                                max_concurrency=max_concurrency,
+                                                use_threads=max_concurrency > 1)
+        self.__s3 = None
+        self.__bucket_ready = False
+
     def __get_bucket_name(self, bucket_name: str) -> str:
         """
         Create and return the bucket name with the provided prefix and user provided name for the bucket
@@ -62,42 +83,82 @@ class S3Sink(Sink):
         # eg: The generated bucket name must be between 3 and 63 chars long
         return ''.join([self.__bucket_prefix, bucket_name])
 
-    def __bucket_exists(self, s3, bucket_name):
+    def __get_s3(self) -> boto3.session.Session.resource:
+        """
+        S3 resource of the sink, created from its session when first used.
+        """
+        if not self.__s3:
+            self.__s3 = S3(connection=self.__connection_choice).connection.resource('s3')
+        return self.__s3
+
+    def __bucket_exists(self, s3) -> bool:
         """
         Checks if the bucket exists or not and returns True/False
         """
-        # All created buckets have a creation date. If it is None, create a new
-        self.__bucket = s3.Bucket(bucket_name)
-        return bool(self.__bucket.creation_date)
+        try:
+            s3.meta.client.head_bucket(Bucket=self.__bucket_name)
+            return True
+        except ClientError as e:
+            if e.response.get('Error', {}).get('Code') in ('404', 'NoSuchBucket'):
+                return False
+            raise
 
-    def __create_bucket(self, s3) -> None:
+    def __create_bucket(self) -> None:
         """
-        Creates a bucket if it does not exist
+        Creates the bucket if it does not exist. Checked once per sink.
         """
-        if not self.__bucket_exists(s3, bucket_name=self.__bucket_name):
+        if self.__bucket_ready:
+            return
+
+        s3 = self.__get_s3()
+        if not self.__bucket_exists(s3):
             try:
-                self.__bucket = s3.create_bucket(Bucket=self.__bucket_name)
+                region = s3.meta.client.meta.region_name
+                if region and region != 'us-east-1':
+                    bucket = s3.create_bucket(Bucket=self.__bucket_name,
+                                              CreateBucketConfiguration={'LocationConstraint': region})
+                else:
+                    bucket = s3.create_bucket(Bucket=self.__bucket_name)
                 # Waiting till Resource available
-                self.__bucket.wait_until_exists()
+                bucket.wait_until_exists()
             except Exception as e:
                 error_msg = f"Exception during bucket creation:{e}"
-                self.__logger.debug("%s", error_msg)
+                self._logger.debug("%s", error_msg)
                 raise RuntimeError(error_msg)
         else:
-            self.__logger.info("Bucket %s already exists.", self.__bucket_name)
+            self._logger.info("Bucket %s already exists.", self.__bucket_name)
+        self.__bucket_ready = True
+
+    def __upload_file(self, file_path: str, object_name: str) -> None:
+        self.__create_bucket()
+        self._entity_filter = object_name
+        # Managed transfer - the file is streamed from disk, in parts uploaded concurrently when it is large.
+        self._logger.debug("Uploading %s to object %s in %s", file_path, object_name, self.__bucket_name)
+        self.__get_s3().Object(self.__bucket_name, object_name).upload_file(file_path, Config=self.__transfer_config)
+
+    def __upload_data_frame(self, df, object_name: str) -> None:
+        self.__create_bucket()
+        self._entity_filter = object_name
+        # Managed transfer - the csv is encoded as the parts are read, and the parts uploaded concurrently.
+        self._logger.debug("Uploading %d rows to object %s in %s", df.shape[0], object_name, self.__bucket_name)
+        with FileFormat.open_encoded(df) as stream:
+            self.__get_s3().Object(self.__bucket_name, object_name).upload_fileobj(stream,
+                                                                                   Config=self.__transfer_config)
 
     def produce(self, **kwargs):
         self._run(**kwargs)
 
     def _set_data(self, **kwargs) -> dict:
         """
-        Creates CSV files for the passed dataframe.
+        Creates CSV files for the passed dataframe, or uploads the file passed through without parsing it.
         Args:
             **kwargs:
                 data_frame: dataframe required to be written to S3 bucket
+                file_path: file uploaded as is when there is no data_frame
         """
         #  This is the dataframe that was passed
         df = kwargs.get('data_frame')
+        file_path = kwargs.get('file_path')
 
         # We want to assume for now that we are writing to CSV
         # TODO Later add support for parquet and others
@@ -106,20 +167,13 @@ class S3Sink(Sink):
         # If not passed, we will use a default object name. default object names are prefixed with current time in NS.
         object_name = kwargs.get('file_name', f"{ProjectConfig.file_prefix()}_{str(time.time_ns())}.csv")
 
-        # Creating a buffer to read the CSV and write it to S3.
-        # TODO May need to change to BytesIO
-        buffer = StringIO()
-        df.to_csv(buffer, sep=',', index=False)
-        self.__logger.debug("Buffer len: %d", len(buffer.getvalue()))
-
-        # Create a connection to S3
-        s3: boto3.session.Session.resource = S3(connection=self.__connection_choice).connection
+        if df is None and file_path:
+            self.__upload_file(file_path, object_name)
 
-        # Make sure that the bucket exists and create it if it does not exist.
-        self.__create_bucket(s3=s3)
-        self._entity_filter = object_name
-        # Create the object in S3
-        self.__logger.debug("Creating object %s in %s", object_name, self.__bucket_name)
-        s3.Object(self.__bucket_name, object_name).put(Body=buffer.getvalue())
+            record_count = kwargs.get('record_count')
+            if record_count is None:
+                record_count = GenericFunctions.count_records(file_path)
+            return dict(record_count=record_count)
 
+        self.__upload_data_frame(df, object_name)
         return dict(record_count=df.shape[0])
@@ -75,6 +75,13 @@ class Sink:
     def produce(self, **kwargs) -> None:
         raise NotImplementedError(f'Method not implemented for {type(self).__name__}.')
 
+    def flush(self) -> None:
+        """
+        Complete the sinking of everything produced so far, for sinks that defer part of it, e.g. to batch it. Called by
+        the data link once its source is exhausted. Nothing to do by default.
+        """
+        pass
+
     def _run(self, **kwargs) -> None:
         # Set that it is running
         self._is_running = True
@@ -82,8 +89,12 @@ class Sink:
         # Get the current state
         file_name = kwargs.get("file_name", None)
         parent_file_name = kwargs.get("parent_file_name", None)
+        source_entity = kwargs.get("source_entity", None)
         source_filter = kwargs.get("source_filter", None)
-        if parent_file_name:
+        if source_entity:
+            # for batched sources, where every batch of the source_entity has its own source_filter.
+            current_state = self._get_current_state(entity=source_entity, entity_filter=source_filter)
+        elif parent_file_name:
             # for chunk source where parent file name is the source_entity.
             current_state = self._get_current_state(entity=parent_file_name, entity_filter=source_filter)
         else:
@@ -94,7 +105,8 @@ class Sink:
         try:
             kwargs['current_state'] = current_state
             data_dict = self._set_data(**kwargs)
-            current_state['status'] = 'success'
+            # in_progress when sinking is completed later, see flush
+            current_state['status'] = data_dict.get('status', 'success')
             current_state['record_count'] = data_dict['record_count']
 
             self._logger.info("PUT DATA: Entity: %s; TotalRecords: %s",
@@ -19,14 +19,4 @@ class SnowflakeAzureCopySink(SnowflakeCopySink):
     def __init__(self, **kwargs):
         super().__init__(**kwargs)
         self._dao = SnowflakeAzureCopy(connection=kwargs['env'], stage_directory=kwargs['stage_directory'],
-                                       stage_name=kwargs['stage_name'])
-
-    def _generate_query(self, file_name, table_name) -> None:
-        text = f"'.*{file_name}.*'"
-        self._query = f"COPY INTO {table_name} " \
-                      f"FROM @{self._stage_name} " \
-                      f"FILE_FORMAT = (TYPE = {self._file_format} SKIP_HEADER = 1) " \
-                      f"PATTERN = {text}" \
-                      f"PURGE = TRUE "
-
-        # self._count_query = f"SELECT COUNT(*) FROM {table_name} "
+                                       stage_name=kwargs['stage_name'], stage_env=kwargs.get('stage_env'))
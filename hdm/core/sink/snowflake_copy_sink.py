@@ -11,38 +11,164 @@
 # WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
 # See the License for the specific language governing permissions and
 # limitations under the License.
+import time
+import traceback
+
 from hdm.core.sink.rdbms_sink import RDBMSSink
+from hdm.core.utils.generic_functions import GenericFunctions
 
 
 class SnowflakeCopySink(RDBMSSink):
+    """
+    Loads staged files into tables with COPY INTO
+
+    Expected protocol for configuration:
+    stage_name: stage the files are loaded from
+    stage_directory: location of the stage, e.g. container or bucket
+    stage_env: section name in hdm profile yml file for the storage of the stage
+    file_format: format of the staged files
+    table_name: table loaded when the data produced does not name one
+    batch_size: most files loaded by a COPY INTO | default 1000, Snowflake's limit
+    batch_interval: seconds after which the files queued for a table are loaded, even if fewer than batch_size, by
+                    the next file produced | default 60
+
+    Files are queued per table as they are produced, and loaded batch_size at a time with a COPY INTO listing them, the
+    rest when the data link is flushed. batch_interval is checked as each file is produced - there is no timer, files
+    queued while the source produces nothing wait for the next file or the flush. The state of a file is in_progress
+    until it is loaded, then holds the rows COPY INTO loaded from it - and is a failure if the file was not loaded,
+    or COPY INTO did not report it.
+    The path of a file in the stage is the object_name produced with it, e.g. by AzureBlobSource or S3Source, or
+    <source name>/<table folder>/<file name> - where AzureBlobSink puts it.
+    The stage is created when it does not exist, see SnowflakeCopy.
+    """
+    # Most files a COPY INTO can list
+    MAX_BATCH_SIZE = 1000
 
     def __init__(self, **kwargs):
+        """
+        Raises:
+            ValueError: If batch_size is not between 1 and MAX_BATCH_SIZE, or batch_interval is negative
+        """
         super().__init__(**kwargs)
         # Query content
         self._file_format = kwargs['file_format']
         self._stage_name = kwargs['stage_name']
+        self.__table_name = kwargs.get('table_name')
         self._query = ""
-        # self._count_query = ""
+        self.__batch_size = kwargs.get('batch_size', self.MAX_BATCH_SIZE)
+        if not isinstance(self.__batch_size, int) or not 0 < self.__batch_size <= self.MAX_BATCH_SIZE:
+            raise ValueError("batch_size must be between 1 and %d: %s" % (self.MAX_BATCH_SIZE, self.__batch_size))
+        self.__batch_interval = kwargs.get('batch_interval', 60)
+        if not isinstance(self.__batch_interval, (int, float)) or self.__batch_interval < 0:
+            raise ValueError("batch_interval must be a non-negative number of seconds: %s" % self.__batch_interval)
+        # table name -> (time the first file was queued, [(path of the file in the stage, state of the file)])
+        self.__batches = {}
 
     def produce(self, **kwargs) -> None:
         self._run(**kwargs)
 
+        # Loaded once the state of the file produced is written
+        now = time.monotonic()
+        for table_name, (queued_on, files) in list(self.__batches.items()):
+            if len(files) >= self.__batch_size or now - queued_on >= self.__batch_interval:
+                self.__copy(table_name)
+
+    def flush(self) -> None:
+        """
+        Load the files queued.
+        """
+        for table_name in list(self.__batches):
+            self.__copy(table_name)
+
     def _set_data(self, **kwargs) -> dict:
         file_name = kwargs['file_name']
-        table_name = kwargs['table_name']
+        table_name = kwargs.get('table_name') or self.__table_name
         df = kwargs['data_frame']
-        with self._dao.connection as conn:
-            self._entity = f"{self._stage_name}.{table_name}"
-            self._entity_filter = None
-            self._generate_query(file_name, table_name)
+        self._entity = f"{self._stage_name}.{table_name}"
+        self._entity_filter = None
+
+        path = kwargs.get('object_name')
+        if not path:
+            path = f"{self._state_manager.get_source_name()}/{GenericFunctions.table_to_folder(table_name)}/{file_name}"
+        _, files = self.__batches.setdefault(table_name, (time.monotonic(), []))
+        files.append((path, kwargs['current_state']))
+        return {'record_count': str(df.shape[0]), 'status': 'in_progress'}
+
+    def __copy(self, table_name: str) -> None:
+        """
+        Load the files queued for a table with a single COPY INTO, and record what was loaded from each in its state.
+        """
+        _, files = self.__batches.pop(table_name)
+        self._entity = f"{self._stage_name}.{table_name}"
+        self._entity_filter = None
+        self._generate_query([path for path, _ in files], table_name)
+
+        loaded = None
+        try:
+            with self._dao.connection as conn:
+                cursor = conn.cursor()
+                self._logger.info("Executing copy of %d files from @%s into %s", len(files), self._stage_name,
+                                  table_name)
+                cursor.execute(self._query)
+                loaded = self.__loaded_files(cursor, [path for path, _ in files])
+        except Exception:
+            self._error_handler(traceback.format_exc())
+
+        for path, state in files:
+            if loaded is None:
+                status, record_count = 'failure', None
+            elif path in loaded:
+                status, record_count = loaded[path]
+            else:
+                # Not reported by COPY INTO - e.g. loaded before, the load metadata of the table skips it
+                self._logger.error("%s was not loaded into %s, COPY INTO did not report it", path, table_name)
+                status, record_count = 'failure', None
+            self._update_state(dict(state, status=status, record_count=record_count))
+
+    def __loaded_files(self, cursor, paths: list) -> dict:
+        """
+        Read the result of a COPY INTO.
+        Args:
+            cursor: cursor that executed the COPY INTO
+            paths: paths of the files in the stage listed by the COPY INTO
+
+        Returns: path of the file in the stage -> (status, rows loaded), for the files listed COPY INTO attempted to
+                 load
 
-            cursor = conn.cursor()
-            self._logger.info("Executing copy from @%s into %s", self._stage_name, table_name)
-            cursor.execute(self._query)
+        """
+        paths = set(paths)
+        columns = [column[0].lower() for column in cursor.description]
+        loaded = {}
+        for row in cursor.fetchall():
+            row = dict(zip(columns, row))
+            # A COPY INTO without a file to load returns a status only
+            if 'file' not in row:
+                continue
+            # The file is reported with the location of the stage in front of its path, e.g. the url of the container
+            parts = str(row['file']).split('/')
+            path = next(('/'.join(parts[i:]) for i in range(len(parts)) if '/'.join(parts[i:]) in paths), None)
+            if path is None:
+                self._logger.error("COPY INTO reported %s, which was not listed", row['file'])
+                continue
 
-            # cursor.execute(self._count_query)
-            # records = cursor.fetchone()
-        return {'record_count': str(df.shape[0])}
+            status = 'success' if str(row['status']).upper() == 'LOADED' else 'failure'
+            if status == 'failure':
+                self._logger.error("Failed to load %s into the table: %s", row['file'], row.get('first_error'))
+            loaded[path] = (status, row.get('rows_loaded'))
+        return loaded
 
-    def _generate_query(self, table_name) -> None:
-        raise NotImplementedError
+    def _generate_query(self, files: list, table_name: str) -> None:
+        """
+        Generate the COPY INTO of files of the stage into a table.
+        Args:
+            files: paths of the files in the stage
+            table_name: table loaded
+        """
+        # A file that fails to load is skipped, and reported as such, rather than failing the others
+        file_list = ", ".join(f"'{file}'" for file in files)
+        self._query = f"COPY INTO {table_name} " \
+                      f"FROM @{self._stage_name} " \
+                      f"FILES = ({file_list}) " \
+                      f"FILE_FORMAT = (TYPE = {self._file_format} SKIP_HEADER = 1) " \
+                      f"ON_ERROR = SKIP_FILE " \
+                      f"PURGE = TRUE"
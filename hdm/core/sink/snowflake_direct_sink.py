@@ -0,0 +1,84 @@
+# Copyright © 2020 Hashmap, Inc
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+from snowflake.connector.pandas_tools import write_pandas
+
+from hdm.core.dao.snowflake import Snowflake
+from hdm.core.sink.rdbms_sink import RDBMSSink
+
+
+class SnowflakeDirectSink(RDBMSSink):
+    """
+    Loads dataframes straight into a table with write_pandas - the dataframe is written to parquet files, chunk_size
+    rows each, uploaded to a temporary stage and loaded with COPY INTO. For sources producing dataframes, e.g.
+    NetezzaSource, it loads a table in one data link, where the staged files of SnowflakeAzureCopySink take several.
+
+    Expected protocol for configuration:
+    env: section name in hdm profile yml file for the Snowflake connection
+    table_name: table loaded, [database.][schema.]table | default the table_name produced with the data
+    chunk_size: rows per file uploaded | default 100000
+    compression: gzip | snappy - codec of the parquet files | default gzip
+    parallel: files uploaded at a time | default 4
+    quote_identifiers: quote the table and column names, to keep their case | default False
+
+    The whole dataframe is held in memory, so this is meant for small and medium tables, or batches of a streamed
+    source. COPY INTO fails, and so does the load, unless every file loads.
+    """
+    COMPRESSIONS = ('gzip', 'snappy')
+
+    def __init__(self, **kwargs):
+        """
+        Raises:
+            ValueError: If chunk_size or parallel is not positive, or compression is not gzip or snappy
+        """
+        super().__init__(**kwargs)
+        self.__dao = Snowflake(connection=kwargs['env'])
+        self.__table_name = kwargs.get('table_name')
+        self.__chunk_size = kwargs.get('chunk_size', 100000)
+        if not isinstance(self.__chunk_size, int) or self.__chunk_size <= 0:
+            raise ValueError("chunk_size must be a positive number of rows: %s" % self.__chunk_size)
+        self.__compression = kwargs.get('compression', 'gzip').lower()
+        if self.__compression not in self.COMPRESSIONS:
+            raise ValueError("compression must be one of %s: %s" % (', '.join(self.COMPRESSIONS), self.__compression))
+        self.__parallel = kwargs.get('parallel', 4)
+        if not isinstance(self.__parallel, int) or self.__parallel <= 0:
+            raise ValueError("parallel must be a positive number: %s" % self.__parallel)
+        self.__quote_identifiers = kwargs.get('quote_identifiers', False)
+
+    def produce(self, **kwargs) -> None:
+        self._run(**kwargs)
+
+    def _set_data(self, **kwargs) -> dict:
+        df = kwargs['data_frame']
+        table_name = self.__table_name or kwargs.get('table_name')
+        if not table_name:
+            raise ValueError("No table to load: table_name is neither configured nor produced")
+        self._entity = table_name
+        self._entity_filter = None
+        if df.shape[0] == 0:
+            return dict(record_count=0)
+
+        # [database.][schema.]table
+        *qualifiers, table = table_name.split('.')
+        database, schema = ([None] * (2 - len(qualifiers)) + qualifiers)[-2:]
+
+        self._logger.info("Loading %d rows into %s, %d rows per file", df.shape[0], table_name, self.__chunk_size)
+        with self.__dao.connection as conn:
+            success, chunks, rows, _ = write_pandas(conn, df, table, database=database, schema=schema,
+                                                    chunk_size=self.__chunk_size, compression=self.__compression,
+                                                    parallel=self.__parallel,
+                                                    quote_identifiers=self.__quote_identifiers)
+        if not success:
+            raise RuntimeError("Failed to load %s: %d of %d rows loaded from %d files" % (table_name, rows,
+                                                                                          df.shape[0], chunks))
+        return dict(record_count=rows)
@@ -11,18 +11,49 @@
 # WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
 # See the License for the specific language governing permissions and
 # limitations under the License.
-from hdm.core.sink.sink import Sink
-from hdm.core.dao.snowflake import Snowflake
-from pandas import DataFrame
+import math
 import os
 from tempfile import TemporaryDirectory
 
+from pandas import DataFrame
+
+from hdm.core.dao.snowflake import Snowflake
+from hdm.core.sink.sink import Sink
+from hdm.core.utils.file_format import Compression, FileFormat, FileFormatType
+from hdm.core.utils.generic_functions import GenericFunctions
+from hdm.core.utils.project_config import ProjectConfig
+
 
-# pandas_tools in the snowflake python connector has bugs prevent it from being used, so have to upload to stages and
-# copy into tables manually
-# TODO : check and Remove this. not needed anymore
 class SnowflakeInternalStageSink(Sink):
+    """
+    Uploads dataframes to an internal stage with PUT, and optionally loads them into the table with COPY INTO
+
+    Expected protocol for configuration:
+    env: section name in hdm profile yml file for the Snowflake connection
+    stage_name: internal stage uploaded to, created when it does not exist
+    table_name: table the data is for
+    file_format: csv | parquet | default csv
+    compression: gzip | zstd for csv, codec for parquet | default gzip for csv, snappy for parquet
+    max_file_size: largest file uploaded, in compressed bytes - larger frames are split | default 128 MiB
+    parallel: files uploaded at a time by PUT | default 4
+    copy: load the files uploaded into the table with COPY INTO | default False
+
+    The files of a dataframe are uploaded to <stage_name>/<table folder>/ by a single PUT. They are compressed when they
+    are written, so PUT does not compress them again. A COPY INTO, when configured, lists the files uploaded - and the
+    record count is then the rows it loaded.
+    """
+    # Rows written to estimate how many rows fit in max_file_size
+    SAMPLE_ROWS = 10000
+    __source_compression = {
+        Compression.GZIP.value: 'GZIP',
+        Compression.ZSTD.value: 'ZSTD',
+    }
+
     def __init__(self, **kwargs):
+        """
+        Raises:
+            ValueError: If the file format or csv compression is unknown, or max_file_size or parallel is not positive
+        """
         super().__init__(**kwargs)
         self.__env = kwargs['env']
         self.__dao = Snowflake(connection=self.__env)
@@ -30,30 +61,127 @@ class SnowflakeInternalStageSink(Sink):
         self.__table_name = kwargs['table_name']
         self._entity = f"{self.__stage_name}.{self.__table_name}"
 
+        self.__file_format = kwargs.get('file_format', FileFormatType.CSV.value).lower()
+        default_compression = Compression.GZIP.value if self.__file_format == FileFormatType.CSV.value else None
+        self.__compression = kwargs.get('compression', default_compression)
+        self.__compression = self.__compression.lower() if self.__compression else None
+        # validates the file format and csv compression
+        self.__extension = FileFormat.extension(self.__file_format, self.__compression)
+
+        self.__max_file_size = kwargs.get('max_file_size', 128 * 1024 * 1024)
+        if not isinstance(self.__max_file_size, int) or self.__max_file_size <= 0:
+            raise ValueError("max_file_size must be a positive number of bytes: %s" % self.__max_file_size)
+        self.__parallel = kwargs.get('parallel', 4)
+        if not isinstance(self.__parallel, int) or self.__parallel <= 0:
+            raise ValueError("parallel must be a positive number: %s" % self.__parallel)
+        self.__copy = kwargs.get('copy', False)
+        self.__stage_created = False
+
     def produce(self, **kwargs):
         self._run(**kwargs)
 
     # takes a dictionary of {'data_frame': DataFrame}
     def _set_data(self, **kwargs) -> dict:
         df = kwargs['data_frame']
-        # write dataframe to temp file. does not handle large data well. see pandas_tools.py in the snowflake
-        # connector for how to chunk properly
+        if df.shape[0] == 0:
+            return dict(record_count=0)
+
+        folder = GenericFunctions.table_to_folder(self.__table_name)
+        file_prefix = f"{ProjectConfig.file_prefix()}_{kwargs['current_state']['correlation_id_out']}"
         with TemporaryDirectory() as tmp_folder:
-            file_path = os.path.join(tmp_folder, f'{self.__table_name}.csv.gz')
-            self.__create_temp_file(df, file_path)
+            files = self.__write_files(df, tmp_folder, file_prefix)
 
             with self.__dao.connection as conn:
                 cursor = conn.cursor()
+                if not self.__stage_created:
+                    cursor.execute(f"CREATE STAGE IF NOT EXISTS {self.__stage_name}")
+                    self.__stage_created = True
+
+                self._logger.info("Uploading %d files to @%s/%s", len(files), self.__stage_name, folder)
+                cursor.execute(self._generate_put_query(tmp_folder, file_prefix, folder))
+
+                if not self.__copy:
+                    return dict(record_count=df.shape[0])
+
+                self._logger.info("Executing copy of %d files from @%s/%s into %s", len(files), self.__stage_name,
+                                  folder, self.__table_name)
+                cursor.execute(self._generate_copy_query([f"{folder}/{file}" for file in files]))
+                return dict(record_count=self.__rows_loaded(cursor))
+
+    def __write_files(self, df: DataFrame, directory: str, file_prefix: str) -> list:
+        """
+        Write a dataframe to compressed files of at most about max_file_size bytes each.
+        Args:
+            df: dataframe to write
+            directory: directory the files are written to
+            file_prefix: start of the name of every file
+
+        Returns: names of the files written
+
+        """
+        # Bytes per row, from the compressed size of a sample of the rows
+        sample = df.iloc[:self.SAMPLE_ROWS]
+        sample_size = sum(len(data) for data in FileFormat.encode_data_frame(sample, self.__file_format,
+                                                                              self.__compression))
+        file_rows = max(int(self.__max_file_size / (sample_size / sample.shape[0])), 1)
+        file_count = math.ceil(df.shape[0] / file_rows)
+
+        files = []
+        for seq in range(file_count):
+            file_name = f"{file_prefix}_{seq + 1}{self.__extension}"
+            FileFormat.write_data_frame(df.iloc[seq * file_rows:(seq + 1) * file_rows],
+                                        os.path.join(directory, file_name), self.__file_format, self.__compression)
+            files.append(file_name)
+        return files
+
+    def _generate_put_query(self, directory: str, file_prefix: str, folder: str) -> str:
+        """
+        Generate the PUT of the files of a dataframe.
+        Args:
+            directory: directory the files are in
+            file_prefix: start of the name of every file
+            folder: folder of the stage uploaded to
+
+        Returns: PUT statement
+
+        """
+        if self.__file_format == FileFormatType.PARQUET.value:
+            # Compressed within the file
+            compression = "AUTO_COMPRESS = FALSE"
+        elif self.__compression:
+            compression = f"AUTO_COMPRESS = FALSE SOURCE_COMPRESSION = {self.__source_compression[self.__compression]}"
+        else:
+            compression = "AUTO_COMPRESS = TRUE"
+        path = os.path.join(directory, f"{file_prefix}_*{self.__extension}").replace('\\', '/')
+        return f"PUT 'file://{path}' @{self.__stage_name}/{folder}/ " \
+               f"PARALLEL = {self.__parallel} " \
+               f"{compression} " \
+               f"OVERWRITE = TRUE"
+
+    def _generate_copy_query(self, files: list) -> str:
+        """
+        Generate the COPY INTO of the files of a dataframe into the table.
+        Args:
+            files: paths of the files in the stage
 
-                # create stage
-                create_stage_sql = f"CREATE STAGE IF NOT EXISTS {self.__stage_name}"
-                cursor.execute(create_stage_sql)
+        Returns: COPY INTO statement
 
-                # run put command
-                upload_sql = f"PUT file://{file_path} @{self.__stage_name} OVERWRITE = TRUE"
-                cursor.execute(upload_sql)
-        return dict(record_count=df.shape[0])
+        """
+        if self.__file_format == FileFormatType.PARQUET.value:
+            file_format = "FILE_FORMAT = (TYPE = PARQUET) MATCH_BY_COLUMN_NAME = CASE_INSENSITIVE"
+        else:
+            file_format = "FILE_FORMAT = (TYPE = CSV SKIP_HEADER = 1 FIELD_OPTIONALLY_ENCLOSED_BY = '\"')"
+        file_list = ", ".join(f"'{file}'" for file in files)
+        return f"COPY INTO {self.__table_name} " \
+               f"FROM @{self.__stage_name} " \
+               f"FILES = ({file_list}) " \
+               f"{file_format} " \
+               f"PURGE = TRUE"
 
-    def __create_temp_file(self, df: DataFrame, file_path: str):
-        # csv file created has issues with timetz column types, removed for now
-        df.to_csv(file_path, index=False)
+    def __rows_loaded(self, cursor) -> int:
+        """
+        Rows loaded by a COPY INTO. COPY INTO fails unless every file loads.
+        """
+        columns = [column[0].lower() for column in cursor.description]
+        rows = [dict(zip(columns, row)) for row in cursor.fetchall()]
+        return sum(int(row.get('rows_loaded') or 0) for row in rows)
@@ -11,63 +11,142 @@
 # WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
 # See the License for the specific language governing permissions and
 # limitations under the License.
+import tempfile
+from collections import deque
+from concurrent.futures import Future, ThreadPoolExecutor
+
 import pandas as pd
+from azure.storage.blob import ContainerClient
 
 from hdm.core.dao.azure_blob import AzureBLOB
 from hdm.core.source.source import Source
+from hdm.core.utils.file_format import FileFormat
 from hdm.core.utils.generic_functions import GenericFunctions
 from hdm.core.utils.project_config import ProjectConfig
 
 
 class AzureBlobSource(Source):
+    """
+    Azure blob storage source
+
+    Expected protocol for configuration:
+    env: section name in hdm profile yml file for connection information
+    container: container the blobs are read from
+    max_concurrency: number of ranges of a blob downloaded at the same time | default 4
+    parallelism: number of blobs read at the same time | default 4
+
+    Only the blobs named <source name>/<table folder>/<file>, as written by AzureBlobSink, are listed. Blobs are csv,
+    gzip or zstd compressed csv, or parquet, known from their extension. A blob is sourced once, and again if its size
+    or last modified time changes - the blobs sourced are recorded in the state table, as for FSSource.
+    Blobs are downloaded through the azure client concurrently, each spooled to memory, or to disk when large, and are
+    run in name order.
+    """
+    # Size in bytes of a blob from which it is spooled to disk
+    SPOOL_SIZE = 64 * 1024 * 1024
 
     def __init__(self, **kwargs):
+        """
+        Construct an instance of the AzureBlobSource.
+        Args:
+            **kwargs:
+                env: section name in hdm profile yml file for connection information
+                container: container name
+                max_concurrency: number of ranges of a blob downloaded at the same time
+                parallelism: number of blobs read at the same time
+        Raises:
+            ValueError: If max_concurrency or parallelism is not a positive integer
+        """
         super().__init__(**kwargs)
 
         self.__container_name = kwargs['container']
         self.__env = kwargs['env']
 
-        self.__azure_dao = AzureBLOB(connection=self.__env)
-        self.__container = None
-        self.__file_format = kwargs.get('file_format', 'csv')
+        self.__azure_dao = AzureBLOB(connection=self.__env, container=self.__container_name)
+        self.__prefix = f"{self._source_name}/"
+        self.__max_concurrency = kwargs.get('max_concurrency', 4)
+        self.__parallelism = kwargs.get('parallelism', 4)
+        for name, value in [('max_concurrency', self.__max_concurrency), ('parallelism', self.__parallelism)]:
+            if not isinstance(value, int) or value < 1:
+                raise ValueError("%s must be a positive integer: %s" % (name, value))
 
     def consume(self, **kwargs) -> dict:
-        with self.__azure_dao.connection as client:
-            self.__container = client.get_container_client(self.__container_name)
-            for blob_prop in self.__container.list_blobs():
-                self._entity = blob_prop.name.split(self._source_name + "/")[1].split("/")[1]
-                self._entity_filter = None
-
-                kwargs['file'] = self._entity
-                kwargs['path'] = blob_prop
-                kwargs['table_name'] = GenericFunctions.folder_to_table(blob_prop.name.split(self._source_name + "/")[1].split("/")[0])
-                try:
-                    self._correlation_id_in = blob_prop.name.split(self._source_name + "/")[1].split("/")[1].split(f'{ProjectConfig.file_prefix()}_', 1)[1][0:-4]
-                except Exception:
-                    self._correlation_id_in = None
-
-                yield self._run(**kwargs)
+        """
+        Yields a dataframe for each blob of the source not sourced yet
+        Args:
+            **kwargs
+        """
+        # The client of the container is shared by the process, see AzureBLOB. It can be shared by threads.
+        container = self.__azure_dao.container
+        self._logger.info("Reading %s/%s", self.__container_name, self.__prefix)
 
-    def _get_data(self, **kwargs) -> dict:
-        file = kwargs['file']
-        path = kwargs['path']
-        table_name = kwargs['table_name']
-        blob_client = self.__container.get_blob_client(path)
-        file_url = blob_client.url
-        df = self.__process_file(file_url)
+        # Blobs being read, in name order. At most parallelism are read ahead of the one being run.
+        pending = deque()
+        with ThreadPoolExecutor(max_workers=self.__parallelism) as executor:
+            try:
+                for location, file, stat in self.__list_blobs(container):
+                    blob_name = f"{self.__prefix}{location}/{file}"
+                    pending.append((location, file, stat, executor.submit(self.__read_blob, container, blob_name)))
+                    if len(pending) > self.__parallelism:
+                        yield from self.__run_blob(*pending.popleft(), **kwargs)
+                while pending:
+                    yield from self.__run_blob(*pending.popleft(), **kwargs)
+            finally:
+                for *_, future in pending:
+                    future.cancel()
 
-        return {'data_frame': df,
-                'file_name': file,
-                'record_count': df.shape[0],
-                'table_name': table_name}
+    def __list_blobs(self, container: ContainerClient):
+        """
+        Lists the blobs of the source not sourced yet, in name order, a page at a time.
+
+        Returns: generator of (table folder, file name, (size, last modified time in nanoseconds))
 
-    def __process_file(self, filename: str) -> pd.DataFrame:
         """
-        Return Dataframe for a file.
-        Args:
-            filename: Filename to be loaded to a dataframe
+        for page in container.list_blobs(name_starts_with=self.__prefix).by_page():
+            # table folder -> file name -> stat, of the blobs of the page
+            locations = {}
+            for blob in page:
+                location, _, file = blob.name[len(self.__prefix):].rpartition('/')
+                if not location:
+                    self._logger.debug("Skipping %s, not in a table folder", blob.name)
+                    continue
+                locations.setdefault(location, {})[file] = (blob.size,
+                                                            int(blob.last_modified.timestamp()) * 1000000000)
+
+            for location, stats in locations.items():
+                processed = self._state_manager.get_processed_files(location, stats)
+                for file, stat in stats.items():
+                    if file not in processed:
+                        yield location, file, stat
+
+    def __read_blob(self, container: ContainerClient, blob_name: str) -> pd.DataFrame:
+        """
+        Runs on an executor thread - download a blob, max_concurrency ranges at a time, and parse it.
         """
-        df = None
-        if self.__file_format.lower() == 'csv':
-            df = pd.read_csv(filename)
-        return df
+        with tempfile.SpooledTemporaryFile(max_size=self.SPOOL_SIZE) as file:
+            container.get_blob_client(blob_name).download_blob(max_concurrency=self.__max_concurrency).readinto(file)
+            file.seek(0)
+            return FileFormat.read_data_frame(blob_name, stream=file)
+
+    def __run_blob(self, location: str, file: str, stat: tuple, data_frame: Future, **kwargs) -> dict:
+        self._entity = file
+        self._entity_filter = None
+
+        kwargs['file'] = file
+        kwargs['object_name'] = f"{self.__prefix}{location}/{file}"
+        kwargs['data_frame'] = data_frame
+        kwargs['table_name'] = GenericFunctions.folder_to_table(location)
+        try:
+            self._correlation_id_in = FileFormat.strip_extension(file).split(f'{ProjectConfig.file_prefix()}_', 1)[1]
+        except Exception:
+            self._correlation_id_in = None
+
+        yield self._run(**kwargs)
+        self._state_manager.record_processed_file(location, file, *stat)
+
+    def _get_data(self, **kwargs) -> dict:
+        df = kwargs['data_frame'].result()
+        return {'data_frame': df,
+                'file_name': kwargs['file'],
+                'object_name': kwargs['object_name'],
+                'record_count': df.shape[0],
+                'table_name': kwargs['table_name']}
@@ -12,12 +12,14 @@
 # See the License for the specific language governing permissions and
 # limitations under the License.
 import os
-import shutil
 import uuid
+from concurrent.futures import ThreadPoolExecutor
 from distutils.util import strtobool
-from itertools import chain
 import pandas as pd
 
+from hdm.core.utils.file_format import FileFormat, FileFormatType
+from hdm.core.utils.fs_scanner import FSScanner
+from hdm.core.utils.fs_watcher import FSWatcher
 from hdm.core.utils.generic_functions import GenericFunctions
 from hdm.core.utils.project_config import ProjectConfig
 from hdm.core.source.source import Source
@@ -29,8 +31,28 @@ class FSChunkSource(Source):
 
      Expected protocol for configuration:
      directory: Source directory containing files to be processed.
+                Files are csv, gzip or zstd compressed csv, or parquet, known from their extension. Chunk files are
+                written in the format of the file chunked.
+     chunk: Number of records per chunk file.
+     chunk_bytes: Approximate size in bytes of each chunk file. The file is split at the first newline after every
+                  chunk_bytes and the chunk files are written concurrently.
+     parallelism: Number of chunk files written at the same time with chunk_bytes.
+     pass_through: Pass the path of each chunk file to the sink instead of a dataframe.
+     include: Glob pattern, or list of patterns, of the files to process. A pattern with a / is matched against the
+              path of the file relative to the directory, any other against the file name.
+     exclude: Glob pattern, or list of patterns, of the files not to process.
+     min_age: Seconds since a file was last modified before it is processed, to skip files still being written.
+     order: Order the files of a directory are processed in, name or mtime.
+     watch: Keep running, processing files as they land in the directory, see FSWatcher.
+     poll_interval: Longest time in seconds between scans of the directory when watching.
+     watch_timeout: Seconds without a new file after which watching stops. Watches until stopped when not set.
+
+     A file is chunked once. It is chunked again if its size or modification time changes.
      """
 
+    # Bytes read from the file being chunked at a time
+    __buffer_size = 1024 * 1024
+
     def __init__(self, **kwargs):
         """
         Construct an instance of the FSSource.
@@ -39,6 +61,9 @@ class FSChunkSource(Source):
             **kwargs: must have a source_dir
         Raises:
             NotADirectoryError: If directory specified in directory does not exist
+            ValueError: If both chunk and chunk_bytes are specified, or chunk_bytes is not a positive integer, or
+                        min_age is negative, or order is not name or mtime, or poll_interval or watch_timeout is
+                        not a valid number of seconds
         """
         super().__init__(**kwargs)
         # Check if location for files to process exists
@@ -50,63 +75,110 @@ class FSChunkSource(Source):
         self._entity = self.__source_path
         self.__file_format = kwargs.get('file_format', 'csv')
         self.__chunk = kwargs.get('chunk', None)
+        self.__pass_through = kwargs.get('pass_through', False)
+        self.__chunk_bytes = kwargs.get('chunk_bytes', None)
+        self.__parallelism = kwargs.get('parallelism', None)
+        self.__scanner = FSScanner(include=kwargs.get('include'), exclude=kwargs.get('exclude'),
+                                   min_age=kwargs.get('min_age', 0), order=kwargs.get('order', 'name'))
+        self.__watcher = FSWatcher(poll_interval=kwargs.get('poll_interval', 5),
+                                   watch_timeout=kwargs.get('watch_timeout')) if kwargs.get('watch', False) else None
+        if self.__chunk_bytes is not None:
+            if self.__chunk:
+                raise ValueError("Only one of chunk and chunk_bytes can be specified")
+            if not isinstance(self.__chunk_bytes, int) or self.__chunk_bytes < 1:
+                raise ValueError("chunk_bytes must be a positive integer: %s" % self.__chunk_bytes)
 
     def consume(self, **kwargs) -> dict:
         """
-        Iterates over the source directory and processes files.
+        Iterates over the source directory and processes files. When watching, iterates again each time files land.
+        Args:
+            **kwargs
+        """
+        if not self.__watcher:
+            yield from self.__scan(**kwargs)
+            return
+
+        # State buffered with write_behind is written before waiting, rather than when the next file lands.
+        yield from self.__watcher.watch(self.__source_path, lambda: self.__scan(**kwargs),
+                                        before_wait=self._state_manager.flush)
+
+    def __scan(self, **kwargs) -> dict:
+        """
+        Processes the files of the source directory not processed yet.
         Args:
             **kwargs
         """
         # TODO: Currently assuming directory only has CSV files
         # TODO: Add support for other files types later
-        for root, dirs, files in os.walk(self.__source_path):
-            for file in set(files).difference(set(chain(*self._processed_history_list))):
+        for root, stats in self.__scanner.scan(self.__source_path):
+            location = os.path.relpath(root, self.__source_path)
+            processed = self._state_manager.get_processed_files(location, stats)
+            for file in [file for file in stats if file not in processed]:
                 self._logger.debug("Yielding file: %s", file)
                 to_process = str(os.path.join(root, file))
                 self._logger.info("Processing %s...", to_process)
 
-                if not bool(os.path.isfile(to_process)):
-                    continue
-
                 # Get table name from file path
                 table_name = GenericFunctions.folder_to_table(root.split(self.__source_path)[1][1:])
 
-                # Loop through each chunk file and generate dataframes for fs_sink to consume
+                # Each chunk file is run as soon as it is written
                 cnt = 0
-                for chunked_file in self.__chunk_file(file, root, self._sink_name, table_name):
+                if self.__chunk_bytes and FileFormat.is_plain(file):
+                    chunked_files = self.__chunk_file_by_bytes(file, root, self._sink_name, table_name)
+                elif FileFormat.detect(file)[0] == FileFormatType.PARQUET.value:
+                    chunked_files = self.__chunk_parquet_file(file, root, self._sink_name, table_name)
+                else:
+                    if self.__chunk_bytes:
+                        self._logger.info("%s can not be split by bytes, it is a single chunk", to_process)
+                    chunked_files = self.__chunk_file(file, root, self._sink_name, table_name)
+                for chunked_file, record_count in chunked_files:
                     cnt += 1
                     self._entity = file
                     if self.__chunk:
                         self._entity_filter = [{'chunk': f'{self.__chunk}', 'seq': f'{cnt}'}]
+                    elif self.__chunk_bytes:
+                        self._entity_filter = [{'chunk_bytes': f'{self.__chunk_bytes}', 'seq': f'{cnt}'}]
 
                     kwargs['file'] = chunked_file
+                    kwargs['record_count'] = record_count
                     kwargs['source_file'] = self._entity
                     kwargs['source_filter'] = self._entity_filter
                     kwargs['table_name'] = table_name
                     kwargs['path'] = os.path.join(self.__source_base_path, self._sink_name, GenericFunctions.table_to_folder(table_name))
 
                     try:
-                        self._correlation_id_in = file.split(f'{ProjectConfig.file_prefix()}_', 1)[1][0:-4]
-                        self._correlation_id_out = chunked_file.split(f'{ProjectConfig.file_prefix()}_', 1)[1][0:-4]
+                        self._correlation_id_in = FileFormat.strip_extension(file).split(f'{ProjectConfig.file_prefix()}_', 1)[1]
+                        self._correlation_id_out = FileFormat.strip_extension(chunked_file).split(f'{ProjectConfig.file_prefix()}_', 1)[1]
                     except Exception:
                         self._correlation_id_in = None
                         self._correlation_id_out = None
 
                     yield self._run(**kwargs)
 
+                self._state_manager.record_processed_file(location, file, *stats[file])
+
     def _get_data(self, **kwargs) -> dict:
         file = kwargs['file']
         source_file = kwargs['source_file']
         source_filter = kwargs['source_filter']
         path = kwargs['path']
         table_name = kwargs['table_name']
+        record_count = kwargs['record_count']
+
+        if self.__pass_through:
+            return dict(file_path=os.path.abspath(os.path.join(path, file)),
+                        file_name=file,
+                        parent_file_name=source_file,
+                        record_count=record_count,
+                        table_name=table_name,
+                        source_filter=source_filter)
 
         df = self.__process_file(str(os.path.join(path, file)))
 
         return dict(data_frame=df,
                     file_name=file,
                     parent_file_name=source_file,
-                    record_count=df.shape[0],
+                    record_count=record_count,
                     table_name=table_name,
                     source_filter=source_filter)
 
@@ -116,53 +188,199 @@ class FSChunkSource(Source):
         Args:
             filename: Filename to be loaded to a dataframe
         """
-        df = None
-        if self.__file_format.lower() == 'csv':
-            df = pd.read_csv(filename)
-        return df
+        return FileFormat.read_data_frame(filename)
 
-    def __chunk_file(self, file_name, root, sink_name, table_name) -> list:
+    def __chunk_file(self, file_name, root, sink_name, table_name):
         """
-        chunk csv file type
-        Return list
+        chunk csv file type in a single pass.
+        The file is read in large blocks and written straight to chunk files, each starting with the header, so only a
+        block is held in memory. Compressed files are decompressed as they are read and the chunk files compressed the
+        same way. Each chunk file is yielded as soon as it is closed, records counted from the newlines
+        written to it.
         Args:
             file_name: file name to be chunked
+            root: directory of the file
+            sink_name: sink name, the folder the chunk files are written to
+            table_name: table name, the sub folder the chunk files are written to
+
+        Returns: generator of chunk file name and record count
+
         """
-        chunk_file_lst = []
+        to_process = os.path.abspath(os.path.join(root, file_name))
+        target_directory = os.path.join(self.__source_base_path, sink_name, GenericFunctions.table_to_folder(table_name))
+        if not os.path.exists(target_directory):
+            os.makedirs(target_directory)
+
+        _, compression = FileFormat.detect(file_name)
+        extension = FileFormat.extension(FileFormatType.CSV.value, compression)
+        chunk = None
         try:
-            to_process = os.path.abspath(os.path.join(root, file_name))
-
-            with open(to_process, 'r') as file:
-                csv_file = file.readlines()
-            header = csv_file[0]
-            csv_file.pop(0)
-            idx = 0
-
-            target_directory = os.path.join(self.__source_base_path, sink_name, GenericFunctions.table_to_folder(table_name))
-            if not os.path.exists(target_directory):
-                # print('Folder not found. Creating one')
-                os.makedirs(target_directory)
-
-            if len(csv_file) > self.__chunk:
-                for j in range(len(csv_file)):
-                    if j % self.__chunk == 0:
-                        write_file = csv_file[j:j + self.__chunk]
-                        write_file.insert(0, header)
-                        try:
-                            chunked_file_name = f"{ProjectConfig.file_prefix()}_{uuid.uuid4().hex}.csv"
-                            with open(os.path.abspath(os.path.join(target_directory,
-                                                                   chunked_file_name)), 'w+') as file:
-                                file.writelines(write_file)
-                            idx += 1
-
-                            chunk_file_lst.append(chunked_file_name)
-                        except Exception as e:
-                            self._logger.error("Got exception: %s while creating %s", e, chunked_file_name)
-            else:
-                # still copy the file to target_folder, as next stage will pick file from sink_name folder
-                _ = shutil.copy(to_process, target_directory)
-
-            return chunk_file_lst
-
-        except Exception as e:
-            self._logger.error("Got exception: %s in chunking %s", e, to_process)
+            with FileFormat.open(to_process, 'rb', compression) as source:
+                header = source.readline()
+                if header and not header.endswith(b'\n'):
+                    header += b'\n'
+
+                chunked_file_name = None
+                record_count = 0
+                last = b'\n'
+                for block in iter(lambda: source.read(self.__buffer_size), b''):
+                    last = block[-1:]
+                    while block:
+                        if chunk is None:
+                            chunked_file_name = f"{ProjectConfig.file_prefix()}_{uuid.uuid4().hex}{extension}"
+                            chunk = FileFormat.open(os.path.abspath(os.path.join(target_directory, chunked_file_name)),
+                                                    'wb', compression)
+                            chunk.write(header)
+                            record_count = 0
+
+                        # Without a chunk size the file is a single chunk
+                        needed = self.__chunk - record_count if self.__chunk else None
+                        newlines = block.count(b'\n')
+                        if needed is None or newlines < needed:
+                            # The whole block belongs to this chunk
+                            record_count += newlines
+                            chunk.write(block)
+                            break
+
+                        end = 0
+                        for _ in range(needed):
+                            end = block.index(b'\n', end) + 1
+                        chunk.write(block[:end])
+                        chunk.close()
+                        chunk = None
+                        yield chunked_file_name, self.__chunk
+                        block = block[end:]
+
+                if chunk is not None:
+                    if last != b'\n':
+                        # last line is not terminated
+                        record_count += 1
+                    chunk.close()
+                    chunk = None
+                    if record_count:
+                        yield chunked_file_name, record_count
+                    else:
+                        os.remove(os.path.abspath(os.path.join(target_directory, chunked_file_name)))
+        finally:
+            if chunk is not None:
+                chunk.close()
+
+    def __chunk_parquet_file(self, file_name, root, sink_name, table_name):
+        """
+        chunk parquet file type, reading it in batches so only a chunk is held in memory.
+        Without a chunk size the file is chunked by row group.
+        Args:
+            file_name: file name to be chunked
+            root: directory of the file
+            sink_name: sink name, the folder the chunk files are written to
+            table_name: table name, the sub folder the chunk files are written to
+
+        Returns: generator of chunk file name and record count
+
+        """
+        to_process = os.path.abspath(os.path.join(root, file_name))
+        target_directory = os.path.join(self.__source_base_path, sink_name, GenericFunctions.table_to_folder(table_name))
+        if not os.path.exists(target_directory):
+            os.makedirs(target_directory)
+
+        for table in FileFormat.iter_tables(to_process, self.__chunk):
+            chunked_file_name = f"{ProjectConfig.file_prefix()}_{uuid.uuid4().hex}" \
+                                f"{FileFormat.extension(FileFormatType.PARQUET.value)}"
+            FileFormat.write_table(table, os.path.abspath(os.path.join(target_directory, chunked_file_name)))
+            yield chunked_file_name, table.num_rows
+
+    def __chunk_file_by_bytes(self, file_name, root, sink_name, table_name):
+        """
+        chunk csv file type into byte ranges.
+        The file is split at the first newline at or after every chunk_bytes, found by seeking, so it is not scanned.
+        The ranges are copied to chunk files, each starting with the header, by a pool of workers. Chunk files are
+        yielded in order, each as soon as it and the ones before it are written.
+        Args:
+            file_name: file name to be chunked
+            root: directory of the file
+            sink_name: sink name, the folder the chunk files are written to
+            table_name: table name, the sub folder the chunk files are written to
+
+        Returns: generator of chunk file name and record count
+
+        """
+        to_process = os.path.abspath(os.path.join(root, file_name))
+        target_directory = os.path.join(self.__source_base_path, sink_name, GenericFunctions.table_to_folder(table_name))
+        if not os.path.exists(target_directory):
+            os.makedirs(target_directory)
+
+        header, ranges = self.__split_file(to_process)
+        if not ranges:
+            return
+
+        parallelism = min(self.__parallelism if self.__parallelism else os.cpu_count() or 1, len(ranges))
+        self._logger.info("Chunking %s in %d byte ranges, %d at a time", to_process, len(ranges), parallelism)
+        with ThreadPoolExecutor(max_workers=parallelism) as executor:
+            futures = [executor.submit(self.__write_range, to_process, header, start, end, target_directory)
+                       for start, end in ranges]
+            try:
+                for future in futures:
+                    yield future.result()
+            finally:
+                for future in futures:
+                    future.cancel()
+
+    def __split_file(self, to_process) -> tuple:
+        """
+        Find the header and the byte ranges of the records of a file, each range ending at a newline.
+        Args:
+            to_process: file to split
+
+        Returns: header and list of start and end offsets
+
+        """
+        size = os.path.getsize(to_process)
+        with open(to_process, 'rb') as source:
+            header = source.readline()
+            if header and not header.endswith(b'\n'):
+                header += b'\n'
+
+            ranges = []
+            start = source.tell()
+            while start < size:
+                source.seek(start + self.__chunk_bytes - 1)
+                # read to the end of the line the boundary falls in
+                source.readline()
+                end = min(source.tell(), size)
+                ranges.append((start, end))
+                start = end
+        return header, ranges
+
+    def __write_range(self, to_process, header, start, end, target_directory) -> tuple:
+        """
+        Runs on an executor thread - copy a byte range of a file to a chunk file of its own.
+        Args:
+            to_process: file being chunked
+            header: header line of the file
+            start: offset of the first byte of the range
+            end: offset after the last byte of the range
+            target_directory: directory the chunk file is written to
+
+        Returns: chunk file name and record count
+
+        """
+        chunked_file_name = f"{ProjectConfig.file_prefix()}_{uuid.uuid4().hex}.csv"
+        record_count = 0
+        last = b'\n'
+        with open(to_process, 'rb') as source, \
+                open(os.path.abspath(os.path.join(target_directory, chunked_file_name)), 'wb') as chunk:
+            chunk.write(header)
+            source.seek(start)
+            remaining = end - start
+            while remaining:
+                block = source.read(min(self.__buffer_size, remaining))
+                if not block:
+                    break
+                record_count += block.count(b'\n')
+                last = block[-1:]
+                chunk.write(block)
+                remaining -= len(block)
+        if last != b'\n':
+            # last line is not terminated
+            record_count += 1
+        return chunked_file_name, record_count
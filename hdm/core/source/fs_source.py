@@ -13,9 +13,11 @@
 # limitations under the License.
 import os
 from distutils.util import strtobool
-from itertools import chain
 import pandas as pd
 
+from hdm.core.utils.file_format import FileFormat
+from hdm.core.utils.fs_scanner import FSScanner
+from hdm.core.utils.fs_watcher import FSWatcher
 from hdm.core.utils.generic_functions import GenericFunctions
 from hdm.core.utils.project_config import ProjectConfig
 from hdm.core.source.source import Source
@@ -27,6 +29,18 @@ class FSSource(Source):
 
      Expected protocol for configuration:
      directory: Source directory containing files to be processed.
+                Files are csv, gzip or zstd compressed csv, or parquet, known from their extension.
+     pass_through: Pass the path of each file to the sink instead of a dataframe. The sink copies the file as is.
+     include: Glob pattern, or list of patterns, of the files to process. A pattern with a / is matched against the
+              path of the file relative to the directory, any other against the file name.
+     exclude: Glob pattern, or list of patterns, of the files not to process.
+     min_age: Seconds since a file was last modified before it is processed, to skip files still being written.
+     order: Order the files of a directory are processed in, name or mtime.
+     watch: Keep running, processing files as they land in the directory, see FSWatcher.
+     poll_interval: Longest time in seconds between scans of the directory when watching.
+     watch_timeout: Seconds without a new file after which watching stops. Watches until stopped when not set.
+
+     A file is sourced once. It is sourced again if its size or modification time changes.
      """
 
     def __init__(self, **kwargs):
@@ -37,6 +51,8 @@ class FSSource(Source):
             **kwargs: must have a source_dir
         Raises:
             NotADirectoryError: If directory specified in directory does not exist
+            ValueError: If min_age is negative, order is not name or mtime, or poll_interval or watch_timeout is not
+                        a valid number of seconds
         """
         super().__init__(**kwargs)
         # Check if location for files to process exists
@@ -46,24 +62,42 @@ class FSSource(Source):
         self.__source_path = os.path.abspath(os.path.join(self.__source_base_path, self._source_name))
         # self._entity = self.__source_path
         self.__file_format = kwargs.get('file_format', 'csv')
+        self.__pass_through = kwargs.get('pass_through', False)
+        self.__scanner = FSScanner(include=kwargs.get('include'), exclude=kwargs.get('exclude'),
+                                   min_age=kwargs.get('min_age', 0), order=kwargs.get('order', 'name'))
+        self.__watcher = FSWatcher(poll_interval=kwargs.get('poll_interval', 5),
+                                   watch_timeout=kwargs.get('watch_timeout')) if kwargs.get('watch', False) else None
 
     def consume(self, **kwargs) -> dict:
         """
-        Iterates over the source directory and processes files.
+        Iterates over the source directory and processes files. When watching, iterates again each time files land.
+        Args:
+            **kwargs
+        """
+        if not self.__watcher:
+            yield from self.__scan(**kwargs)
+            return
+
+        # State buffered with write_behind is written before waiting, rather than when the next file lands.
+        yield from self.__watcher.watch(self.__source_path, lambda: self.__scan(**kwargs),
+                                        before_wait=self._state_manager.flush)
+
+    def __scan(self, **kwargs) -> dict:
+        """
+        Processes the files of the source directory not processed yet.
         Args:
             **kwargs
         """
         # TODO: Currently assuming directory only has CSV files
         # TODO: Add support for other files types later
-        for root, dirs, files in os.walk(self.__source_path):
-            for file in set(files).difference(set(chain(*self._processed_history_list))):
+        for root, stats in self.__scanner.scan(self.__source_path):
+            location = os.path.relpath(root, self.__source_path)
+            processed = self._state_manager.get_processed_files(location, stats)
+            for file in [file for file in stats if file not in processed]:
                 self._logger.debug("Yielding file: %s", file)
                 to_process = str(os.path.join(root, file))
                 self._logger.info("Processing %s...", to_process)
 
-                if not bool(os.path.isfile(to_process)):
-                    continue
-
                 self._entity = file
                 self._entity_filter = None
 
@@ -72,16 +106,24 @@ class FSSource(Source):
                 kwargs['table_name'] = GenericFunctions.folder_to_table(root.split(self.__source_path)[1][1:])
 
                 try:
-                    self._correlation_id_in = file.split(f'{ProjectConfig.file_prefix()}_', 1)[1][0:-4]
+                    self._correlation_id_in = FileFormat.strip_extension(file).split(f'{ProjectConfig.file_prefix()}_', 1)[1]
                 except Exception:
                     self._correlation_id_in = None
 
                 yield self._run(**kwargs)
+                self._state_manager.record_processed_file(location, file, *stats[file])
 
     def _get_data(self, **kwargs) -> dict:
         file = kwargs['file']
         path = kwargs['path']
         table_name = kwargs['table_name']
+        if self.__pass_through:
+            file_path = os.path.abspath(os.path.join(path, file))
+            return dict(file_path=file_path,
+                        file_name=file,
+                        record_count=GenericFunctions.count_records(file_path),
+                        table_name=table_name)
+
         df = self.__process_file(str(os.path.join(path, file)))
         return dict(data_frame=df,
                     file_name=file,
@@ -94,7 +136,4 @@ class FSSource(Source):
         Args:
             filename: Filename to be loaded to a dataframe
         """
-        df = None
-        if self.__file_format.lower() == 'csv':
-            df = pd.read_csv(filename)
-        return df
+        return FileFormat.read_data_frame(filename)
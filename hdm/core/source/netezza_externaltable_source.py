@@ -11,10 +11,10 @@
 # WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
 # See the License for the specific language governing permissions and
 # limitations under the License.
-import csv
 import os
-import time
 import uuid
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from contextlib import ExitStack
 
 import jaydebeapi as connector
 import enum
@@ -23,8 +23,8 @@ from hdm.core.dao.netezza_jdbc import NetezzaJDBC
 from hdm.core.dao.netezza_odbc import NetezzaODBC
 from hdm.core.source.source import Source
 from hdm.core.utils.generic_functions import GenericFunctions
+from hdm.core.utils.netezza_partition import NetezzaPartition
 from hdm.core.utils.project_config import ProjectConfig
-import pandas as pd
 
 
 class HashFunction(enum.Enum):
@@ -38,7 +38,10 @@ class NetezzaExternalTableSource(Source):
     Used when Netezza external table is used for data offload.
         - get column names and type from data table
         - create external table using column names
+        - unload one file per partition of the table, concurrently, each through its own external table
     Note: before each run if external table exist it is dropped and created.
+    The unloaded files are not read back - every file is a result of its own, carrying its path and the row count
+    reported by the unload.
     """
 
     def __init__(self, **kwargs):
@@ -53,63 +56,171 @@ class NetezzaExternalTableSource(Source):
         self.__connection_choice = kwargs['env']
         self.__table = kwargs['table_name']
         self.__watermark = kwargs.get('watermark', [])
-        self.__unload_file_name = ""
+        self.__partition = kwargs.get('partition', None)
+        self.__parallelism = kwargs.get('parallelism', None)
+        self.__unload_file_name = kwargs.get("file_name", None)
         self.__external_table_name = f"{self.__table}_{ProjectConfig.file_prefix().upper()}_EXT"
-        self.__drop_query = f"DROP TABLE {self.__external_table_name} IF EXISTS;"
-        self.__query = ""
         self._entity = self.__table
         self._entity_filter = self.__watermark
-        self._correlation_id_out = uuid.uuid4().hex
-        if self.__file_format == 'csv':
-            self.__unload_file_name = kwargs.get("file_name", f"{ProjectConfig.file_prefix()}"
-                                                              f"_{self._correlation_id_out}.csv")
-        else:
+        if self.__file_format != 'csv':
             raise NotImplementedError("Unknown output type: %s" % self.__file_format)
-        self._sink_entity = self.__unload_file_name
 
-        file_path = os.path.abspath(os.path.join(self.__dest_path, self._sink_name, GenericFunctions.table_to_folder(self.__table)))
-        if not os.path.exists(file_path):
-            os.makedirs(file_path)
-        self.__unload_file = os.path.abspath(os.path.join(file_path, self.__unload_file_name))
-        self.__driver_type = ""
-        self.__external_table_query = ""
+        self.__file_path = os.path.abspath(os.path.join(self.__dest_path, self._sink_name,
+                                                        GenericFunctions.table_to_folder(self.__table)))
+        if not os.path.exists(self.__file_path):
+            os.makedirs(self.__file_path)
+        self.__high_watermark = None
 
     def consume(self, **kwargs) -> dict:
-        yield self._run(**kwargs)
+        """
+        Unload the partitions of the table concurrently, each on its own connection, and run every unloaded file
+        through _run on this thread as soon as it is written - the state of a source is not shared between threads.
+        Without a partition configuration the whole table is the only partition.
+        The high watermark of the table is read before the unloads, and bounds all of them, so rows committed while the
+        table is unloaded are left to the next run. It is recorded with the last file only, once every partition is
+        unloaded - the files before it keep the previous watermark, so a partition that fails is unloaded again by the
+        next run. Once a partition fails, the unloads not started yet are cancelled.
+        """
+        self._logger.info("Unloading data from %s", self.__table)
+        # The watermark is read before the queries are built, as _run would otherwise do.
+        self._last_record_pulled = self._get_last_record()
+
+        with ExitStack() as stack:
+            conn = self.__open_connection(stack)
+            columns = self.__get_columns(conn)
+            if self.__partition:
+                predicates = NetezzaPartition.predicates(partition=self.__partition, table_name=self.__table,
+                                                         conn=conn)
+            else:
+                predicates = [None]
+            high_watermark = self.__get_high_watermark(conn)
+
+        if self.__watermark and self.__watermark['column'] and self.__watermark['offset']:
+            if high_watermark is None:
+                self._logger.info("No rows of %s above the watermark, nothing to unload", self.__table)
+                return
+            self.__high_watermark = f"{self.__watermark['column']}:{high_watermark}"
+
+        unloads = [self.__plan_unload(partition_seq, predicate, len(predicates), high_watermark)
+                   for partition_seq, predicate in enumerate(predicates, start=1)]
+        parallelism = min(self.__parallelism if self.__parallelism else len(unloads), len(unloads))
+        self._logger.info("Unloading %s in %d partitions, %d at a time", self.__table, len(unloads), parallelism)
+
+        with ThreadPoolExecutor(max_workers=parallelism) as executor:
+            futures = {executor.submit(self.__unload, unload, columns): unload for unload in unloads}
+            try:
+                for unloaded, future in enumerate(as_completed(futures), start=1):
+                    unload = futures[future]
+                    if future.exception():
+                        self._logger.error("Failed to unload partition %d of %s", unload['partition_seq'],
+                                           self.__table)
+                        raise future.exception()
+
+                    self._correlation_id_out = unload['correlation_id']
+                    self._sink_entity = unload['file_name']
+                    if self.__partition:
+                        self._entity_filter = [{'partition': f"{unload['partition_seq']}"}]
+                    kwargs['unload'] = unload
+                    kwargs['record_count'] = future.result()
+                    kwargs['last_unload'] = unloaded == len(unloads)
+                    yield self._run(**kwargs)
+            finally:
+                # On failure, or when the generator is abandoned, the executor only waits for the unloads running.
+                for future in futures:
+                    future.cancel()
 
     def _get_data(self, **kwargs) -> dict:
-        self.__build_query()
+        unload = kwargs['unload']
+        if kwargs['last_unload'] and self.__high_watermark is not None:
+            self._last_record_pulled = self.__high_watermark
+        return {'file_name': unload['file_name'],
+                'path': self.__file_path,
+                'file_path': unload['unload_file'],
+                'record_count': kwargs['record_count'],
+                'source_type': 'database',
+                'table_name': self.__table,
+                'source_entity': self.__table,
+                'source_filter': self._entity_filter}
+
+    def __plan_unload(self, partition_seq: int, partition_predicate: str, partition_count: int,
+                      high_watermark=None) -> dict:
+        """
+        Name the external table and the file one partition is unloaded through.
+        Args:
+            partition_seq: sequence of the partition, starting at 1
+            partition_predicate: restricts the unload to the partition
+            partition_count: number of partitions of the table
+            high_watermark: highest watermark value unloaded
+
+        Returns: unload plan
+
+        """
+        correlation_id = uuid.uuid4().hex
+        external_table_name = self.__external_table_name
+        file_name = f"{ProjectConfig.file_prefix()}_{correlation_id}.csv"
+        if self.__unload_file_name:
+            file_name = self.__unload_file_name
+        if partition_count > 1:
+            external_table_name = f"{external_table_name}_{partition_seq}"
+            if self.__unload_file_name:
+                stem, extension = os.path.splitext(self.__unload_file_name)
+                file_name = f"{stem}_{partition_seq}{extension}"
+
+        return {'partition_seq': partition_seq,
+                'correlation_id': correlation_id,
+                'external_table_name': external_table_name,
+                'file_name': file_name,
+                'unload_file': os.path.abspath(os.path.join(self.__file_path, file_name)),
+                'query': self.__build_query(external_table_name=external_table_name,
+                                            partition_predicate=partition_predicate,
+                                            high_watermark=high_watermark)}
+
+    def __unload(self, unload: dict, columns: str) -> int:
+        """
+        Runs on an executor thread - unload one partition through its external table.
+        Args:
+            unload: unload plan
+            columns: column definitions of the external table
+
+        Returns: number of records unloaded
+
+        """
+        with ExitStack() as stack:
+            conn = self.__open_connection(stack)
+            driver_type = 'JDBC' if isinstance(conn, connector.Connection) else 'ODBC'
+            cursor = conn.cursor()
+            cursor.execute(f"DROP TABLE {unload['external_table_name']} IF EXISTS;")
+            cursor.execute(f"CREATE EXTERNAL TABLE {unload['external_table_name']}({columns})"
+                           f" USING ( DATAOBJECT ('{unload['unload_file']}')  DELIMITER ',' "
+                           f"REMOTESOURCE '{driver_type}' INCLUDEHEADER);")
+            cursor.execute(unload['query'])
+            record_count = cursor.rowcount
+
+        if record_count is None or record_count < 0:
+            # The driver did not report the rows inserted - count the lines unloaded, less the header.
+            record_count = GenericFunctions.count_records(unload['unload_file'])
+        return record_count
+
+    def __open_connection(self, stack: ExitStack):
+        """
+        Open a Netezza connection, JDBC first and ODBC if that fails, that is closed with the stack.
+        Args:
+            stack: ExitStack owning the connection
+
+        Returns: Netezza connection
+
+        Raises:
+            ValueError: no connection could be made with either driver
+        """
         try:
-            with NetezzaJDBC(connection=self.__connection_choice).connection as conn:
-                self.__driver_type = 'JDBC' if isinstance(conn, connector.Connection) else 'ODBC'
-                self.__generate_ext_table_by_columns(conn)
-
-                cursor = conn.cursor()
-                cursor.execute(self.__drop_query)
-                cursor.execute(self.__external_table_query)
-                cursor.execute(self.__query)
-                df = pd.read_csv(self.__unload_file)
-                return {'data_frame': df,
-                        'record_count': df.shape[0],
-                        'source_type': 'database'}
+            return stack.enter_context(NetezzaJDBC(connection=self.__connection_choice).connection)
         except Exception:
             try:
-                with NetezzaODBC(connection=self.__connection_choice).connection as conn:
-                    self.__driver_type = 'JDBC' if isinstance(conn, connector.Connection) else 'ODBC'
-                    self.__generate_ext_table_by_columns(conn)
-
-                    cursor = conn.cursor()
-                    cursor.execute(self.__drop_query)
-                    cursor.execute(self.__external_table_query)
-                    cursor.execute(self.__query)
-                    df = pd.read_csv(self.__unload_file)
-                    return {'data_frame': df,
-                            'record_count': df.shape[0],
-                            'source_type': 'database'}
+                return stack.enter_context(NetezzaODBC(connection=self.__connection_choice).connection)
             except Exception:
                 raise ValueError("Unknown configuration: %s" % self.__connection_choice)
 
-    def __build_query(self) -> None:
+    def __build_query(self, external_table_name: str, partition_predicate: str = None, high_watermark=None) -> str:
         """
         builds query.
         Default is no check_sum column
@@ -124,33 +235,52 @@ class NetezzaExternalTableSource(Source):
                 hash8 (returns the 64 bit hash of the input data)
                 hash (returns hashed input data)
             ** Important: hash() function is much slower to calculate than hash4() and hash8()
+        external_table_name: external table the query inserts into
+        partition_predicate: restricts the query to one partition of the table
+        high_watermark: highest watermark value unloaded
 
-        Returns: none
+        Returns: query
 
         """
-        self.__query = f"INSERT INTO {self.__external_table_name} " \
-                       f"SELECT * , CAST(random()* 100000 AS INT) as ck_sum FROM {self.__table}"
+        query = f"INSERT INTO {external_table_name} " \
+                f"SELECT * , CAST(random()* 100000 AS INT) as ck_sum FROM {self.__table}"
 
         # Checksum
         if self.__checksum and self.__checksum['function'] and self.__checksum['column']:
-            self.__query = self._generate_checksum_select_query(checksum=self.__checksum,
-                                                                table_name=self.__table,
-                                                                external_table_name=self.__external_table_name)
+            query = self._generate_checksum_select_query(checksum=self.__checksum,
+                                                         table_name=self.__table,
+                                                         external_table_name=external_table_name)
 
         # Watermark
         if self.__watermark and self.__watermark['column'] and self.__watermark['offset']:
             where_clause = self._generate_watermarked_where_clause(watermark=self.__watermark,
-                                                                   last_data_pulled=self._last_record_pulled)
-            self.__query = " ".join(
+                                                                   last_data_pulled=self._last_record_pulled,
+                                                                   partition_predicate=partition_predicate,
+                                                                   high_watermark=high_watermark)
+            query = " ".join(
                 [
-                    self.__query,
+                    query,
                     where_clause
                 ]
             )
-        if ProjectConfig.query_limit():
-            self.__query += f" LIMIT {ProjectConfig.query_limit()}"
+        elif partition_predicate:
+            query = " ".join(
+                [
+                    query,
+                    f"WHERE {partition_predicate}"
+                ]
+            )
+
+        # A partitioned unload writes every row of the table, it is not limited.
+        if ProjectConfig.query_limit() and not self.__partition:
+            query += f" LIMIT {ProjectConfig.query_limit()}"
 
-    def __generate_ext_table_by_columns(self, conn) -> None:
+        return query
+
+    def __get_columns(self, conn) -> str:
+        """
+        Column definitions of the external table - the columns of the data table and the checksum.
+        """
         cursor = conn.cursor()
         qry = f"SELECT COLUMN_NAME, DATA_TYPE " \
               f"FROM INFORMATION_SCHEMA.COLUMNS WHERE " \
@@ -161,9 +291,26 @@ class NetezzaExternalTableSource(Source):
         for row in result:
             cols += "," + row[0] + ' ' + row[1]
         cols += "," + "CK_SUM INTEGER"
-        self.__external_table_query = f"CREATE EXTERNAL TABLE {self.__external_table_name}({cols[1:]})" \
-                                      f" USING ( DATAOBJECT ('{self.__unload_file}')  DELIMITER ',' " \
-                                      f"REMOTESOURCE '{self.__driver_type}' INCLUDEHEADER);"
+        return cols[1:]
+
+    def __get_high_watermark(self, conn):
+        """
+        The unloaded files are not read back, so the last record pulled is the highest watermark value to be unloaded,
+        recorded as the watermark column and its value.
+        Returns: highest watermark value above the last one pulled, None without a watermark or rows above it
+        """
+        if not (self.__watermark and self.__watermark['column'] and self.__watermark['offset']):
+            return None
+
+        where_clause = self._generate_watermarked_where_clause(watermark=self.__watermark,
+                                                               last_data_pulled=self._last_record_pulled,
+                                                               order=False)
+        cursor = conn.cursor()
+        cursor.execute(f"SELECT MAX({self.__watermark['column']}) FROM {self.__table} {where_clause}")
+        row = cursor.fetchone()
+        if not row or row[0] is None:
+            return None
+        return row[0]
 
     @classmethod
     def _generate_checksum_select_query(self, checksum: dict, table_name, external_table_name) -> str:
@@ -179,7 +326,8 @@ class NetezzaExternalTableSource(Source):
         return select_query
 
     @classmethod
-    def _generate_watermarked_where_clause(self, watermark: dict, last_data_pulled) -> str:
+    def _generate_watermarked_where_clause(self, watermark: dict, last_data_pulled, partition_predicate: str = None,
+                                           order: bool = True, high_watermark=None) -> str:
         where_clause = f"WHERE {watermark['column']} > {watermark['offset']}"
         if last_data_pulled:
             column_arr = last_data_pulled.split(',')
@@ -188,7 +336,14 @@ class NetezzaExternalTableSource(Source):
                 if watermark['column'] == key_value_arr[0]:
                     where_clause += f" AND {watermark['column']} > {key_value_arr[1]}"
 
-        where_clause += f" ORDER BY {watermark['column']}"
+        if high_watermark is not None:
+            where_clause += f" AND {watermark['column']} <= {high_watermark}"
+
+        if partition_predicate:
+            where_clause += f" AND ({partition_predicate})"
+
+        if order:
+            where_clause += f" ORDER BY {watermark['column']}"
         return where_clause
 
     """
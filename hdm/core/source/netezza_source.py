@@ -12,6 +12,10 @@
 # See the License for the specific language governing permissions and
 # limitations under the License.
 import json
+import queue
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import ExitStack
 
 import pandas as pd
 import enum
@@ -19,6 +23,7 @@ import enum
 from hdm.core.dao.netezza_jdbc import NetezzaJDBC
 from hdm.core.dao.netezza_odbc import NetezzaODBC
 from hdm.core.source.rdbms_source import RDBMSSource
+from hdm.core.utils.netezza_partition import NetezzaPartition
 from hdm.core.utils.project_config import ProjectConfig
 
 
@@ -32,7 +37,14 @@ class NetezzaSource(RDBMSSource):
 
     def consume(self, **kwargs) -> dict:
         self._logger.info("Retrieving data from %s", self.__table)
-        yield self._run(**kwargs)
+        if not (self.__batch_size or self.__partition):
+            yield self._run(**kwargs)
+            return
+
+        # Streaming and/or partitioned - every batch fetched is a result of its own, with its own state.
+        # The watermark is read before the queries are built, as _run would otherwise do.
+        self._last_record_pulled = self._get_last_record()
+        yield from self.__consume_batches(**kwargs)
 
     def __init__(self, **kwargs):
         super().__init__(**kwargs)
@@ -43,10 +55,27 @@ class NetezzaSource(RDBMSSource):
         self._entity = self.__table
         self._entity_filter = kwargs.get('watermark', None)
         self.__checksum = kwargs.get('checksum', [])
+        self.__batch_size = kwargs.get('batch_size', None)
+        self.__partition = kwargs.get('partition', None)
+        self.__parallelism = kwargs.get('parallelism', None)
         self.__query = ""
+        # Watermarked partitions - the highest watermark extracted, recorded with the last batch only
+        self.__watermarked = False
+        self.__high_value = None
+        self.__high_record = None
+        self.__last_batch = False
 
     def _get_data(self, **kwargs) -> dict:
-        self.__build_query()
+        if self.__batch_size or self.__partition:
+            df = kwargs['data_frame']
+            return {'data_frame': df,
+                    'record_count': df.shape[0],
+                    'source_type': 'database',
+                    'table_name': self.__table,
+                    'source_entity': self.__table,
+                    'source_filter': self._entity_filter}
+
+        self.__query = self.__build_query()
         try:
             with NetezzaJDBC(connection=self.__connection_choice).connection as conn:
                 df = pd.read_sql(self.__query, conn)
@@ -65,7 +94,164 @@ class NetezzaSource(RDBMSSource):
             except Exception:
                 raise ValueError("Unknown configuration: %s" % self.__connection_choice)
 
-    def __build_query(self) -> None:
+    def __consume_batches(self, **kwargs) -> dict:
+        """
+        Fetch the partitions of the table concurrently, each on its own connection, and run every batch fetched through
+        _run on this thread - the state of a source is not shared between threads.
+        Without a partition configuration the whole table is the only partition.
+        With a watermark, the batches of the partitions are interleaved, so a batch does not record its last row as
+        the watermark: each batch is held back until the next one is fetched, and run with the previous watermark.
+        The last batch, run once every partition is extracted, records the highest watermark extracted. A run that
+        fails part-way records a failure state for the batch of the partition that failed, leaves the previous
+        watermark, and the next run extracts the failed partition again.
+        """
+        if self.__partition:
+            with ExitStack() as stack:
+                predicates = NetezzaPartition.predicates(partition=self.__partition, table_name=self.__table,
+                                                         conn=self.__open_connection(stack))
+        else:
+            predicates = [None]
+
+        queries = [self.__build_query(partition_predicate=predicate) for predicate in predicates]
+        parallelism = min(self.__parallelism if self.__parallelism else len(queries), len(queries))
+        self._logger.info("Extracting %s in %d partitions, %d at a time", self.__table, len(queries), parallelism)
+
+        # Fetched batches wait here to be run. Bounded so that fetching can not run far ahead of the sink.
+        batches = queue.Queue(maxsize=parallelism)
+        stop = threading.Event()
+        batch_counts = [0] * len(queries)
+        remaining = len(queries)
+        self.__watermarked = bool(self.__partition and self.__watermark and self.__watermark.get('column'))
+        self.__high_value = None
+        self.__high_record = None
+        self.__last_batch = False
+        # (entity filter, dataframe) of the batch held back
+        held = None
+
+        with ThreadPoolExecutor(max_workers=parallelism) as executor:
+            futures = [executor.submit(self.__fetch_partition, partition_seq, query, batches, stop)
+                       for partition_seq, query in enumerate(queries, start=1)]
+            try:
+                while remaining:
+                    partition_seq, df = batches.get()
+                    if df is None:
+                        remaining -= 1
+                        continue
+                    if isinstance(df, Exception):
+                        self.__fail_batch([self.__generate_batch_filter(partition_seq,
+                                                                        batch_counts[partition_seq - 1] + 1)])
+                        raise df
+
+                    batch_counts[partition_seq - 1] += 1
+                    entity_filter = [self.__generate_batch_filter(partition_seq, batch_counts[partition_seq - 1])]
+                    if not self.__watermarked:
+                        yield self.__run_batch(entity_filter, df, **kwargs)
+                        continue
+
+                    self.__track_high_watermark(df)
+                    if held:
+                        yield self.__run_batch(*held, **kwargs)
+                    held = (entity_filter, df)
+
+                if held:
+                    self.__last_batch = True
+                    yield self.__run_batch(*held, **kwargs)
+            finally:
+                # Unblock any fetch still waiting on the queue, so the executor can shut down.
+                stop.set()
+                while not all(future.done() for future in futures):
+                    try:
+                        batches.get(timeout=0.1)
+                    except queue.Empty:
+                        pass
+
+    def __run_batch(self, entity_filter: list, df, **kwargs) -> dict:
+        self._entity_filter = entity_filter
+        kwargs['data_frame'] = df
+        return self._run(**kwargs)
+
+    def __fail_batch(self, entity_filter: list) -> None:
+        """
+        Record a failure state for the batch of a partition that failed to be fetched, with the previous watermark.
+        """
+        self._entity_filter = entity_filter
+        self._first_record_pulled = None
+        self._last_record_pulled = self._get_last_record()
+        current_state = self._pre_consume()
+        current_state['status'] = 'failure'
+        current_state['record_count'] = None
+        self._post_consume(current_state)
+
+    def __track_high_watermark(self, df) -> None:
+        """
+        Keep the row with the highest watermark extracted, as the record of it.
+        """
+        name = self.__watermark['column'].lower()
+        column = next((column for column in df.columns if str(column).lower() == name), None)
+        if column is None or df[column].isna().all():
+            return
+        value = df[column].max()
+        if self.__high_value is None or value > self.__high_value:
+            self.__high_value = value
+            self.__high_record = self._get_record_data(df.loc[[df[column].idxmax()]])
+
+    def _set_first_last_record(self, data_dict):
+        previous = self._last_record_pulled
+        super()._set_first_last_record(data_dict)
+        if self.__watermarked:
+            # Watermarked partitions - see __consume_batches
+            self._last_record_pulled = self.__high_record if self.__last_batch and self.__high_record else previous
+
+    def __fetch_partition(self, partition_seq: int, query: str, batches: queue.Queue, stop: threading.Event) -> None:
+        """
+        Runs on an executor thread - fetch one partition and put its batches on the queue, followed by None.
+        """
+        try:
+            with ExitStack() as stack:
+                conn = self.__open_connection(stack)
+                if self.__batch_size:
+                    fetched = pd.read_sql(query, conn, chunksize=self.__batch_size)
+                else:
+                    fetched = [pd.read_sql(query, conn)]
+                for df in fetched:
+                    if stop.is_set():
+                        return
+                    batches.put((partition_seq, df))
+        except Exception as e:
+            self._logger.exception("Failed to extract partition %d of %s", partition_seq, self.__table)
+            batches.put((partition_seq, e))
+        finally:
+            batches.put((partition_seq, None))
+
+    def __generate_batch_filter(self, partition_seq: int, seq: int) -> dict:
+        batch_filter = {}
+        if self.__partition:
+            batch_filter['partition'] = f'{partition_seq}'
+        if self.__batch_size:
+            batch_filter['batch_size'] = f'{self.__batch_size}'
+        batch_filter['seq'] = f'{seq}'
+        return batch_filter
+
+    def __open_connection(self, stack: ExitStack):
+        """
+        Open a Netezza connection, JDBC first and ODBC if that fails, that is closed with the stack.
+        Args:
+            stack: ExitStack owning the connection
+
+        Returns: Netezza connection
+
+        Raises:
+            ValueError: no connection could be made with either driver
+        """
+        try:
+            return stack.enter_context(NetezzaJDBC(connection=self.__connection_choice).connection)
+        except Exception:
+            try:
+                return stack.enter_context(NetezzaODBC(connection=self.__connection_choice).connection)
+            except Exception:
+                raise ValueError("Unknown configuration: %s" % self.__connection_choice)
+
+    def __build_query(self, partition_predicate: str = None) -> str:
         """
         builds query.
         Default is no check_sum column
@@ -80,30 +266,42 @@ class NetezzaSource(RDBMSSource):
                 hash8 (returns the 64 bit hash of the input data)
                 hash (returns hashed input data)
             ** Important: hash() function is much slower to calculate than hash4() and hash8()
+        partition_predicate: restricts the query to one partition of the table
 
-        Returns: none
+        Returns: query
 
         """
-        self.__query = f"SELECT * , CAST(random()* 100000 AS INT) as ck_sum FROM {self.__table}"
+        query = f"SELECT * , CAST(random()* 100000 AS INT) as ck_sum FROM {self.__table}"
 
         # Checksum
         if self.__checksum and self.__checksum['function'] and self.__checksum['column']:
-            self.__query = self._generate_checksum_select_query(checksum=self.__checksum, table_name=self.__table)
+            query = self._generate_checksum_select_query(checksum=self.__checksum, table_name=self.__table)
 
         # Watermark
         if self.__watermark and self.__watermark['column'] and self.__watermark['offset']:
             where_clause = self._generate_watermarked_where_clause(watermark=self.__watermark,
-                                                                   last_data_pulled=self._last_record_pulled
+                                                                   last_data_pulled=self._last_record_pulled,
+                                                                   partition_predicate=partition_predicate
                                                                    )
-            self.__query = " ".join(
+            query = " ".join(
                 [
-                    self.__query,
+                    query,
                     where_clause
                 ]
             )
+        elif partition_predicate:
+            query = " ".join(
+                [
+                    query,
+                    f"WHERE {partition_predicate}"
+                ]
+            )
 
-        if ProjectConfig.query_limit():
-            self.__query += f" LIMIT {ProjectConfig.query_limit()}"
+        # A streamed or partitioned extraction holds one batch in memory at a time, so it is not limited.
+        if ProjectConfig.query_limit() and not (self.__batch_size or self.__partition):
+            query += f" LIMIT {ProjectConfig.query_limit()}"
+
+        return query
 
     @classmethod
     def _generate_checksum_select_query(self, checksum: dict, table_name) -> str:
@@ -119,7 +317,7 @@ class NetezzaSource(RDBMSSource):
         return select_query
 
     @classmethod
-    def _generate_watermarked_where_clause(self, watermark: dict, last_data_pulled) -> str:
+    def _generate_watermarked_where_clause(self, watermark: dict, last_data_pulled, partition_predicate: str = None) -> str:
         where_clause = f"WHERE {watermark['column']} > {watermark['offset']}"
         if last_data_pulled:
             column_arr = last_data_pulled.split(',')
@@ -128,6 +326,9 @@ class NetezzaSource(RDBMSSource):
                 if watermark['column'] == key_value_arr[0]:
                     where_clause += f" AND {watermark['column']} > {key_value_arr[1]}"
 
+        if partition_predicate:
+            where_clause += f" AND ({partition_predicate})"
+
         where_clause += f" ORDER BY {watermark['column']}"
         return where_clause
 
@@ -11,9 +11,12 @@
 # WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
 # See the License for the specific language governing permissions and
 # limitations under the License.
-from io import BytesIO
+from collections import deque
+from concurrent.futures import Future, ThreadPoolExecutor
+
 import boto3
 import pandas as pd
+from botocore.exceptions import ClientError
 
 from hdm.core.dao.s3 import S3
 from hdm.core.source.source import Source
@@ -26,6 +29,15 @@ class S3Source(Source):
     Expected protocol for configuration:
     connection: Connection choice to connect to different profiles.
     bucket_name: Bucket name to scan for loading files into dataframes
+    prefix: Only objects with keys starting with the prefix are read.
+    incremental: Only objects with keys after the last key read by a previous run are read | default True
+    start_after: Only objects with keys after this key are read, instead of after the last key read.
+    page_size: Number of keys listed per request | default 1000
+    parallelism: Number of objects read at the same time | default 8
+
+    Keys are listed in order, one page at a time, and only the keys after the last key read are listed - the last key
+    read is kept in the state table. With incremental, objects must land with keys that sort after the keys already
+    read, e.g. time based names. Objects are read concurrently, each parsed as it streams in, and run in key order.
     """
 
     def __init__(self, **kwargs):
@@ -35,8 +47,14 @@ class S3Source(Source):
             **kwargs:
                 connection: connection name to connect to a specific profile
                 bucket_name: bucket name used for scanning various files to be loaded to dataframes.
+                prefix: prefix of the keys of the objects read
+                incremental: read the objects after the last key read only
+                start_after: read the objects after this key only
+                page_size: number of keys listed per request
+                parallelism: number of objects read at the same time
         Raises:
             RuntimeError: If bucket_name is null
+            ValueError: If page_size or parallelism is not a positive integer
         """
         # Connections are lazy - they are only created when being used
         super().__init__(**kwargs)
@@ -46,67 +64,102 @@ class S3Source(Source):
         self.__bucket_name = kwargs.get('bucket_name')
         if not self.__bucket_name:
             raise RuntimeError("Null Bucket name passed.")
-        self._entity = self.__bucket_name
+        self.__prefix = kwargs.get('prefix', '')
+        # The last key read is tracked per bucket and prefix
+        self._entity = f"{self.__bucket_name}/{self.__prefix}" if self.__prefix else self.__bucket_name
+        self.__incremental = kwargs.get('incremental', True)
+        self.__start_after = kwargs.get('start_after')
+        self.__page_size = kwargs.get('page_size', 1000)
+        self.__parallelism = kwargs.get('parallelism', 8)
+        for name, value in [('page_size', self.__page_size), ('parallelism', self.__parallelism)]:
+            if not isinstance(value, int) or value < 1:
+                raise ValueError("%s must be a positive integer: %s" % (name, value))
 
-    def __bucket_exists(self, s3: boto3.session.Session.resource, bucket_name: str) -> bool:
+    def __check_bucket(self, client) -> None:
         """
-        Checks if a bucket exists or not
+        Checks that the bucket exists
         Args:
-            s3: S3 resource.
-            bucket_name: bucket name to create a S3 bucket object.
-        """
-        # All created buckets have a creation date. If it is None, create a new
-        self.__bucket = s3.Bucket(bucket_name)
-        return bool(self.__bucket.creation_date)
-
-    def __get_bucket(self, s3: boto3.session.Session.resource):
-        """
-        Returns a bucket object if it exists else None
-        Args:
-            s3: S3 resource.
+            client: S3 client.
         Raises:
             RuntimeError if the bucket does not exist or exception during retrieval
         """
-        # TODO: If it doesn't exist, create it
-        # TODO: Our S3 Sink buckets are created with 'hdm-' as a prefix
-        # Should we follow the same protocol in S3 Source too ??
-        if not self.__bucket_exists(s3, bucket_name=self.__bucket_name):
-            msg = f"Bucket {self.__bucket_name} does not exist."
-            self._logger.error(msg)
-            raise RuntimeError(msg)
-
         try:
-            return s3.Bucket(self.__bucket_name)
-        except Exception as e:
+            client.head_bucket(Bucket=self.__bucket_name)
+        except ClientError as e:
+            if e.response.get('Error', {}).get('Code') in ('404', 'NoSuchBucket'):
+                msg = f"Bucket {self.__bucket_name} does not exist."
+                self._logger.error(msg)
+                raise RuntimeError(msg)
             error_msg = f"Exception during bucket retrieval:{e}"
             self._logger.debug("%s", error_msg)
             raise RuntimeError(error_msg)
 
+    def __list_keys(self, client, start_after: str):
+        """
+        Lists the keys of the csv objects under the prefix after start_after, in order, a page at a time.
+        """
+        parameters = dict(Bucket=self.__bucket_name, Prefix=self.__prefix,
+                          PaginationConfig={'PageSize': self.__page_size})
+        if start_after:
+            parameters['StartAfter'] = start_after
+        for page in client.get_paginator('list_objects_v2').paginate(**parameters):
+            for obj in page.get('Contents', []):
+                # TODO - for now reading only csv's to keep it simple
+                if str(obj['Key']).rsplit('.')[-1] == 'csv':
+                    yield obj['Key']
+
+    def __read_object(self, client, key: str) -> pd.DataFrame:
+        """
+        Runs on an executor thread - parse an object as it is streamed, without buffering it.
+        """
+        body = client.get_object(Bucket=self.__bucket_name, Key=key)['Body']
+        try:
+            return pd.read_csv(body, encoding='utf8')
+        finally:
+            body.close()
+
     def consume(self, **kwargs) -> dict:
         """
         Yields a dataframe for each object from a S3 bucket
         Args:
             **kwargs
         """
-        # Create a connection to S3
-        s3: boto3.session.Session.resource = S3(connection=self.__connection_choice).connection
-
-        # Make sure that the bucket exists and create it if it does not exist.
-        bucket = self.__get_bucket(s3)
-
-        # TODO - This is iterating over all object. We may want to filter the objects in this call. See filter
-        #  documentation TODO - here (https://boto3.amazonaws.com/v1/documentation/api/latest/reference/services/s3
-        #   .html#S3.Bucket.objects) TODO - for bucket.objects.filter. The idea would be to filter from Marker and
-        #    also to pass a prefix for the table. TODO - for now reading only csv's to keep it simple
-        for obj in bucket.objects.all():
-            if str(obj.key).rsplit('.')[-1] == 'csv':
-                self._entity_filter = obj.key
-                kwargs['obj'] = obj
-                yield self._run(**kwargs)
+        # Create a connection to S3. Clients, unlike resources, can be shared by threads.
+        s3: boto3.session.Session.resource = S3(connection=self.__connection_choice).connection.resource('s3')
+        client = s3.meta.client
+        self.__check_bucket(client)
+
+        start_after = self.__start_after
+        if not start_after and self.__incremental:
+            start_after = self._get_last_record()
+        self._logger.info("Reading %s after %s", self._entity, start_after)
+
+        # Objects being read, in key order. At most parallelism are read ahead of the one being run.
+        pending = deque()
+        with ThreadPoolExecutor(max_workers=self.__parallelism) as executor:
+            try:
+                for key in self.__list_keys(client, start_after):
+                    pending.append((key, executor.submit(self.__read_object, client, key)))
+                    if len(pending) > self.__parallelism:
+                        yield self.__run_object(*pending.popleft(), **kwargs)
+                while pending:
+                    yield self.__run_object(*pending.popleft(), **kwargs)
+            finally:
+                for _, future in pending:
+                    future.cancel()
+
+    def __run_object(self, key: str, data_frame: Future, **kwargs) -> dict:
+        self._entity_filter = key
+        kwargs['key'] = key
+        kwargs['data_frame'] = data_frame
+        return self._run(**kwargs)
 
     def _get_data(self, **kwargs) -> dict:
-        obj = kwargs['obj']
-        df = pd.read_csv(BytesIO(obj.get()['Body'].read()), encoding='utf8')
+        key = kwargs['key']
+        df = kwargs['data_frame'].result()
+        # Recorded in the state table, where the next run starts listing
+        self._last_record_pulled = key
         return {'data_frame': df,
-                'file_name': obj.key,
-                'record_count': df.shape[0]}
\ No newline at end of file
+                'file_name': key,
+                'object_name': key,
+                'record_count': df.shape[0]}
@@ -34,7 +34,7 @@ class Source:
         self._state_manager = kwargs['state_manager']
         self._state_manager_values = {}
         self._correlation_id_in = None
-        self._processed_history_list = self._state_manager.get_processing_history()
+        self.__processed_history_list = None
         self._is_running = False
         self._correlation_id_out = None
         self._source_name = self._state_manager.get_source_name()
@@ -44,6 +44,13 @@ class Source:
     def is_running(self):
         return self._is_running
 
+    @property
+    def _processed_history_list(self) -> list:
+        # Loaded when first used - file sources look up the processed file index instead of loading the history
+        if self.__processed_history_list is None:
+            self.__processed_history_list = self._state_manager.get_processing_history()
+        return self.__processed_history_list
+
     def _pre_consume(self) -> dict:
         self._current_state = self._state_manager.insert_state(
             source_entity=self._entity,
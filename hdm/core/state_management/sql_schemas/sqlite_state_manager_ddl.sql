@@ -11,8 +11,9 @@
 
 --CREATE DATABASE `hdm`;
 --DROP TABLE IF EXISTS `state_manager`;
+--Schema version 2. The lookup indexes are created by StateManager.
 CREATE TABLE IF NOT EXISTS state_manager (
-  state_id TEXT,
+  state_id TEXT PRIMARY KEY,
   run_id TEXT,
   job_id TEXT,
   correlation_id_in TEXT,
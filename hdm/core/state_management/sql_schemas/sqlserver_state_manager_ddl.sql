@@ -14,8 +14,9 @@
 CREATE DATABASE `hdm`;
 DROP TABLE IF EXISTS `state_manager`;
 --changes in status amd update_on columns
+--Schema version 2
 CREATE TABLE `state_manager` (
-  `state_id` varchar(32) DEFAULT NULL,
+  `state_id` varchar(32) NOT NULL PRIMARY KEY,
   `run_id` varchar(32) DEFAULT NULL,
   `job_id` varchar(32) DEFAULT NULL,
   `correlation_id_in` varchar(32) DEFAULT NULL,
@@ -42,6 +43,10 @@ CREATE TABLE `state_manager` (
   `manifest_name` varchar(256) DEFAULT NULL
 );
 
+CREATE INDEX ix_state_manager_job_entity ON state_manager (job_id, source_entity, source_filter);
+CREATE INDEX ix_state_manager_manifest_entity ON state_manager (manifest_name, source_entity, updated_on);
+CREATE INDEX ix_state_manager_source_manifest ON state_manager (source_name, manifest_name, source_entity);
+
 --create trigger to update updated_on
 CREATE TRIGGER dbo.trgAfterUpdate ON state_manager
 AFTER INSERT, UPDATE
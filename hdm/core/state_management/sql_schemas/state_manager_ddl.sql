@@ -11,8 +11,9 @@
 
 CREATE DATABASE `hdm`;
 DROP TABLE IF EXISTS `state_manager`;
+--Schema version 2
 CREATE TABLE `state_manager` (
-  `state_id` varchar(32) DEFAULT NULL,
+  `state_id` varchar(32) NOT NULL,
   `run_id` varchar(32) DEFAULT NULL,
   `job_id` varchar(32) DEFAULT NULL,
   `correlation_id_in` varchar(32) DEFAULT NULL,
@@ -37,5 +38,9 @@ CREATE TABLE `state_manager` (
   `updated_on` timestamp NULL DEFAULT CURRENT_TIMESTAMP ON UPDATE CURRENT_TIMESTAMP,
   `row_count` int DEFAULT NULL,
   `created_on` timestamp NULL DEFAULT CURRENT_TIMESTAMP,
-  `manifest_name` varchar(256) DEFAULT NULL
+  `manifest_name` varchar(256) DEFAULT NULL,
+  PRIMARY KEY (`state_id`),
+  KEY `ix_state_manager_job_entity` (`job_id`, `source_entity`, `source_filter`),
+  KEY `ix_state_manager_manifest_entity` (`manifest_name`, `source_entity`, `updated_on`),
+  KEY `ix_state_manager_source_manifest` (`source_name`, `manifest_name`, `source_entity`)
 );
\ No newline at end of file
@@ -12,12 +12,15 @@
 # See the License for the specific language governing permissions and
 # limitations under the License.
 import json
+import threading
+import time
 import uuid
+from collections import OrderedDict
 from datetime import datetime
 import git
 import pandas as pd
 import logging
-from sqlalchemy import schema
+from sqlalchemy import BigInteger, Column, DateTime, Integer, String, and_, bindparam, func, inspect, schema, select
 
 from providah.factories.package_factory import PackageFactory as pf
 
@@ -30,6 +33,54 @@ class SourceSinkDescriptor:
 
 
 class StateManager:
+    """
+    Records the state of every result a data link sources and sinks in the state table.
+
+    State is written synchronously by default: every transition is its own transaction. With write_behind the
+    transitions are buffered in memory - an insert and the updates of the same state are coalesced into a single row -
+    and written in one executemany transaction per statement type when flush_size states are buffered, when
+    flush_interval seconds have passed since the last flush (checked on every write), and when the data link completes.
+    Reads look at the buffer before the table, so a data link sees its own unflushed state.
+
+    Crash safety with write_behind: a state is durable only once flushed. If the process dies, the transitions
+    buffered since the last flush are lost - at most flush_size states or flush_interval seconds of work. Results whose
+    state was lost are not in the processing history, so they are sourced again on the next run: delivery is
+    at-least-once, as it is when a run fails between sourcing and sinking. Use the synchronous default where a sink is
+    not idempotent. updated_on is set when a row is flushed, not when its state changed. The files recorded in the
+    processed file index are buffered with the states, and written in the same transaction, so a file is never indexed
+    as processed without its state.
+
+    The git SHA recorded with every state is resolved once per process, see _resolve_git_sha, unless the configuration
+    gives one (git_sha). The columns that are the same for every state of the link are cached until a setter changes
+    them.
+
+    The state table schema is versioned. The version applied to a table is recorded in <table>_schema_version and a
+    table on an older version is migrated when a state manager is created:
+        1: the original table, without keys or indexes
+        2: a key on state_id - a unique index where the table has no primary key - and an index for each of the
+           lookups: get_current_state, get_last_record and get_processing_history
+        3: the processed file index, <table>_processed_files, seeded with the processing history
+
+    The processed file index records the files a source has sourced, by location, name, size and modification time,
+    so that a source only looks up the files of the location it is listing - see get_processed_files. Files sourced
+    before the index existed are recorded by name only, as get_processing_history knows them.
+    """
+    # Version of the state table schema, see __migrate
+    SCHEMA_VERSION = 3
+
+    # Number of names looked up in the processing history at a time
+    __lookup_batch_size = 500
+
+    # Suffix -> columns of the lookup indexes of the state table, named ix_<table>_<suffix>
+    __lookup_indexes = {
+        'job_entity': ('job_id', 'source_entity', 'source_filter'),
+        'manifest_entity': ('manifest_name', 'source_entity', 'updated_on'),
+        'source_manifest': ('source_name', 'manifest_name', 'source_entity'),
+    }
+
+    # Resolved once per process, '' when it could not be resolved
+    __process_git_sha = None
+    __process_git_sha_lock = threading.Lock()
 
     @classmethod
     def _get_logger(cls):
@@ -48,6 +99,22 @@ class StateManager:
         self._run_id = None
         self._manifest_name = None
         self._ddl_file = kwargs.get('ddl_file')
+        self._write_behind = kwargs.get('write_behind', False)
+        self._flush_size = kwargs.get('flush_size', 500)
+        self._flush_interval = kwargs.get('flush_interval', 5)
+        self._git_sha = kwargs.get('git_sha') or self._resolve_git_sha()
+        self.__invariant_values = None
+        if not isinstance(self._flush_size, int) or self._flush_size < 1:
+            raise ValueError(f"flush_size must be a positive integer, got {self._flush_size}")
+        if not isinstance(self._flush_interval, (int, float)) or self._flush_interval < 0:
+            raise ValueError(f"flush_interval must be a non-negative number of seconds, got {self._flush_interval}")
+        # state_id -> (insert, values, state) of transitions not yet written, in the order they were last changed.
+        # Shared by the source and the sinks of a link, which may run on different threads.
+        self.__pending = OrderedDict()
+        # (location, file name) -> values of the processed file index not yet written, flushed with the states
+        self.__pending_files = OrderedDict()
+        self.__pending_lock = threading.RLock()
+        self.__last_flush = time.monotonic()
 
         self._env = kwargs.get('connection', 'state_manager')
         self._conn = pf.create(key=kwargs.get('dao'), configuration={'connection': kwargs.get('connection',
@@ -66,6 +133,8 @@ class StateManager:
             metadata.reflect()
 
         self._table: schema.Table = metadata.tables[ProjectConfig.state_manager_table_name()]
+        self._processed_files_table = self.__define_processed_files_table()
+        self.__migrate()
 
     # ----------------------------------------------------------- #
     # ------------------------ Properties ----------------------- #
@@ -74,6 +143,7 @@ class StateManager:
     def source(self, value: dict):
         self._source.type = value['type']
         self._source.name = value['name']
+        self.__invariant_values = None
 
     source = property(None, source)
 
@@ -81,24 +151,28 @@ class StateManager:
     def sink(self, value: dict):
         self._sink.type = value['type']
         self._sink.name = value['name']
+        self.__invariant_values = None
 
     sink = property(None, sink)
 
     # Setter only job_id
     def job_id(self, value: str):
         self._job_id = value
+        self.__invariant_values = None
 
     job_id = property(None, job_id)
 
     # Setter only manifest_name
     def manifest_name(self, value: str):
         self._manifest_name = value
+        self.__invariant_values = None
 
     manifest_name = property(None, manifest_name)
 
     # Setter only run_id
     def run_id(self, value: str):
         self._run_id = value
+        self.__invariant_values = None
 
     run_id = property(None, run_id)
 
@@ -155,8 +229,7 @@ class StateManager:
                                   first_record_pulled=first_record_pulled,
                                   last_record_pulled=last_record_pulled)
 
-        query = self._table.insert().values(state_id=state_id)
-        return self.__run_query(query, state)
+        return self.__run_query(state, insert=True)
 
     def update_state(self, source_entity: str, source_filter: str, action: str, state_id: str,
                      status: str = None, correlation_id_in: str = None, correlation_id_out: str = None,
@@ -182,11 +255,17 @@ class StateManager:
                                   first_record_pulled=first_record_pulled,
                                   last_record_pulled=last_record_pulled
                                   )
-        query = self._table.update().where(getattr(self._table.c, 'state_id') == state_id)
-
-        return self.__run_query(query, state)
+        return self.__run_query(state, insert=False)
 
     def get_current_state(self, entity: str = None, entity_filter: str = None) -> dict:
+        with self.__pending_lock:
+            for _, values, state in reversed(self.__pending.values()):
+                if entity and values['source_entity'] != entity:
+                    continue
+                if entity and entity_filter and values['source_filter'] != json.dumps(entity_filter):
+                    continue
+                return self.__state_to_dict(state)
+
         with self._conn.connection as conn:
             query = f"SELECT * FROM {self._table.name} WHERE job_id='{self._job_id}'"
             if entity:
@@ -220,9 +299,16 @@ class StateManager:
         }
 
     def get_last_record(self, entity: str = None) -> dict:
+        with self.__pending_lock:
+            for _, values, _ in reversed(self.__pending.values()):
+                if values['source_entity'] == entity:
+                    return values['last_record_pulled']
+
+        # updated_on is maintained by the database where it can be (MySQL, SQL Server) - sourcing_end_time orders the
+        # states of a source where it is not (SQLite).
         with self._conn.connection as conn:
             query = f"SELECT * FROM {self._table.name} WHERE manifest_name='{self._manifest_name}' " \
-                    f"and source_entity='{entity}' ORDER BY updated_on desc"
+                    f"and source_entity='{entity}' ORDER BY updated_on desc, sourcing_end_time desc"
             df = pd.read_sql(sql=query, con=conn)
             if df.empty:
                 return None
@@ -237,6 +323,7 @@ class StateManager:
 
     def get_processing_history(self) -> list:
         self._logger.debug("get_processing_history: %s", self._source.name)
+        self.flush()
         with self._conn.connection as conn:
             df = pd.read_sql(
                 sql=f"SELECT distinct source_entity FROM {self._table.name} WHERE "
@@ -244,6 +331,90 @@ class StateManager:
                 con=conn)
         return df.values.tolist()
 
+    def get_processed_files(self, location: str, files: dict) -> set:
+        """
+        Find the files of a location that this source has already sourced.
+        Args:
+            location: directory, prefix, etc... the files are listed from, relative to the source
+            files: file name -> (size, modification time) of the files listed
+
+        Returns: names of the files already sourced. A file sourced before that has changed size or modification time
+                 since is not.
+        """
+        table = self._processed_files_table
+        with self._conn.connection as conn:
+            rows = conn.execute(select([table.c.file_name, table.c.size, table.c.mtime]).where(
+                and_(table.c.source_name == self._source.name,
+                     table.c.manifest_name == self._manifest_name,
+                     table.c.location == location))).fetchall()
+            recorded = {row[0]: (row[1], row[2]) for row in rows}
+            with self.__pending_lock:
+                recorded.update({file_name: (values['size'], values['mtime'])
+                                 for (file_location, file_name), values in self.__pending_files.items()
+                                 if file_location == location})
+            processed = {file for file, stat in files.items() if recorded.get(file) == tuple(stat)}
+
+            # Files never recorded at this location may have been sourced before the index existed
+            unrecorded = [file for file in files if file not in recorded]
+            sourced_before = set()
+            for start in range(0, len(unrecorded), self.__lookup_batch_size):
+                rows = conn.execute(select([table.c.file_name]).where(
+                    and_(table.c.source_name == self._source.name,
+                         table.c.manifest_name == self._manifest_name,
+                         table.c.location.is_(None),
+                         table.c.file_name.in_(unrecorded[start:start + self.__lookup_batch_size])))).fetchall()
+                sourced_before.update(row[0] for row in rows)
+
+        # Recorded at this location, so they are found by location from now on
+        for file in sourced_before:
+            self.record_processed_file(location, file, *files[file])
+
+        return processed | sourced_before
+
+    def record_processed_file(self, location: str, file_name: str, size: int, mtime: int) -> None:
+        """
+        Record in the processed file index that this source has sourced a file, see get_processed_files.
+        With write_behind the file is buffered, and written with the buffered states by flush.
+        """
+        values = dict(size=size, mtime=mtime, processed_on=datetime.utcnow())
+        if self._write_behind:
+            with self.__pending_lock:
+                self.__pending_files.pop((location, file_name), None)
+                self.__pending_files[(location, file_name)] = values
+            return
+
+        with self._conn.connection as conn:
+            self.__upsert_processed_file(conn, location, file_name, values)
+
+    def flush(self) -> None:
+        """
+        Write the buffered state transitions to the state table, and the buffered files to the processed file index, in
+        one transaction. Nothing to do without write_behind.
+        If the write fails the transitions and files stay buffered and the error is raised.
+        """
+        with self.__pending_lock:
+            self.__last_flush = time.monotonic()
+            if not self.__pending and not self.__pending_files:
+                return
+
+            inserts = [dict(values, state_id=state_id)
+                       for state_id, (insert, values, _) in self.__pending.items() if insert]
+            updates = [dict(values, b_state_id=state_id)
+                       for state_id, (insert, values, _) in self.__pending.items() if not insert]
+            with self._conn.connection as conn:
+                with conn.begin():
+                    if inserts:
+                        conn.execute(self._table.insert(), inserts)
+                    if updates:
+                        conn.execute(self._table.update().where(self._table.c.state_id == bindparam('b_state_id')),
+                                     updates)
+                    for (location, file_name), values in self.__pending_files.items():
+                        self.__upsert_processed_file(conn, location, file_name, values)
+            self._logger.debug("flush: %d inserts, %d updates, %d processed files", len(inserts), len(updates),
+                               len(self.__pending_files))
+            self.__pending.clear()
+            self.__pending_files.clear()
+
     @classmethod
     def generate_id(cls) -> str:
         return uuid.uuid4().hex
@@ -313,7 +484,7 @@ class StateManager:
             'entity_filter': source_filter,
             'sink_entity': sink_entity,
             'sink_filter': sink_filter,
-            'git_sha': self.__git_sha(),
+            'git_sha': self._git_sha,
             'record_count': record_count,
             'sourcing_start_time': sourcing_start_time,
             'sourcing_end_time': sourcing_end_time,
@@ -325,37 +496,140 @@ class StateManager:
 
         return state
 
-    def __run_query(self, query, state) -> dict:
-
-        query = query.values(action=state['action'],
-                             status=state['status'],
-                             job_id=self._job_id,
-                             correlation_id_in=state['correlation_id_in'],
-                             correlation_id_out=state['correlation_id_out'],
-                             source_name=self._source.name,
-                             source_type=self._source.type,
-                             sink_name=self._sink.name,
-                             sink_type=self._sink.type,
-                             source_entity=state['entity'],
-                             source_filter=state['entity_filter'],
-                             sink_entity=state['sink_entity'],
-                             sink_filter=state['sink_filter'],
-                             git_sha=self.__git_sha(),
-                             sourcing_start_time=state['sourcing_start_time'],
-                             sourcing_end_time=state['sourcing_end_time'],
-                             sinking_start_time=state['sinking_start_time'],
-                             sinking_end_time=state['sinking_end_time'],
-                             row_count=state['record_count'],
-                             first_record_pulled=state['first_record_pulled'],
-                             last_record_pulled=state['last_record_pulled'],
-                             manifest_name=self._manifest_name,
-                             run_id=self._run_id)
+    def __migrate(self) -> None:
+        """
+        Bring the state table up to SCHEMA_VERSION. Each step only creates what is missing, so a step interrupted or
+        run concurrently by another process can be run again.
+        """
+        engine = self._conn.engine
+        version_table = schema.Table(f"{self._table.name}_schema_version", schema.MetaData(),
+                                     Column('version', Integer, nullable=False),
+                                     Column('applied_on', DateTime))
+        version_table.create(bind=engine, checkfirst=True)
+        with self._conn.connection as conn:
+            version = conn.execute(select([func.max(version_table.c.version)])).scalar() or 1
+
+        migrations = {2: self.__create_indexes, 3: self.__create_processed_files_table}
+        for step in range(version + 1, self.SCHEMA_VERSION + 1):
+            self._logger.info("Migrating %s to schema version %d", self._table.name, step)
+            migrations[step]()
+            with self._conn.connection as conn:
+                conn.execute(version_table.insert().values(version=step, applied_on=datetime.now()))
 
+    def __create_indexes(self) -> None:
+        """
+        Schema version 2: key the state table on state_id and index it for its lookups.
+        """
+        engine = self._conn.engine
+        inspector = inspect(engine)
+        existing = {index['name'] for index in inspector.get_indexes(self._table.name)}
+
+        # name -> (columns, unique)
+        indexes = {f"ix_{self._table.name}_{suffix}": (columns, False)
+                   for suffix, columns in self.__lookup_indexes.items()}
+        # A primary key can not be added to an existing SQLite table - a unique index serves the same lookups.
+        if inspector.get_pk_constraint(self._table.name).get('constrained_columns') != ['state_id']:
+            indexes[f"ux_{self._table.name}_state_id"] = (('state_id',), True)
+
+        for name, (columns, unique) in indexes.items():
+            if name in existing:
+                continue
+            self._logger.info("Creating index %s on %s", name, self._table.name)
+            schema.Index(name, *[self._table.c[column] for column in columns], unique=unique).create(bind=engine)
+
+    def __define_processed_files_table(self) -> schema.Table:
+        # Column lengths follow the state table. location is bounded to keep its index within the MySQL key length.
+        return schema.Table(f"{self._table.name}_processed_files", schema.MetaData(),
+                            Column('source_name', String(50)),
+                            Column('manifest_name', String(256)),
+                            Column('location', String(400)),
+                            Column('file_name', String(256)),
+                            Column('size', BigInteger),
+                            Column('mtime', BigInteger),
+                            Column('processed_on', DateTime),
+                            schema.Index(f"ix_{self._table.name}_processed_files_location",
+                                         'source_name', 'manifest_name', 'location'),
+                            schema.Index(f"ix_{self._table.name}_processed_files_name",
+                                         'source_name', 'manifest_name', 'file_name'))
+
+    def __create_processed_files_table(self) -> None:
+        """
+        Schema version 3: create the processed file index and seed it with the processing history, by name only.
+        """
+        table = self._processed_files_table
+        table.create(bind=self._conn.engine, checkfirst=True)
         with self._conn.connection as conn:
-            self._logger.debug("%s - action is %s - status is %s", query, state['action'], state['status'])
-            self._logger.debug("job_id is %s - correlation_id is %s", self._job_id, state['correlation_id_out'])
-            conn.execute(query)
+            if conn.execute(select([func.count()]).select_from(table)).scalar():
+                return
+            history = select([self._table.c.source_name, self._table.c.manifest_name, self._table.c.source_entity]) \
+                .where(self._table.c.source_entity.isnot(None)).distinct()
+            conn.execute(table.insert().from_select(['source_name', 'manifest_name', 'file_name'], history))
+
+    def __upsert_processed_file(self, conn, location: str, file_name: str, values: dict) -> None:
+        table = self._processed_files_table
+        key = and_(table.c.source_name == self._source.name,
+                   table.c.manifest_name == self._manifest_name,
+                   table.c.location == location,
+                   table.c.file_name == file_name)
+        if not conn.execute(table.update().where(key).values(**values)).rowcount:
+            conn.execute(table.insert().values(source_name=self._source.name, manifest_name=self._manifest_name,
+                                               location=location, file_name=file_name, **values))
+
+    def __run_query(self, state, insert: bool) -> dict:
+
+        values = dict(self.__get_invariant_values(),
+                      action=state['action'],
+                      status=state['status'],
+                      correlation_id_in=state['correlation_id_in'],
+                      correlation_id_out=state['correlation_id_out'],
+                      source_entity=state['entity'],
+                      source_filter=state['entity_filter'],
+                      sink_entity=state['sink_entity'],
+                      sink_filter=state['sink_filter'],
+                      sourcing_start_time=state['sourcing_start_time'],
+                      sourcing_end_time=state['sourcing_end_time'],
+                      sinking_start_time=state['sinking_start_time'],
+                      sinking_end_time=state['sinking_end_time'],
+                      row_count=state['record_count'],
+                      first_record_pulled=state['first_record_pulled'],
+                      last_record_pulled=state['last_record_pulled'])
+
+        if self._write_behind:
+            self.__buffer(state, values, insert)
+        else:
+            if insert:
+                query = self._table.insert().values(state_id=state['state_id'])
+            else:
+                query = self._table.update().where(getattr(self._table.c, 'state_id') == state['state_id'])
+            query = query.values(**values)
+
+            with self._conn.connection as conn:
+                self._logger.debug("%s - action is %s - status is %s", query, state['action'], state['status'])
+                self._logger.debug("job_id is %s - correlation_id is %s", self._job_id, state['correlation_id_out'])
+                conn.execute(query)
+
+        return self.__state_to_dict(state)
 
+    def __buffer(self, state, values: dict, insert: bool) -> None:
+        """
+        Buffer a state transition, coalesced with the buffered transitions of the same state, and flush when a threshold
+        is reached.
+        """
+        state_id = state['state_id']
+        with self.__pending_lock:
+            if state_id in self.__pending:
+                # an update of a state still to be inserted is part of the insert
+                insert = self.__pending[state_id][0]
+                self.__pending.move_to_end(state_id)
+            self.__pending[state_id] = (insert, values, state)
+            self._logger.debug("buffered state %s - action is %s - status is %s", state_id, state['action'],
+                               state['status'])
+
+            if len(self.__pending) >= self._flush_size or \
+                    time.monotonic() - self.__last_flush >= self._flush_interval:
+                self.flush()
+
+    def __state_to_dict(self, state) -> dict:
         if self._format_date and state['sourcing_start_time']:
             sourcing_start_time = datetime.strptime(state['sourcing_start_time'], '%Y-%m-%d %H:%M:%S.%f')
         else:
@@ -396,8 +670,40 @@ class StateManager:
             'run_id': self._run_id
         }
 
+    def __get_invariant_values(self) -> dict:
+        """
+        Columns that are the same for every state of the link.
+        """
+        if self.__invariant_values is None:
+            self.__invariant_values = dict(job_id=self._job_id,
+                                           source_name=self._source.name,
+                                           source_type=self._source.type,
+                                           sink_name=self._sink.name,
+                                           sink_type=self._sink.type,
+                                           git_sha=self._git_sha,
+                                           manifest_name=self._manifest_name,
+                                           run_id=self._run_id)
+        return self.__invariant_values
+
     @classmethod
-    def __git_sha(cls) -> str:
-        repo = git.Repo(search_parent_directories=True)
-        short_sha = repo.git.rev_parse(repo.head.object.hexsha, short=True)
-        return short_sha
+    def _resolve_git_sha(cls) -> str:
+        """
+        Short SHA of the code being run, resolved once per process: HDM_GIT_SHA when it is set, otherwise the HEAD of
+        the git repository the process runs in.
+
+        Returns: short SHA, None when there is neither - e.g. a deployment without a .git directory
+
+        """
+        # Cached on StateManager itself, not on the subclass it is called on, so that it is shared by all of them
+        with StateManager.__process_git_sha_lock:
+            if StateManager.__process_git_sha is None:
+                sha = ProjectConfig.git_sha()
+                if not sha:
+                    try:
+                        repo = git.Repo(search_parent_directories=True)
+                        sha = repo.git.rev_parse(repo.head.object.hexsha, short=True)
+                    except (git.GitError, ValueError) as e:
+                        cls._get_logger().warning("Unable to resolve the git SHA, set HDM_GIT_SHA to record one: %s", e)
+                        sha = ''
+                StateManager.__process_git_sha = sha
+        return StateManager.__process_git_sha if StateManager.__process_git_sha else None
@@ -0,0 +1,345 @@
+# Copyright © 2020 Hashmap, Inc
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+import enum
+import gzip
+import io
+import os
+import zlib
+from typing import Iterator
+
+import pandas as pd
+import pyarrow as pa
+import pyarrow.parquet as pq
+import zstandard
+
+
+class FileFormatType(enum.Enum):
+    CSV = "csv"
+    PARQUET = "parquet"
+
+
+class Compression(enum.Enum):
+    GZIP = "gzip"
+    ZSTD = "zstd"
+
+
+class FileFormat:
+    """
+    Staging file formats - csv, plain or gzip | zstd compressed, and parquet.
+    The format of a staged file is known from its extension: .csv, .csv.gz, .csv.zst, .parquet. Any other file is read
+    as plain csv.
+    """
+
+    __csv_extensions = {
+        None: '.csv',
+        Compression.GZIP.value: '.csv.gz',
+        Compression.ZSTD.value: '.csv.zst',
+    }
+    __parquet_extension = '.parquet'
+    # Rows encoded at a time by encode_data_frame
+    ENCODE_ROWS = 100000
+
+    @classmethod
+    def extension(cls, file_format: str = FileFormatType.CSV.value, compression: str = None) -> str:
+        """
+        Extension of a file of the format.
+        Args:
+            file_format: csv | parquet
+            compression: gzip | zstd for csv. Parquet files are compressed internally, compression is not in the name.
+
+        Returns: extension
+
+        Raises:
+            ValueError: unknown file format or csv compression
+        """
+        file_format = file_format.lower() if file_format else FileFormatType.CSV.value
+        if file_format == FileFormatType.PARQUET.value:
+            return cls.__parquet_extension
+        if file_format == FileFormatType.CSV.value:
+            compression = compression.lower() if compression else None
+            if compression not in cls.__csv_extensions:
+                raise ValueError("Unknown csv compression: %s" % compression)
+            return cls.__csv_extensions[compression]
+        raise ValueError("Unknown file format: %s" % file_format)
+
+    @classmethod
+    def detect(cls, file_name: str) -> tuple:
+        """
+        Format and compression of a file, from its extension.
+        Returns: file format and compression, compression is None for plain csv and parquet
+        """
+        name = file_name.lower()
+        if name.endswith(cls.__parquet_extension):
+            return FileFormatType.PARQUET.value, None
+        for compression, extension in cls.__csv_extensions.items():
+            if compression and name.endswith(extension):
+                return FileFormatType.CSV.value, compression
+        return FileFormatType.CSV.value, None
+
+    @classmethod
+    def is_plain(cls, file_name: str) -> bool:
+        return cls.detect(file_name) == (FileFormatType.CSV.value, None)
+
+    @classmethod
+    def strip_extension(cls, file_name: str) -> str:
+        """
+        File name without its format extension.
+        """
+        name = file_name.lower()
+        for extension in sorted(list(cls.__csv_extensions.values()) + [cls.__parquet_extension], key=len, reverse=True):
+            if name.endswith(extension):
+                return file_name[:-len(extension)]
+        return os.path.splitext(file_name)[0]
+
+    @classmethod
+    def with_extension(cls, file_name: str, file_format: str = FileFormatType.CSV.value, compression: str = None) -> str:
+        """
+        File name with the extension of the format in place of its own.
+        """
+        return f"{cls.strip_extension(file_name)}{cls.extension(file_format, compression)}"
+
+    @classmethod
+    def open(cls, file_name: str, mode: str = 'rb', compression: str = None):
+        """
+        Open a csv file as a binary stream, compressing or decompressing it.
+        Args:
+            file_name: file to open
+            mode: rb | wb
+            compression: gzip | zstd, detected from the file name when not given
+
+        Returns: binary file object
+
+        """
+        if compression is None:
+            _, compression = cls.detect(file_name)
+        if compression == Compression.GZIP.value:
+            return gzip.open(file_name, mode)
+        if compression == Compression.ZSTD.value:
+            return zstandard.open(file_name, mode)
+        return open(file_name, mode)
+
+    @classmethod
+    def read_data_frame(cls, file_name: str, stream=None) -> pd.DataFrame:
+        """
+        Read a staged file of any format into a dataframe.
+        Args:
+            file_name: file to read, its format is known from its name
+            stream: binary file object with the content of the file, e.g. downloaded, read in place of file_name.
+                    Seekable for parquet.
+
+        Returns: dataframe
+        """
+        file_format, compression = cls.detect(file_name)
+        if file_format == FileFormatType.PARQUET.value:
+            return pd.read_parquet(stream if stream is not None else file_name, engine='pyarrow')
+        if stream is None:
+            with cls.open(file_name, 'rb', compression) as file:
+                return pd.read_csv(file)
+
+        if compression == Compression.GZIP.value:
+            stream = gzip.GzipFile(fileobj=stream, mode='rb')
+        elif compression == Compression.ZSTD.value:
+            stream = zstandard.ZstdDecompressor().stream_reader(stream)
+        return pd.read_csv(stream)
+
+    @classmethod
+    def write_data_frame(cls, df: pd.DataFrame, file_name: str, file_format: str = FileFormatType.CSV.value,
+                         compression: str = None, row_group_size: int = None) -> None:
+        """
+        Write a dataframe to a staged file.
+        Args:
+            df: dataframe to write
+            file_name: file to write
+            file_format: csv | parquet
+            compression: gzip | zstd for csv, codec for parquet (snappy, gzip, zstd, brotli, none) | default snappy
+            row_group_size: rows per row group | parquet only, default pyarrow's
+
+        Returns: none
+
+        """
+        if file_format.lower() == FileFormatType.PARQUET.value:
+            table = pa.Table.from_pandas(df, preserve_index=False)
+            pq.write_table(table, file_name, row_group_size=row_group_size,
+                           compression=compression if compression else 'snappy')
+            return
+
+        with cls.open(file_name, 'wb', compression) as file:
+            with io.TextIOWrapper(file, encoding='utf-8', newline='') as text:
+                df.to_csv(text, index=False)
+
+    @classmethod
+    def encode_data_frame(cls, df: pd.DataFrame, file_format: str = FileFormatType.CSV.value, compression: str = None,
+                          row_group_size: int = None) -> Iterator[bytes]:
+        """
+        Encode a dataframe as the content of a staged file, a slice of rows at a time, e.g. to upload it without
+        writing it to disk or holding all of it in memory.
+        Args:
+            df: dataframe to encode
+            file_format: csv | parquet
+            compression: gzip | zstd for csv, codec for parquet (snappy, gzip, zstd, brotli, none) | default snappy
+            row_group_size: rows per parquet row group, and per slice encoded | default ENCODE_ROWS
+
+        Returns: generator of the bytes of the file, in order
+
+        Raises:
+            ValueError: unknown file format or csv compression
+        """
+        rows = row_group_size if row_group_size else cls.ENCODE_ROWS
+        file_format = file_format.lower() if file_format else FileFormatType.CSV.value
+        if file_format == FileFormatType.PARQUET.value:
+            yield from cls.__encode_parquet(df, compression, rows)
+            return
+
+        # validates the compression
+        cls.extension(file_format, compression)
+        compression = compression.lower() if compression else None
+        if compression == Compression.GZIP.value:
+            # gzip container, as written by gzip.open
+            compressor = zlib.compressobj(wbits=16 + zlib.MAX_WBITS)
+        elif compression == Compression.ZSTD.value:
+            compressor = zstandard.ZstdCompressor().compressobj()
+        else:
+            compressor = None
+
+        for offset in range(0, max(df.shape[0], 1), rows):
+            data = df.iloc[offset:offset + rows].to_csv(index=False, header=offset == 0).encode('utf-8')
+            data = compressor.compress(data) if compressor else data
+            if data:
+                yield data
+        if compressor:
+            yield compressor.flush()
+
+    @classmethod
+    def open_encoded(cls, df: pd.DataFrame, file_format: str = FileFormatType.CSV.value, compression: str = None,
+                     row_group_size: int = None) -> io.BufferedReader:
+        """
+        Read only stream over encode_data_frame, e.g. for an upload that reads a file object.
+        Args:
+            df: dataframe to encode
+            file_format: csv | parquet
+            compression: gzip | zstd for csv, codec for parquet
+            row_group_size: rows per parquet row group, and per slice encoded
+
+        Returns: stream of the bytes of the file, encoded as they are read
+
+        """
+        return io.BufferedReader(_EncodedReader(cls.encode_data_frame(df, file_format, compression, row_group_size)))
+
+    @classmethod
+    def __encode_parquet(cls, df: pd.DataFrame, compression: str, rows: int) -> Iterator[bytes]:
+        # The schema of the whole frame, so that every slice is written with the same column types
+        schema = pa.Schema.from_pandas(df, preserve_index=False)
+        buffer = _DrainedBuffer()
+        with pq.ParquetWriter(buffer, schema, compression=compression if compression else 'snappy') as writer:
+            for offset in range(0, df.shape[0], rows):
+                writer.write_table(pa.Table.from_pandas(df.iloc[offset:offset + rows], schema=schema,
+                                                        preserve_index=False))
+                data = buffer.drain()
+                if data:
+                    yield data
+        yield buffer.drain()
+
+    @classmethod
+    def write_table(cls, table: pa.Table, file_name: str, compression: str = None) -> None:
+        """
+        Write a pyarrow table, e.g. from iter_tables, to a parquet file.
+        """
+        pq.write_table(table, file_name, compression=compression if compression else 'snappy')
+
+    @classmethod
+    def iter_tables(cls, file_name: str, rows: int = None):
+        """
+        Read a parquet file in tables of a number of rows, the last one may be smaller.
+        Args:
+            file_name: parquet file
+            rows: rows per table, without it the file is read row group by row group
+
+        Returns: generator of pyarrow tables
+
+        """
+        parquet_file = pq.ParquetFile(file_name)
+        if not rows:
+            for row_group in range(parquet_file.num_row_groups):
+                yield parquet_file.read_row_group(row_group)
+            return
+
+        pending = None
+        for batch in parquet_file.iter_batches(batch_size=rows):
+            table = pa.Table.from_batches([batch])
+            pending = pa.concat_tables([pending, table]) if pending is not None else table
+            while pending.num_rows >= rows:
+                yield pending.slice(0, rows)
+                pending = pending.slice(rows)
+        if pending is not None and pending.num_rows:
+            yield pending
+
+    @classmethod
+    def count_parquet_records(cls, file_name: str) -> int:
+        return pq.ParquetFile(file_name).metadata.num_rows
+
+
+class _DrainedBuffer(io.RawIOBase):
+    """
+    Write only stream holding what was written to it until it is drained. Parquet files are written to it a row group
+    at a time.
+    """
+
+    def __init__(self):
+        super().__init__()
+        self.__pieces = []
+        self.__position = 0
+
+    def writable(self) -> bool:
+        return True
+
+    def write(self, data) -> int:
+        self.__pieces.append(bytes(data))
+        self.__position += len(data)
+        return len(data)
+
+    def tell(self) -> int:
+        return self.__position
+
+    def drain(self) -> bytes:
+        """
+        Returns: the bytes written since the last drain
+        """
+        data = b''.join(self.__pieces)
+        self.__pieces = []
+        return data
+
+
+class _EncodedReader(io.RawIOBase):
+    """
+    Read only stream over the pieces of bytes of a generator, e.g. encode_data_frame, pulled as they are read.
+    """
+
+    def __init__(self, pieces: Iterator[bytes]):
+        super().__init__()
+        self.__pieces = pieces
+        self.__piece = memoryview(b'')
+
+    def readable(self) -> bool:
+        return True
+
+    def readinto(self, buffer) -> int:
+        while not self.__piece:
+            piece = next(self.__pieces, None)
+            if piece is None:
+                return 0
+            self.__piece = memoryview(piece)
+        size = min(len(buffer), len(self.__piece))
+        buffer[:size] = self.__piece[:size]
+        self.__piece = self.__piece[size:]
+        return size
@@ -0,0 +1,119 @@
+# Copyright © 2020 Hashmap, Inc
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+import fnmatch
+import logging
+import os
+import time
+from typing import Iterator, Tuple
+
+
+class FSScanner:
+    """
+    Lists the files of a directory tree with os.scandir. The stat of each file is taken once, from its directory entry,
+    and is what the files are filtered and ordered on.
+
+    Expected protocol for configuration:
+    include: glob pattern, or list of patterns, a file must match to be listed | default all files
+    exclude: glob pattern, or list of patterns, of files not listed
+    min_age: seconds since a file was last modified before it is listed, to skip files still being written | default 0
+    order: name | mtime - order of the files of a directory | default name
+
+    A pattern with a / is matched against the path of the file relative to the directory scanned, any other pattern
+    against the file name.
+    """
+    ORDERS = ('name', 'mtime')
+
+    @classmethod
+    def _get_logger(cls):
+        return logging.getLogger(cls.__name__)
+
+    def __init__(self, include=None, exclude=None, min_age=0, order='name'):
+        """
+        Args:
+            include: glob pattern(s) a file must match
+            exclude: glob pattern(s) a file must not match
+            min_age: seconds since a file was last modified
+            order: name | mtime
+
+        Raises:
+            ValueError: min_age is negative, or order is not name or mtime
+        """
+        self._logger = self._get_logger()
+        self.__include = self.__patterns(include)
+        self.__exclude = self.__patterns(exclude)
+        if not isinstance(min_age, (int, float)) or min_age < 0:
+            raise ValueError("min_age must be a non-negative number of seconds: %s" % min_age)
+        self.__min_age = min_age
+        if order not in self.ORDERS:
+            raise ValueError("order must be one of %s: %s" % (', '.join(self.ORDERS), order))
+        self.__order = order
+
+    def scan(self, directory: str) -> Iterator[Tuple[str, dict]]:
+        """
+        Walk a directory tree, directories in name order, and list the files of each directory.
+        Args:
+            directory: root of the tree
+
+        Returns: iterator of (directory path, file name -> (size in bytes, modification time in nanoseconds)), with
+                 the files in order. Directories without files listed are skipped.
+
+        """
+        newest = int((time.time() - self.__min_age) * 1e9)
+        pending = [(directory, '')]
+        while pending:
+            path, relative_path = pending.pop()
+            files = []
+            subdirectories = []
+            try:
+                with os.scandir(path) as entries:
+                    for entry in entries:
+                        try:
+                            if entry.is_dir(follow_symlinks=False):
+                                subdirectories.append(entry.name)
+                            elif entry.is_file() and self.__matches(entry.name, relative_path):
+                                stat = entry.stat()
+                                if stat.st_mtime_ns <= newest:
+                                    files.append((entry.name, stat.st_size, stat.st_mtime_ns))
+                        except FileNotFoundError:
+                            # removed since the directory was read
+                            continue
+            except OSError as e:
+                self._logger.warning("Unable to scan %s: %s", path, e)
+                continue
+
+            # Depth first, subdirectories in name order
+            pending.extend((os.path.join(path, name), f'{relative_path}{name}/')
+                           for name in sorted(subdirectories, reverse=True))
+
+            if files:
+                if self.__order == 'mtime':
+                    files.sort(key=lambda file: (file[2], file[0]))
+                else:
+                    files.sort()
+                yield path, {name: (size, mtime) for name, size, mtime in files}
+
+    def __matches(self, name: str, relative_path: str) -> bool:
+        return (not self.__include or self.__match_any(self.__include, name, relative_path)) and \
+               not self.__match_any(self.__exclude, name, relative_path)
+
+    @classmethod
+    def __match_any(cls, patterns: list, name: str, relative_path: str) -> bool:
+        return any(fnmatch.fnmatch(f'{relative_path}{name}' if '/' in pattern else name, pattern)
+                   for pattern in patterns)
+
+    @classmethod
+    def __patterns(cls, patterns) -> list:
+        if not patterns:
+            return []
+        return [patterns] if isinstance(patterns, str) else list(patterns)
@@ -0,0 +1,194 @@
+# Copyright © 2020 Hashmap, Inc
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+import ctypes
+import ctypes.util
+import logging
+import os
+import select
+import struct
+import sys
+import time
+from typing import Callable, Iterator
+
+
+class FSWatcher:
+    """
+    Runs the scan of a file system source again whenever files land in its directory tree, until no file has landed
+    for watch_timeout seconds.
+
+    On Linux a file has landed when it is closed after writing or moved into the tree, as reported by inotify. Elsewhere,
+    or if inotify can not watch the tree, the tree is polled. Either way the tree is scanned at least every
+    poll_interval seconds: a file skipped by the scan because it was too recent (min_age), a file landed in a
+    directory before it was watched and dropped inotify events are all picked up by the next scan.
+
+    Expected protocol for configuration:
+    poll_interval: longest time in seconds between scans | default 5
+    watch_timeout: seconds without a new file after which watching stops | default never
+    """
+    # inotify(7)
+    __IN_CLOSE_WRITE = 0x00000008
+    __IN_MOVED_TO = 0x00000080
+    __IN_CREATE = 0x00000100
+    __IN_Q_OVERFLOW = 0x00004000
+    __IN_ISDIR = 0x40000000
+    __IN_MASK = __IN_CLOSE_WRITE | __IN_MOVED_TO | __IN_CREATE
+    __EVENT = struct.Struct('iIII')
+
+    @classmethod
+    def _get_logger(cls):
+        return logging.getLogger(cls.__name__)
+
+    def __init__(self, poll_interval=5, watch_timeout=None):
+        """
+        Args:
+            poll_interval: longest time in seconds between scans
+            watch_timeout: seconds without a new file after which watching stops, None to watch until stopped
+
+        Raises:
+            ValueError: poll_interval is not positive or watch_timeout is negative
+        """
+        self._logger = self._get_logger()
+        if not isinstance(poll_interval, (int, float)) or poll_interval <= 0:
+            raise ValueError("poll_interval must be a positive number of seconds: %s" % poll_interval)
+        if watch_timeout is not None and (not isinstance(watch_timeout, (int, float)) or watch_timeout < 0):
+            raise ValueError("watch_timeout must be a non-negative number of seconds: %s" % watch_timeout)
+        self.__poll_interval = poll_interval
+        self.__watch_timeout = watch_timeout
+        self.__fd = None
+        # watch descriptor -> directory watched
+        self.__watches = {}
+
+    def watch(self, directory: str, scan: Callable[[], Iterator], before_wait: Callable[[], None] = None) -> Iterator:
+        """
+        Scan a directory tree, and scan it again each time files land in it.
+        Args:
+            directory: root of the tree
+            scan: returns an iterator over the results of a scan of the tree
+            before_wait: called before waiting for files to land, e.g. to write buffered state
+
+        Returns: iterator over the results of all scans
+
+        """
+        # Watching starts before the first scan, so no file landing while it runs is missed.
+        self.__start(directory)
+        try:
+            last_landed = time.monotonic()
+            while True:
+                results = 0
+                for result in scan():
+                    results += 1
+                    yield result
+                if results:
+                    last_landed = time.monotonic()
+
+                timeout = self.__poll_interval
+                if self.__watch_timeout is not None:
+                    remaining = self.__watch_timeout - (time.monotonic() - last_landed)
+                    if remaining <= 0:
+                        self._logger.info("No file landed in %s for %s seconds, watching stopped", directory,
+                                          self.__watch_timeout)
+                        return
+                    timeout = min(timeout, remaining)
+
+                if before_wait:
+                    before_wait()
+                self.__wait(timeout)
+        finally:
+            self.__stop()
+
+    def __start(self, directory: str) -> None:
+        if not sys.platform.startswith('linux'):
+            self._logger.info("Polling %s every %s seconds", directory, self.__poll_interval)
+            return
+
+        try:
+            libc = ctypes.CDLL(ctypes.util.find_library('c'), use_errno=True)
+            self.__inotify_add_watch = libc.inotify_add_watch
+            self.__inotify_add_watch.argtypes = [ctypes.c_int, ctypes.c_char_p, ctypes.c_uint32]
+            fd = libc.inotify_init1(os.O_NONBLOCK | os.O_CLOEXEC)
+            if fd < 0:
+                raise OSError(ctypes.get_errno(), os.strerror(ctypes.get_errno()))
+            self.__fd = fd
+            for root, dirs, _ in os.walk(directory):
+                self.__add_watch(root)
+        except (AttributeError, OSError) as e:
+            self._logger.warning("Unable to watch %s with inotify, polling every %s seconds: %s", directory,
+                                 self.__poll_interval, e)
+            self.__stop()
+            return
+        self._logger.info("Watching %s", directory)
+
+    def __add_watch(self, directory: str) -> None:
+        wd = self.__inotify_add_watch(self.__fd, os.fsencode(directory), self.__IN_MASK)
+        if wd < 0:
+            raise OSError(ctypes.get_errno(), f"{os.strerror(ctypes.get_errno())}: {directory}")
+        self.__watches[wd] = directory
+
+    def __wait(self, timeout: float) -> None:
+        """
+        Wait until files land in the tree, or for timeout seconds.
+        """
+        if self.__fd is None:
+            time.sleep(timeout)
+            return
+
+        deadline = time.monotonic() + timeout
+        while True:
+            remaining = deadline - time.monotonic()
+            if remaining <= 0 or not select.select([self.__fd], [], [], remaining)[0]:
+                return
+            if self.__read_events():
+                return
+
+    def __read_events(self) -> bool:
+        """
+        Read the pending inotify events, watching new directories.
+
+        Returns: whether a file has landed
+
+        """
+        landed = False
+        try:
+            buffer = os.read(self.__fd, 64 * 1024)
+        except BlockingIOError:
+            return False
+
+        offset = 0
+        while offset < len(buffer):
+            wd, mask, _, length = self.__EVENT.unpack_from(buffer, offset)
+            name = buffer[offset + self.__EVENT.size:offset + self.__EVENT.size + length].rstrip(b'\0')
+            offset += self.__EVENT.size + length
+
+            if mask & self.__IN_Q_OVERFLOW:
+                self._logger.warning("inotify events dropped, rescanning")
+                landed = True
+            elif mask & self.__IN_ISDIR:
+                if mask & (self.__IN_CREATE | self.__IN_MOVED_TO) and wd in self.__watches:
+                    subdirectory = os.path.join(self.__watches[wd], os.fsdecode(name))
+                    try:
+                        for root, dirs, _ in os.walk(subdirectory):
+                            self.__add_watch(root)
+                    except OSError as e:
+                        self._logger.warning("Unable to watch %s, picked up by polling: %s", subdirectory, e)
+                    # files may have landed in it before it was watched
+                    landed = True
+            elif mask & (self.__IN_CLOSE_WRITE | self.__IN_MOVED_TO):
+                landed = True
+        return landed
+
+    def __stop(self) -> None:
+        if self.__fd is not None:
+            os.close(self.__fd)
+            self.__fd = None
+        self.__watches = {}
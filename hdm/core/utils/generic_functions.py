@@ -1,3 +1,6 @@
+from hdm.core.utils.file_format import FileFormat, FileFormatType
+
+
 class GenericFunctions:
 
     @classmethod
@@ -7,3 +10,31 @@ class GenericFunctions:
     @classmethod
     def table_to_folder(cls, name):
         return name.replace(".", "__")
+
+    @classmethod
+    def count_records(cls, file_name, header=True, buffer_size=1024 * 1024):
+        """
+        Count the records of a delimited text file by scanning it for newlines, without parsing it.
+        Compressed csv files are scanned as they are decompressed, parquet files are counted from their metadata.
+        Args:
+            file_name: file to count
+            header: the first line is a header, not a record
+            buffer_size: bytes read at a time
+
+        Returns: number of records
+
+        """
+        file_format, _ = FileFormat.detect(file_name)
+        if file_format == FileFormatType.PARQUET.value:
+            return FileFormat.count_parquet_records(file_name)
+
+        lines = 0
+        last = b'\n'
+        with FileFormat.open(file_name, 'rb') as file:
+            for block in iter(lambda: file.read(buffer_size), b''):
+                lines += block.count(b'\n')
+                last = block[-1:]
+        if last != b'\n':
+            # last line is not terminated
+            lines += 1
+        return max(lines - 1, 0) if header else lines
@@ -0,0 +1,112 @@
+# Copyright © 2020 Hashmap, Inc
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+import enum
+
+
+class PartitionMethod(enum.Enum):
+    DATASLICE = "dataslice"
+    RANGE = "range"
+    HASH = "hash"
+
+
+class NetezzaPartition:
+    """
+    Splits a Netezza table into partitions that can be extracted concurrently, each selected by a WHERE predicate.
+
+    Expected protocol for configuration:
+    method: dataslice | range | hash
+    count: number of partitions
+    column: partitioning column | required for range and hash
+    lower_bound: smallest column value | range only, read from the table when not given
+    upper_bound: largest column value | range only, read from the table when not given
+
+    dataslice: rows are split on the DATASLICEID of the data slice holding them, so every partition reads whole data
+               slices. With count equal to the number of data slices each partition is exactly one data slice.
+    range: the numeric column is split into count contiguous ranges between lower_bound and upper_bound. The first and
+           last ranges are open ended, and NULLs are in the first, so no row is missed if the bounds are off.
+    hash: rows are split on hash4 of the column modulo count. NULLs, which hash to NULL, are in the first partition.
+          ** Important: hash4 needs IBM Netezza SQL Extensions toolkit installed
+    """
+
+    @classmethod
+    def predicates(cls, partition: dict, table_name: str, conn=None) -> list:
+        """
+        Generate one predicate per partition.
+        Args:
+            partition: partition configuration
+            table_name: table being partitioned
+            conn: Netezza connection, used to read the bounds of a range partition if they are not configured
+
+        Returns: list of predicates. None selects the whole table, e.g. for a range partition of an empty table.
+
+        Raises:
+            ValueError: the partition configuration is not valid
+        """
+        method = str(partition.get('method', '')).lower()
+        count = partition.get('count')
+        column = partition.get('column')
+
+        if not isinstance(count, int) or count < 1:
+            raise ValueError(f"Partition count must be a positive integer, got {count}")
+
+        if method == PartitionMethod.DATASLICE.value:
+            return [f"MOD(DATASLICEID, {count}) = {i}" for i in range(count)]
+
+        if not column:
+            raise ValueError(f"Partition method {method} needs a column")
+
+        if method == PartitionMethod.HASH.value:
+            predicates = [f"MOD(ABS(hash4({column})), {count}) = {i}" for i in range(count)]
+            predicates[0] = f"({predicates[0]} OR {column} IS NULL)"
+            return predicates
+
+        if method == PartitionMethod.RANGE.value:
+            lower_bound = partition.get('lower_bound')
+            upper_bound = partition.get('upper_bound')
+            if lower_bound is None or upper_bound is None:
+                lower_bound, upper_bound = cls._get_bounds(column=column, table_name=table_name, conn=conn)
+            return cls._generate_range_predicates(column=column, lower_bound=lower_bound, upper_bound=upper_bound,
+                                                  count=count)
+
+        raise ValueError(f"Unknown partition method: {method}")
+
+    @classmethod
+    def _get_bounds(cls, column: str, table_name: str, conn) -> tuple:
+        cursor = conn.cursor()
+        try:
+            cursor.execute(f"SELECT MIN({column}), MAX({column}) FROM {table_name}")
+            return tuple(cursor.fetchone())
+        finally:
+            cursor.close()
+
+    @classmethod
+    def _generate_range_predicates(cls, column: str, lower_bound, upper_bound, count: int) -> list:
+        if lower_bound is None or upper_bound is None:
+            return [None]
+
+        if isinstance(lower_bound, int) and isinstance(upper_bound, int):
+            boundaries = [lower_bound + (upper_bound - lower_bound) * i // count for i in range(1, count)]
+        else:
+            boundaries = [lower_bound + (upper_bound - lower_bound) * i / count for i in range(1, count)]
+
+        # Ranges of a narrow column collapse to the same boundary - skip them rather than issue empty queries.
+        boundaries = sorted(set(boundaries))
+        if not boundaries:
+            return [None]
+
+        predicates = [f"({column} < {boundaries[0]} OR {column} IS NULL)"]
+        for lower, upper in zip(boundaries, boundaries[1:]):
+            predicates.append(f"{column} >= {lower} AND {column} < {upper}")
+        predicates.append(f"{column} >= {boundaries[-1]}")
+        return predicates
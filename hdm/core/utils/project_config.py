@@ -60,3 +60,7 @@ class ProjectConfig:
     @classmethod
     def query_limit(cls):
         return '250'
+
+    @classmethod
+    def git_sha(cls):
+        return os.getenv('HDM_GIT_SHA')
@@ -11,17 +11,50 @@
 # WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
 # See the License for the specific language governing permissions and
 # limitations under the License.
+import logging
+import queue
+import threading
+import time
+
 from hdm.core.sink.sink import Sink
 from hdm.core.source.source import Source
+from hdm.core.state_management.state_manager import StateManager
 
 
 class DataLink:
+    """
+    Moves every result of a Source into a Sink.
+
+    By default each result is sunk before the source is asked for the next one. When queue_depth is greater than zero
+    the link is pipelined: the source is consumed on the calling thread and results are handed through a queue holding
+    at most queue_depth results to one sink thread per sink (sink plus parallel_sinks), so sourcing and sinking
+    overlap while memory stays bounded.
+
+    Once the source is exhausted, or has failed, every sink is flushed to complete what it deferred, see Sink.flush.
+    When the link has a state_manager, its buffered state is flushed once the link has run, whether or not it succeeded.
+    """
+    # Placed on the queue once per sink thread to tell it that the source is exhausted.
+    __END_OF_SOURCE = object()
 
-    def __init__(self, source: Source, sink: Sink, pressureless: bool = True) -> None:
+    @classmethod
+    def _get_logger(cls):
+        return logging.getLogger(cls.__name__)
+
+    def __init__(self, source: Source, sink: Sink, pressureless: bool = True, name: str = None,
+                 queue_depth: int = 0, parallel_sinks: list = None, state_manager: StateManager = None) -> None:
+        self._logger = self._get_logger()
         self._source: Source = source
         self._sink: Sink = sink
         self.__pressureless = pressureless
+        self.__name = name if name else f"{type(source).__name__} -> {type(sink).__name__}"
+        self.__queue_depth = queue_depth if queue_depth else 0
+        self.__parallel_sinks = parallel_sinks if parallel_sinks else []
+        self.__state_manager = state_manager
         self.__running = False
+        self.__wall_time = None
+
+        if self.__queue_depth < 0:
+            raise ValueError(f"queue_depth must not be negative, got {self.__queue_depth}")
 
     @property
     def is_running(self):
@@ -31,10 +64,85 @@ class DataLink:
     def pressureless(self):
         return self.__pressureless
 
+    @property
+    def name(self) -> str:
+        return self.__name
+
+    @property
+    def pipelined(self) -> bool:
+        return self.__queue_depth > 0
+
+    @property
+    def wall_time(self) -> float:
+        """Seconds spent in the last call to run, None if the link has not run yet."""
+        return self.__wall_time
+
     def run(self) -> None:
         self.__running = True
-        for ret in self._source.consume():
-            skip = ret.get('skipped', False)
-            if not skip:
-                self._sink.produce(**ret)
-        self.__running = False
+        start_time = time.monotonic()
+        try:
+            if self.pipelined:
+                self.__run_pipelined()
+            else:
+                try:
+                    for ret in self._source.consume():
+                        skip = ret.get('skipped', False)
+                        if not skip:
+                            self._sink.produce(**ret)
+                finally:
+                    self._sink.flush()
+        finally:
+            try:
+                if self.__state_manager:
+                    self.__state_manager.flush()
+            finally:
+                self.__wall_time = time.monotonic() - start_time
+                self.__running = False
+            self._logger.info("DataLink %s ran in %.3f seconds", self.__name, self.__wall_time)
+
+    def __run_pipelined(self) -> None:
+        sinks = [self._sink] + self.__parallel_sinks
+        results = queue.Queue(maxsize=self.__queue_depth)
+        errors = []
+
+        workers = [threading.Thread(target=self.__sink_worker, args=(sink, results, errors),
+                                    name=f"{self.__name} sink {index}", daemon=True)
+                   for index, sink in enumerate(sinks)]
+        for worker in workers:
+            worker.start()
+
+        try:
+            for ret in self._source.consume():
+                # Stop sourcing as soon as a sink has failed - there is nothing left to hand the results to.
+                if errors:
+                    break
+                skip = ret.get('skipped', False)
+                if not skip:
+                    results.put(ret)
+        finally:
+            for _ in workers:
+                results.put(self.__END_OF_SOURCE)
+            for worker in workers:
+                worker.join()
+
+        if errors:
+            raise errors[0]
+
+    def __sink_worker(self, sink: Sink, results: queue.Queue, errors: list) -> None:
+        while True:
+            ret = results.get()
+            if ret is self.__END_OF_SOURCE:
+                try:
+                    sink.flush()
+                except Exception as e:
+                    self._logger.exception("Sink %s failed to flush in DataLink %s", type(sink).__name__, self.__name)
+                    errors.append(e)
+                return
+            # After a failure keep draining the queue so the source is never blocked on a full queue.
+            if errors:
+                continue
+            try:
+                sink.produce(**ret)
+            except Exception as e:
+                self._logger.exception("Sink %s failed in DataLink %s", type(sink).__name__, self.__name)
+                errors.append(e)
@@ -0,0 +1,104 @@
+# Copyright © 2020 Hashmap, Inc
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+import io
+import socket
+import unittest
+from unittest import TestCase
+
+import pandas as pd
+
+from hdm.core.dao.azure_blob import AzureBLOB
+from hdm.core.sink.azure_blob_sink import AzureBlobSink
+from tests.core.Sagas.testenv_utils import TestEnvUtils
+
+
+def azurite_running() -> bool:
+    try:
+        with socket.create_connection(('127.0.0.1', 10000), timeout=1):
+            return True
+    except OSError:
+        return False
+
+
+class TestAzureBlobSink(TestCase):
+    """
+    Unit Tests for AzureBlobSink, with the uploads captured
+    """
+
+    def setUp(self) -> None:
+        self.__conn, self.__state_manager = TestEnvUtils.set_up_state_manager(self._testMethodName, None, None,
+                                                                              AzureBlobSink.__name__)
+        self.__df = pd.DataFrame({'ID': range(1000), 'NAME': [f'name_{i:05d}' for i in range(1000)]})
+        self.__uploads = []
+        self.__patch, container = TestEnvUtils.patch_property(AzureBLOB, 'container')
+        container.get_blob_client.return_value.upload_blob.side_effect = self.__upload
+        self.__patch.start()
+
+    def tearDown(self) -> None:
+        self.__patch.stop()
+        TestEnvUtils.delete_sm_table_sqlite(self.__conn, TestEnvUtils.SM_TABLE_NAME)
+
+    def __upload(self, data, **kwargs):
+        self.__uploads.append((data, b''.join(data) if not isinstance(data, bytes) else data, kwargs))
+
+    def __sink(self, **conf) -> AzureBlobSink:
+        return AzureBlobSink(env='azure-test', container='hdm-test', state_manager=self.__state_manager, **conf)
+
+    def test_sink_single_put(self):
+        self.__sink().produce(data_frame=self.__df, file_name='test1.csv', table_name='test')
+
+        data, content, _ = self.__uploads[0]
+        self.assertIsInstance(data, bytes)
+        self.assertEqual(self.__df.to_csv(index=False).encode(), content)
+
+    def test_sink_blocks(self):
+        # about 17 KiB of csv
+        self.__sink(block_size=4096, max_concurrency=4).produce(data_frame=self.__df, file_name='test1.csv',
+                                                                table_name='test')
+
+        data, content, kwargs = self.__uploads[0]
+        self.assertNotIsInstance(data, bytes)
+        self.assertEqual(4, kwargs['max_concurrency'])
+        self.assertEqual(self.__df.to_csv(index=False).encode(), content)
+
+    def test_sink_parquet(self):
+        self.__sink(file_format='parquet').produce(data_frame=self.__df, file_name='test1.csv', table_name='test')
+
+        _, content, _ = self.__uploads[0]
+        self.assertTrue(self.__df.equals(pd.read_parquet(io.BytesIO(content))))
+
+
+@unittest.skipUnless(azurite_running(), "Azurite is not running on 127.0.0.1:10000")
+class TestAzureBlobSinkAzurite(TestCase):
+    """
+    Unit Tests for AzureBlobSink against the Azurite emulator
+    """
+
+    def setUp(self) -> None:
+        self.__conn, self.__state_manager = TestEnvUtils.set_up_state_manager(self._testMethodName, None, None,
+                                                                              AzureBlobSink.__name__)
+        self.__df = pd.DataFrame({'ID': range(100000), 'NAME': [f'name_{i:05d}' for i in range(100000)]})
+
+    def tearDown(self) -> None:
+        TestEnvUtils.delete_sm_table_sqlite(self.__conn, TestEnvUtils.SM_TABLE_NAME)
+
+    def test_sink_blocks(self):
+        AzureBlobSink(env='azure-test', container='hdm-test', state_manager=self.__state_manager, block_size=256 * 1024,
+                      max_concurrency=4).produce(data_frame=self.__df, file_name='test1.csv', table_name='test')
+
+        blob_client = AzureBLOB(connection='azure-test').container.get_blob_client(
+            f'{self._testMethodName}/test/test1.csv')
+        self.assertEqual(self.__df.to_csv(index=False).encode(), blob_client.download_blob().readall())
+        # about 1.7 MiB in 256 KiB blocks
+        self.assertEqual(7, len(blob_client.get_block_list()[0]))
@@ -0,0 +1,99 @@
+# Copyright © 2020 Hashmap, Inc
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+import gzip
+from datetime import datetime, timezone
+from types import SimpleNamespace
+from unittest import TestCase
+from unittest.mock import MagicMock, PropertyMock, patch
+
+import pandas as pd
+
+from hdm.core.dao.azure_blob import AzureBLOB
+from hdm.core.dao.sqlite import SqLite
+from hdm.core.source.azure_blob_source import AzureBlobSource
+from hdm.core.state_management.state_manager import StateManager
+from tests.core.Sagas.testenv_utils import TestEnvUtils
+
+
+class TestAzureBlobSource(TestCase):
+    """
+    Unit Tests for AzureBlobSource, with the blobs of the container held in memory
+    """
+
+    def setUp(self) -> None:
+        TestEnvUtils.set_environment_variables()
+        self.__df = pd.DataFrame({'ID': range(100), 'NAME': [f'name_{i}' for i in range(100)]})
+        self.__conn = SqLite(connection='state-manager-sqlite')
+        self.__sm_table_name = 'state_manager'
+        TestEnvUtils.create_sm_table_sqlite(self.__conn, self.__sm_table_name)
+        self.__state_manager = TestEnvUtils.get_state_manager_details(StateManager.generate_id(), 'azure_source',
+                                                                      AzureBlobSource.__name__, None, None)
+        self.__state_manager.manifest_name = self._testMethodName
+
+        # blob name -> (content, last modified)
+        self.__blobs = {}
+        container = MagicMock()
+        container.list_blobs.side_effect = self.__list_blobs
+        container.get_blob_client.side_effect = self.__get_blob_client
+        self.__container = container
+        self.__patch = patch.object(AzureBLOB, 'container', new_callable=PropertyMock, return_value=container)
+        self.__patch.start()
+
+    def tearDown(self) -> None:
+        self.__patch.stop()
+        TestEnvUtils.delete_sm_table_sqlite(self.__conn, self.__sm_table_name)
+
+    def __put(self, name: str, content: bytes, last_modified: int = 1600000000) -> None:
+        self.__blobs[name] = (content, datetime.fromtimestamp(last_modified, timezone.utc))
+
+    def __list_blobs(self, name_starts_with: str):
+        page = [SimpleNamespace(name=name, size=len(content), last_modified=last_modified)
+                for name, (content, last_modified) in sorted(self.__blobs.items()) if name.startswith(name_starts_with)]
+        return MagicMock(**{'by_page.return_value': [page]})
+
+    def __get_blob_client(self, name: str):
+        blob_client = MagicMock()
+        blob_client.download_blob.return_value.readinto.side_effect = lambda file: file.write(self.__blobs[name][0])
+        return blob_client
+
+    def __consume(self, **conf) -> list:
+        source = AzureBlobSource(env='azure-test', container='hdm-test', state_manager=self.__state_manager, **conf)
+        return list(source.consume())
+
+    def test_source_formats(self):
+        csv = self.__df.to_csv(index=False).encode()
+        self.__put('azure_source/test/hdm_1.csv', csv)
+        self.__put('azure_source/test/hdm_2.csv.gz', gzip.compress(csv))
+        self.__put('azure_source/schema__test/hdm_3.csv', csv)
+        self.__put('other_source/test/hdm_4.csv', csv)
+
+        results = self.__consume(parallelism=2, max_concurrency=2)
+
+        self.__container.list_blobs.assert_called_once_with(name_starts_with='azure_source/')
+        self.assertEqual(['hdm_3.csv', 'hdm_1.csv', 'hdm_2.csv.gz'], [result['file_name'] for result in results])
+        self.assertEqual(['schema.test', 'test', 'test'], [result['table_name'] for result in results])
+        for result in results:
+            self.assertTrue(self.__df.equals(result['data_frame']))
+
+    def test_source_skip_processed(self):
+        csv = self.__df.to_csv(index=False).encode()
+        self.__put('azure_source/test/hdm_1.csv', csv)
+        self.__put('azure_source/test/hdm_2.csv', csv)
+        self.assertEqual(2, len(self.__consume()))
+
+        # changed since it was sourced
+        self.__put('azure_source/test/hdm_2.csv', csv, last_modified=1600000060)
+        self.__put('azure_source/test/hdm_3.csv', csv)
+        self.assertEqual(['hdm_2.csv', 'hdm_3.csv'], [result['file_name'] for result in self.__consume()])
+        self.assertEqual([], self.__consume())
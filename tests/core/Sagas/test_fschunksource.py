@@ -0,0 +1,147 @@
+# Copyright © 2020 Hashmap, Inc
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+import os
+from unittest import TestCase
+from unittest.mock import patch
+
+import pandas as pd
+
+from hdm.core.dao.sqlite import SqLite
+from hdm.core.source.fs_chunk_source import FSChunkSource
+from hdm.core.state_management.state_manager import StateManager
+from hdm.core.utils.file_format import FileFormat
+from tests.core.Sagas.testenv_utils import TestEnvUtils
+
+
+class TestFsChunkSource(TestCase):
+    """
+      Unit Tests for Filesystem Chunk Source
+      Chunks a sample csv file in TEST_DIR into the sink folder
+      """
+
+    SINK_NAME = 'fs_stg'
+    TABLE_FOLDER = 'ADMIN__TEST1'
+
+    def setUp(self) -> None:
+        TestEnvUtils.set_environment_variables()
+        TestEnvUtils.create_test_env()
+
+        self.__conn = SqLite(connection='state-manager-sqlite')
+        self.__sm_table_name = 'state_manager'
+        TestEnvUtils.create_sm_table_sqlite(self.__conn, self.__sm_table_name)
+        job_id = StateManager.generate_id()
+        self.__state_manager = TestEnvUtils.get_state_manager_details(job_id, self._testMethodName,
+                                                                      FSChunkSource.__name__, self.SINK_NAME, None)
+        self.__test_directory = TestEnvUtils.TEST_DIR
+        self.__source_directory = os.path.join(self.__test_directory, self._testMethodName, self.TABLE_FOLDER)
+        os.makedirs(self.__source_directory)
+        self.__source_file = os.path.join(self.__source_directory, f'hdm_{job_id}.csv')
+        self.__header = b'ID,NAME\n'
+        self.__rows = [f'{i},name {i}\n'.encode() for i in range(1001)]
+        with open(self.__source_file, 'wb') as file:
+            file.write(self.__header)
+            file.writelines(self.__rows)
+
+    def tearDown(self) -> None:
+        TestEnvUtils.delete_sm_table_sqlite(self.__conn, self.__sm_table_name)
+        TestEnvUtils.cleanup(self.__test_directory, keep_testing_directory=TestEnvUtils.KEEP_TESTS_DIR)
+
+    def __consume(self, **conf) -> list:
+        src = FSChunkSource(directory=self.__test_directory, state_manager=self.__state_manager, **conf)
+        return list(src.consume(**conf))
+
+    def __read_chunk(self, result: dict) -> list:
+        with FileFormat.open(os.path.join(self.__test_directory, self.SINK_NAME, self.TABLE_FOLDER, result['file_name']),
+                  'rb') as file:
+            self.assertEqual(self.__header, file.readline())
+            return file.readlines()
+
+    def test_chunk_streamed_across_blocks(self):
+        # Small blocks, so chunk boundaries fall inside and across blocks
+        with patch.object(FSChunkSource, '_FSChunkSource__buffer_size', 64):
+            results = self.__consume(chunk=200)
+
+        self.assertEqual([200, 200, 200, 200, 200, 1], [result['record_count'] for result in results])
+        self.assertEqual([[{'chunk': '200', 'seq': f'{seq}'}] for seq in range(1, 7)],
+                         [result['source_filter'] for result in results])
+        self.assertEqual(self.__rows, [row for result in results for row in self.__read_chunk(result)])
+        self.assertEqual(200, results[0]['data_frame'].shape[0])
+
+    def test_chunk_pass_through(self):
+        results = self.__consume(chunk=1001, pass_through=True)
+
+        self.assertEqual(1, len(results))
+        self.assertEqual(1001, results[0]['record_count'])
+        self.assertNotIn('data_frame', results[0])
+        self.assertTrue(os.path.isfile(results[0]['file_path']))
+        self.assertEqual(self.__rows, self.__read_chunk(results[0]))
+
+    def test_chunk_bytes(self):
+        results = self.__consume(chunk_bytes=1000, parallelism=3)
+
+        chunks = [self.__read_chunk(result) for result in results]
+        self.assertEqual(self.__rows, [row for chunk in chunks for row in chunk])
+        self.assertEqual([len(chunk) for chunk in chunks], [result['record_count'] for result in results])
+        # every chunk but the last holds at least chunk_bytes, and less than a line more
+        for chunk in chunks[:-1]:
+            self.assertGreaterEqual(sum(len(row) for row in chunk), 1000)
+            self.assertLess(sum(len(row) for row in chunk[:-1]), 1000)
+        self.assertEqual([[{'chunk_bytes': '1000', 'seq': f'{seq}'}] for seq in range(1, len(results) + 1)],
+                         [result['source_filter'] for result in results])
+
+    def test_chunk_and_chunk_bytes(self):
+        with self.assertRaises(ValueError):
+            self.__consume(chunk=200, chunk_bytes=1000)
+
+    def test_chunk_gzip(self):
+        with open(self.__source_file, 'rb') as source, FileFormat.open(f'{self.__source_file}.gz', 'wb') as target:
+            target.write(source.read())
+        os.remove(self.__source_file)
+        results = self.__consume(chunk=400)
+
+        self.assertEqual([400, 400, 201], [result['record_count'] for result in results])
+        self.assertTrue(all(result['file_name'].endswith('.csv.gz') for result in results))
+        self.assertEqual(self.__rows, [row for result in results for row in self.__read_chunk(result)])
+        self.assertEqual(400, results[0]['data_frame'].shape[0])
+
+    def test_chunk_parquet(self):
+        df = FileFormat.read_data_frame(self.__source_file)
+        FileFormat.write_data_frame(df, f'{self.__source_file[:-4]}.parquet', file_format='parquet',
+                                    row_group_size=300)
+        os.remove(self.__source_file)
+        results = self.__consume(chunk=400)
+
+        self.assertEqual([400, 400, 201], [result['record_count'] for result in results])
+        self.assertTrue(df.equals(pd.concat([result['data_frame'] for result in results], ignore_index=True)))
+
+    def test_chunk_processed_once(self):
+        self.assertEqual([1001], [result['record_count'] for result in self.__consume(chunk=2000)])
+        self.assertEqual([], self.__consume(chunk=2000))
+
+        # a changed file is chunked again
+        with open(self.__source_file, 'ab') as file:
+            file.write(b'1001,name 1001\n')
+        self.assertEqual([1002], [result['record_count'] for result in self.__consume(chunk=2000)])
+
+    def test_chunk_watch(self):
+        src = FSChunkSource(directory=self.__test_directory, state_manager=self.__state_manager, chunk=2000,
+                            watch=True, poll_interval=30, watch_timeout=0.5)
+        results = src.consume()
+        self.assertEqual(1001, next(results)['record_count'])
+
+        # lands while watching
+        with open(os.path.join(self.__source_directory, 'landed.csv'), 'wb') as file:
+            file.write(self.__header)
+            file.writelines(self.__rows[:10])
+        self.assertEqual([10], [result['record_count'] for result in results])
@@ -14,12 +14,12 @@
 import fnmatch
 import os
 import re
-import unittest
 from unittest import TestCase
 
 from hdm.core.dao.sqlite import SqLite
 from hdm.core.sink.fs_sink import FSSink
 from hdm.core.state_management.state_manager import StateManager
+from hdm.core.utils.file_format import FileFormat
 from tests.core.Sagas.testenv_utils import TestEnvUtils
 
 
@@ -68,10 +68,8 @@ class TestFsSink(TestCase):
         with self.assertRaises(NotADirectoryError):
             self.__consume_df(conf)
 
-    @unittest.skip
     def test_sink_unsupported_file_format(self):
-        # TODO: revisit later
-        conf = dict(sink=dict(conf=dict(directory=self.__test_directory, data_frame=self.__df, file_format='parquet')))
+        conf = dict(sink=dict(conf=dict(directory=self.__test_directory, data_frame=self.__df, file_format='avro')))
         conf['sink']['conf']['state_manager'] = self.__state_manager
         with self.assertRaises(ValueError):
             self.__consume_df(conf)
@@ -97,3 +95,33 @@ class TestFsSink(TestCase):
         conf['sink']['conf']['state_manager'] = self.__state_manager
         self.__consume_df(conf)
         self.assertEqual(len(fnmatch.filter(os.listdir(self.__test_directory), conf['sink']['conf']['file_name'])), 1)
+
+    def test_sink_pass_through_file(self):
+        source_file = os.path.join(self.__test_directory, 'pass_through_source.csv')
+        self.__df.to_csv(source_file, index=False)
+        conf = dict(sink=dict(conf=dict(directory=self.__test_directory, file_path=source_file,
+                                        file_name='pass_through_copy.csv', record_count=None)))
+        conf['sink']['conf']['state_manager'] = self.__state_manager
+        self.__consume_df(conf)
+        with open(source_file, 'rb') as source, \
+                open(os.path.join(self.__test_directory, 'pass_through_copy.csv'), 'rb') as copy:
+            self.assertEqual(source.read(), copy.read())
+
+    def test_sink_parquet(self):
+        conf = dict(sink=dict(conf=dict(directory=self.__test_directory, data_frame=self.__df, file_format='parquet',
+                                        compression='zstd', row_group_size=30, file_name='test_file.csv')))
+        conf['sink']['conf']['state_manager'] = self.__state_manager
+        self.__consume_df(conf)
+        file_name = os.path.join(self.__test_directory, 'test_file.parquet')
+        self.assertTrue(self.__df.equals(FileFormat.read_data_frame(file_name)))
+        self.assertEqual([30, 30, 30, 10], [table.num_rows for table in FileFormat.iter_tables(file_name)])
+
+    def test_sink_compressed_csv(self):
+        for compression, extension in [('gzip', '.csv.gz'), ('zstd', '.csv.zst')]:
+            conf = dict(sink=dict(conf=dict(directory=self.__test_directory, data_frame=self.__df,
+                                            compression=compression)))
+            conf['sink']['conf']['state_manager'] = self.__state_manager
+            self.__consume_df(conf)
+            files = fnmatch.filter(os.listdir(self.__test_directory), f'hdm_*{extension}')
+            self.assertEqual(1, len(files))
+            self.assertTrue(self.__df.equals(FileFormat.read_data_frame(os.path.join(self.__test_directory, files[0]))))
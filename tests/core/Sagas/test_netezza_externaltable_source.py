@@ -0,0 +1,119 @@
+# Copyright © 2020 Hashmap, Inc
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+import re
+import tempfile
+from unittest import TestCase
+from unittest.mock import MagicMock, patch
+
+from hdm.core.dao.sqlite import SqLite
+from hdm.core.source.netezza_externaltable_source import NetezzaExternalTableSource
+from hdm.core.state_management.state_manager import StateManager
+from tests.core.Sagas.testenv_utils import TestEnvUtils
+
+
+class TestNetezzaExternalTableSource(TestCase):
+    """
+    Unit Tests for the partitioned unloads of NetezzaExternalTableSource, with the Netezza connections made up
+    """
+
+    def setUp(self) -> None:
+        TestEnvUtils.set_environment_variables()
+        self.__conn = SqLite(connection='state-manager-sqlite')
+        self.__sm_table_name = 'state_manager'
+        TestEnvUtils.create_sm_table_sqlite(self.__conn, self.__sm_table_name)
+        self.__state_manager = TestEnvUtils.get_state_manager_details(StateManager.generate_id(), 'netezza_source',
+                                                                      NetezzaExternalTableSource.__name__,
+                                                                      'fs_sink', None)
+        self.__state_manager.manifest_name = self._testMethodName
+        self.__directory = tempfile.TemporaryDirectory()
+
+        # statements executed on every connection, the highest watermark and the rows reported by each INSERT -
+        # None for a driver that does not report them
+        self.__statements = []
+        self.__high_watermark = 50
+        self.__rowcounts = {1: 10, 2: None}
+        self.__patch = patch.object(NetezzaExternalTableSource, '_NetezzaExternalTableSource__open_connection',
+                                    new=self.__open_connection)
+        self.__patch.start()
+
+    def tearDown(self) -> None:
+        self.__patch.stop()
+        self.__directory.cleanup()
+        TestEnvUtils.delete_sm_table_sqlite(self.__conn, self.__sm_table_name)
+
+    def __open_connection(self, stack):
+        conn = MagicMock()
+        cursor = conn.cursor.return_value
+        cursor.fetchall.return_value = [('ID', 'INTEGER'), ('T1', 'INTEGER')]
+        cursor.fetchone.return_value = (self.__high_watermark,)
+
+        def execute(statement):
+            self.__statements.append(statement)
+            if not statement.startswith('INSERT'):
+                return
+            partition_seq = int(re.search(r'_EXT_(\d+)', statement).group(1))
+            rowcount = self.__rowcounts[partition_seq]
+            if isinstance(rowcount, Exception):
+                raise rowcount
+            if rowcount is None:
+                # unloaded by the external table, counted from the file
+                file_path = re.search(r"DATAOBJECT \('([^']+)'\)", self.__statements[-2]).group(1)
+                with open(file_path, 'w') as file:
+                    file.write('ID,T1,CK_SUM\n1,1,1\n2,2,2\n3,3,3\n')
+            cursor.rowcount = -1 if rowcount is None else rowcount
+        cursor.execute.side_effect = execute
+        return conn
+
+    def __source(self) -> NetezzaExternalTableSource:
+        return NetezzaExternalTableSource(env='netezza', table_name='ADMIN.TEST1', directory=self.__directory.name,
+                                          watermark={'column': 'T1', 'offset': 2},
+                                          partition={'method': 'dataslice', 'count': 2}, parallelism=2,
+                                          state_manager=self.__state_manager)
+
+    def __last_records(self) -> list:
+        with self.__conn.connection as conn:
+            cursor = conn.execute(f"SELECT last_record_pulled FROM {self.__sm_table_name} "
+                                  f"WHERE action = 'sourcing post-pull' ORDER BY sourcing_end_time")
+            return [row[0] for row in cursor.fetchall()]
+
+    def test_unload_partitions(self):
+        results = list(self.__source().consume())
+
+        inserts = sorted(statement for statement in self.__statements if statement.startswith('INSERT'))
+        self.assertEqual(2, len(inserts))
+        for partition_seq, insert in enumerate(inserts, start=1):
+            self.assertTrue(insert.startswith(f'INSERT INTO ADMIN.TEST1_HDM_EXT_{partition_seq} SELECT'))
+            self.assertIn(f'WHERE T1 > 2 AND T1 <= 50 AND (MOD(DATASLICEID, 2) = {partition_seq - 1})', insert)
+        creates = sorted(statement for statement in self.__statements if statement.startswith('CREATE'))
+        self.assertEqual(['CREATE EXTERNAL TABLE ADMIN.TEST1_HDM_EXT_1(ID INTEGER,T1 INTEGER,CK_SUM INTEGER)',
+                          'CREATE EXTERNAL TABLE ADMIN.TEST1_HDM_EXT_2(ID INTEGER,T1 INTEGER,CK_SUM INTEGER)'],
+                         [create.split(' USING')[0] for create in creates])
+
+        # one file per partition, counted by the driver or from the file
+        self.assertEqual(2, len({result['file_path'] for result in results}))
+        self.assertEqual([3, 10], sorted(result['record_count'] for result in results))
+        # only the last file records the high watermark
+        self.assertEqual([None, 'T1:50'], self.__last_records())
+
+    def test_failed_partition_keeps_watermark(self):
+        self.__rowcounts[2] = RuntimeError('unload failed')
+        with self.assertRaises(RuntimeError):
+            list(self.__source().consume())
+
+        self.assertTrue(all(last_record is None for last_record in self.__last_records()))
+
+    def test_nothing_above_watermark(self):
+        self.__high_watermark = None
+        self.assertEqual([], list(self.__source().consume()))
+        self.assertFalse(any(statement.startswith('INSERT') for statement in self.__statements))
@@ -0,0 +1,104 @@
+# Copyright © 2020 Hashmap, Inc
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+import json
+import os
+import sqlite3
+import tempfile
+from unittest import TestCase
+from unittest.mock import patch
+
+from hdm.core.dao.sqlite import SqLite
+from hdm.core.source.netezza_source import NetezzaSource
+from hdm.core.state_management.state_manager import StateManager
+from tests.core.Sagas.testenv_utils import TestEnvUtils
+
+
+class TestNetezzaSource(TestCase):
+    """
+    Unit Tests for the watermark of a partitioned NetezzaSource, with a SQLite table standing in for the Netezza table
+    """
+
+    def setUp(self) -> None:
+        TestEnvUtils.set_environment_variables()
+        self.__conn = SqLite(connection='state-manager-sqlite')
+        self.__sm_table_name = 'state_manager'
+        TestEnvUtils.create_sm_table_sqlite(self.__conn, self.__sm_table_name)
+        self.__state_manager = TestEnvUtils.get_state_manager_details(StateManager.generate_id(), 'netezza_source',
+                                                                      NetezzaSource.__name__, self._testMethodName,
+                                                                      None)
+        self.__state_manager.manifest_name = self._testMethodName
+
+        self.__directory = tempfile.TemporaryDirectory()
+        self.__database = os.path.join(self.__directory.name, 'netezza.db')
+        with sqlite3.connect(self.__database) as conn:
+            conn.execute('CREATE TABLE TEST (ID INT, T1 INT)')
+            # partition 1 holds the highest watermarks, and is extracted first
+            conn.executemany('INSERT INTO TEST VALUES (?, ?)', [(i, 100 - i) for i in range(100)])
+
+        self.__patch = patch.object(NetezzaSource, '_NetezzaSource__open_connection', new=self.__open_connection)
+        self.__patch.start()
+
+    def tearDown(self) -> None:
+        self.__patch.stop()
+        self.__directory.cleanup()
+        TestEnvUtils.delete_sm_table_sqlite(self.__conn, self.__sm_table_name)
+
+    def __open_connection(self, stack):
+        conn = sqlite3.connect(self.__database)
+        stack.callback(conn.close)
+        return conn
+
+    def __source(self) -> NetezzaSource:
+        return NetezzaSource(env='netezza', table_name='TEST', watermark={'column': 'T1', 'offset': 0}, batch_size=10,
+                             partition={'method': 'range', 'column': 'ID', 'count': 2, 'lower_bound': 0,
+                                        'upper_bound': 100}, parallelism=2, state_manager=self.__state_manager)
+
+    def __last_records(self) -> list:
+        with self.__conn.connection as conn:
+            cursor = conn.execute(f"SELECT last_record_pulled FROM {self.__sm_table_name} "
+                                  f"WHERE action = 'sourcing post-pull' ORDER BY sourcing_end_time")
+            return [row[0] for row in cursor.fetchall()]
+
+    def test_high_watermark_recorded_last(self):
+        results = list(self.__source().consume())
+        self.assertEqual(100, sum(result['record_count'] for result in results))
+
+        last_records = self.__last_records()
+        self.assertEqual(10, len(last_records))
+        self.assertEqual([None] * 9, last_records[:-1])
+        self.assertIn('T1:100', last_records[-1].split(','))
+        self.assertEqual(last_records[-1], self.__state_manager.get_last_record('TEST'))
+
+    def test_failed_partition_keeps_watermark(self):
+        fetch = NetezzaSource._NetezzaSource__fetch_partition
+
+        def fail_partition_2(source, partition_seq, query, batches, stop):
+            if partition_seq == 2:
+                batches.put((partition_seq, RuntimeError('partition 2 failed')))
+                batches.put((partition_seq, None))
+                return
+            fetch(source, partition_seq, query, batches, stop)
+
+        with patch.object(NetezzaSource, '_NetezzaSource__fetch_partition', new=fail_partition_2):
+            with self.assertRaises(RuntimeError):
+                list(self.__source().consume())
+
+        self.assertTrue(all(last_record is None for last_record in self.__last_records()))
+        self.assertIsNone(self.__state_manager.get_last_record('TEST'))
+        with self.__conn.connection as conn:
+            cursor = conn.execute(f"SELECT source_filter FROM {self.__sm_table_name} "
+                                  f"WHERE action = 'sourcing post-pull' AND status = 'failure'")
+            failures = [row[0] for row in cursor.fetchall()]
+        self.assertEqual(1, len(failures))
+        self.assertEqual([{'partition': '2', 'batch_size': '10', 'seq': '1'}], json.loads(failures[0]))
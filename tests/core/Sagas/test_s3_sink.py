@@ -12,13 +12,18 @@
 # See the License for the specific language governing permissions and
 # limitations under the License.
 import os
+import tempfile
 import unittest
 from unittest import TestCase
+from unittest.mock import patch
 
+import boto3
 import logging
+import pandas as pd
 
+from hdm.core.dao.s3 import S3
 from hdm.core.sink.s3_sink import S3Sink
-from tests.core.Sagas.testenv_utils import TestEnvUtils
+from tests.core.Sagas.testenv_utils import TestEnvUtils, mock_s3
 
 # Bucket name where CSV's will be created. Will be prefixed with 'hdm-'
 S3_BUCKET_NAME = 'testbucket'
@@ -55,3 +60,64 @@ class TestS3Sink(TestCase):
                 sink.produce(**conf['sink']['conf'])
             except Exception as e:
                 self.__logger.error(f"Encountered exception: {e}")
+
+
+@mock_s3
+class TestS3SinkMoto(TestCase):
+    """
+    Unit Tests for S3 Sink against the moto S3 stand-in
+    """
+
+    def setUp(self) -> None:
+        self.__conn, self.__state_manager = TestEnvUtils.set_up_state_manager(self._testMethodName, None, None,
+                                                                              S3Sink.__name__)
+        self.__df = TestEnvUtils.get_test_df()
+        self.__s3 = boto3.session.Session(aws_access_key_id='testing', aws_secret_access_key='testing',
+                                          region_name='us-east-1').resource('s3')
+
+    def tearDown(self) -> None:
+        TestEnvUtils.delete_sm_table_sqlite(self.__conn, TestEnvUtils.SM_TABLE_NAME)
+
+    def __sink(self, **conf) -> S3Sink:
+        return S3Sink(connection='s3-moto', bucket_name=f'hdm-{S3_BUCKET_NAME}', state_manager=self.__state_manager,
+                      **conf)
+
+    def __read(self, object_name: str) -> bytes:
+        return self.__s3.Object(f'hdm-{S3_BUCKET_NAME}', object_name).get()['Body'].read()
+
+    def test_sink_csv(self):
+        self.__sink().produce(data_frame=self.__df, file_name='test1.csv')
+        self.assertEqual(self.__df.to_csv(index=False).encode(), self.__read('test1.csv'))
+
+    def test_sink_multipart(self):
+        with tempfile.TemporaryDirectory() as directory:
+            file_path = os.path.join(directory, 'large.csv')
+            with open(file_path, 'wb') as file:
+                file.write(b'ID\n' + b''.join(f'{i:011d}\n'.encode() for i in range(1024 * 1024)))
+            self.__sink(multipart_threshold=5 * 1024 * 1024, multipart_chunksize=5 * 1024 * 1024,
+                        max_concurrency=4).produce(file_path=file_path, file_name='large.csv', record_count=None)
+            with open(file_path, 'rb') as file:
+                self.assertEqual(file.read(), self.__read('large.csv'))
+
+        # 12 MiB in 5 MiB parts
+        self.assertTrue(self.__s3.Object(f'hdm-{S3_BUCKET_NAME}', 'large.csv').e_tag.endswith('-3"'))
+
+    def test_sink_data_frame_multipart(self):
+        df = pd.DataFrame({'ID': [f'{i:011d}' for i in range(1024 * 1024)]})
+        self.__sink(multipart_threshold=5 * 1024 * 1024, multipart_chunksize=5 * 1024 * 1024,
+                    max_concurrency=4).produce(data_frame=df, file_name='large.csv')
+
+        self.assertEqual(df.to_csv(index=False).encode(), self.__read('large.csv'))
+        # 12 MiB in 5 MiB parts
+        self.assertTrue(self.__s3.Object(f'hdm-{S3_BUCKET_NAME}', 'large.csv').e_tag.endswith('-3"'))
+
+    def test_sink_session_and_bucket_reused(self):
+        sink = self.__sink()
+        with patch('hdm.core.sink.s3_sink.S3', wraps=S3) as s3, \
+                patch.object(S3Sink, '_S3Sink__bucket_exists', autospec=True, return_value=False) as bucket_exists:
+            for object_name in ['test1.csv', 'test2.csv']:
+                sink.produce(data_frame=self.__df, file_name=object_name)
+
+        self.assertEqual(1, s3.call_count)
+        self.assertEqual(1, bucket_exists.call_count)
+        self.assertEqual(self.__read('test1.csv'), self.__read('test2.csv'))
@@ -15,12 +15,16 @@ import os
 import unittest
 from unittest import TestCase
 
+import boto3
 import botocore.errorfactory
 import pandas as pd
 import logging
 
+from hdm.core.dao.sqlite import SqLite
 # Name of testing directory created for ingesting files
 from hdm.core.source.s3_source import S3Source
+from hdm.core.state_management.state_manager import StateManager
+from tests.core.Sagas.testenv_utils import TestEnvUtils, mock_s3
 
 # Bucket name for test cases
 S3_BUCKET_NAME = 'knerrir-testbucket'
@@ -55,3 +59,62 @@ class TestS3(TestCase):
                 self.assertTrue(isinstance(df['data_frame'], pd.DataFrame))
         except botocore.errorfactory.ClientError as e:
             self.__logger.error(f"Error occurred: {e}")
+
+
+@mock_s3
+class TestS3SourceMoto(TestCase):
+    """
+    Unit Tests for S3 Source against the moto S3 stand-in
+    """
+
+    def setUp(self) -> None:
+        TestEnvUtils.set_environment_variables()
+        self.__conn = SqLite(connection='state-manager-sqlite')
+        self.__sm_table_name = 'state_manager'
+        TestEnvUtils.create_sm_table_sqlite(self.__conn, self.__sm_table_name)
+        self.__state_manager = TestEnvUtils.get_state_manager_details(StateManager.generate_id(), self._testMethodName,
+                                                                      S3Source.__name__, None, None)
+        self.__state_manager.manifest_name = self._testMethodName
+        self.__bucket = boto3.session.Session(aws_access_key_id='testing', aws_secret_access_key='testing',
+                                              region_name='us-east-1').resource('s3').Bucket(S3_BUCKET_NAME)
+        self.__bucket.create()
+
+    def tearDown(self) -> None:
+        TestEnvUtils.delete_sm_table_sqlite(self.__conn, self.__sm_table_name)
+
+    def __put(self, *keys):
+        for key in keys:
+            self.__bucket.put_object(Key=key, Body=f'KEY,ID\n{key},1\n{key},2\n'.encode())
+
+    def __consume(self, **conf) -> list:
+        conf = dict(dict(connection='s3-moto', bucket_name=S3_BUCKET_NAME), **conf)
+        source = S3Source(state_manager=self.__state_manager, **conf)
+        return [result['file_name'] for result in source.consume(**conf)]
+
+    def test_source_paginated_parallel(self):
+        keys = [f'data/hdm_{i:03d}.csv' for i in range(25)]
+        self.__put(*reversed(keys))
+        self.__put('data/readme.txt', 'other/hdm_000.csv')
+
+        source = S3Source(connection='s3-moto', bucket_name=S3_BUCKET_NAME, state_manager=self.__state_manager,
+                          prefix='data/', page_size=10, parallelism=4)
+        results = list(source.consume())
+
+        self.assertEqual(keys, [result['file_name'] for result in results])
+        self.assertTrue(all(result['data_frame']['KEY'].tolist() == [result['file_name']] * 2 for result in results))
+
+    def test_source_incremental(self):
+        self.__put('hdm_1.csv', 'hdm_2.csv')
+        self.assertEqual(['hdm_1.csv', 'hdm_2.csv'], self.__consume())
+
+        # only the keys after the last key read are listed
+        self.__put('hdm_3.csv')
+        self.assertEqual(['hdm_3.csv'], self.__consume())
+        self.assertEqual([], self.__consume())
+
+        self.assertEqual(['hdm_2.csv', 'hdm_3.csv'], self.__consume(start_after='hdm_1.csv'))
+        self.assertEqual(['hdm_1.csv', 'hdm_2.csv', 'hdm_3.csv'], self.__consume(incremental=False))
+
+    def test_source_missing_bucket(self):
+        with self.assertRaises(RuntimeError):
+            self.__consume(bucket_name=f'{S3_BUCKET_NAME}-na')
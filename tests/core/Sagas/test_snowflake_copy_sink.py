@@ -0,0 +1,99 @@
+# Copyright © 2020 Hashmap, Inc
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+from unittest import TestCase
+
+import pandas as pd
+
+from hdm.core.dao.snowflake_azure_copy import SnowflakeAzureCopy
+from hdm.core.sink.snowflake_azure_copy_sink import SnowflakeAzureCopySink
+from tests.core.Sagas.testenv_utils import TestEnvUtils
+
+
+class TestSnowflakeAzureCopySink(TestCase):
+    """
+    Unit Tests for the batched COPY INTO of SnowflakeAzureCopySink, with the results of COPY INTO made up
+    """
+
+    def setUp(self) -> None:
+        self.__conn, self.__state_manager = TestEnvUtils.set_up_state_manager(self._testMethodName, 'azure_sink',
+                                                                              'AzureBlobSource',
+                                                                              SnowflakeAzureCopySink.__name__)
+        self.__df = TestEnvUtils.get_test_df()
+
+        # file -> (status, rows loaded) reported by COPY INTO
+        self.__results = {}
+        self.__queries = []
+        self.__patch, connection = TestEnvUtils.patch_property(SnowflakeAzureCopy)
+        cursor = connection.cursor.return_value
+        cursor.execute.side_effect = self.__queries.append
+        cursor.description = [('file',), ('status',), ('rows_parsed',), ('rows_loaded',), ('first_error',)]
+        cursor.fetchall.side_effect = lambda: [(f'azure://account.blob.core.windows.net/data/{file}', status, rows,
+                                                rows, None) for file, (status, rows) in self.__results.items()]
+        self.__patch.start()
+
+    def tearDown(self) -> None:
+        self.__patch.stop()
+        TestEnvUtils.delete_sm_table_sqlite(self.__conn, TestEnvUtils.SM_TABLE_NAME)
+
+    def __sink(self, **conf) -> SnowflakeAzureCopySink:
+        return SnowflakeAzureCopySink(env='snowflake', stage_name='TMP_STAGE', stage_directory='data',
+                                      file_format='csv', state_manager=self.__state_manager, **conf)
+
+    def __states(self) -> list:
+        return [[status, None if pd.isna(row_count) else int(row_count)]
+                for status, row_count in TestEnvUtils.get_states(self.__conn, 'status, row_count')]
+
+    def test_copy_batched(self):
+        sink = self.__sink(batch_size=2)
+        for seq in range(1, 4):
+            sink.produce(data_frame=self.__df, file_name=f'hdm_{seq}.csv', table_name='schema.test')
+        self.assertEqual(1, len(self.__queries))
+        self.assertIn("FILES = ('azure_sink/schema__test/hdm_1.csv', 'azure_sink/schema__test/hdm_2.csv')",
+                      self.__queries[0])
+
+        sink.flush()
+        self.assertEqual(2, len(self.__queries))
+        self.assertIn("FILES = ('azure_sink/schema__test/hdm_3.csv')", self.__queries[1])
+
+        sink.flush()
+        self.assertEqual(2, len(self.__queries))
+
+    def test_copy_loaded_counts(self):
+        self.__results = {'azure_sink/test/hdm_1.csv': ('LOADED', 3),
+                          'azure_sink/test/hdm_2.csv': ('LOAD_FAILED', 0)}
+        sink = self.__sink()
+        sink.produce(data_frame=self.__df, file_name='hdm_1.csv', object_name='azure_sink/test/hdm_1.csv',
+                     table_name='test')
+        sink.produce(data_frame=self.__df, file_name='hdm_2.csv', table_name='test')
+        self.assertEqual([['in_progress', len(self.__df)], ['in_progress', len(self.__df)]], self.__states())
+
+        sink.flush()
+        self.assertEqual([['success', 3], ['failure', 0]], self.__states())
+
+    def test_copy_unreported_failed(self):
+        self.__results = {'azure_sink/test/hdm_1.csv': ('LOADED', 3),
+                          'azure_sink/other/hdm_3.csv': ('LOADED', 5)}
+        sink = self.__sink()
+        sink.produce(data_frame=self.__df, file_name='hdm_1.csv', object_name='azure_sink/test/hdm_1.csv',
+                     table_name='test')
+        sink.produce(data_frame=self.__df, file_name='hdm_2.csv', table_name='test')
+
+        with self.assertLogs(SnowflakeAzureCopySink._get_logger(), level='ERROR') as logs:
+            sink.flush()
+        self.assertEqual([['success', 3], ['failure', None]], self.__states())
+        self.assertEqual(2, len(logs.records))
+
+    def test_batch_size_limit(self):
+        with self.assertRaises(ValueError):
+            self.__sink(batch_size=1001)
@@ -0,0 +1,76 @@
+# Copyright © 2020 Hashmap, Inc
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+from unittest import TestCase
+from unittest.mock import patch
+
+from hdm.core.dao.snowflake import Snowflake
+from hdm.core.sink.snowflake_direct_sink import SnowflakeDirectSink
+from tests.core.Sagas.testenv_utils import TestEnvUtils
+
+
+class TestSnowflakeDirectSink(TestCase):
+    """
+    Unit Tests for SnowflakeDirectSink, with write_pandas and the Snowflake connection made up
+    """
+
+    def setUp(self) -> None:
+        self.__conn, self.__state_manager = TestEnvUtils.set_up_state_manager(self._testMethodName, 'netezza_source',
+                                                                              'NetezzaSource',
+                                                                              SnowflakeDirectSink.__name__)
+        self.__df = TestEnvUtils.get_test_df()
+
+        connection_patch, self.__connection = TestEnvUtils.patch_property(Snowflake)
+        self.__patches = [connection_patch, patch('hdm.core.sink.snowflake_direct_sink.write_pandas')]
+        _, self.__write_pandas = [p.start() for p in self.__patches]
+
+    def tearDown(self) -> None:
+        for p in self.__patches:
+            p.stop()
+        TestEnvUtils.delete_sm_table_sqlite(self.__conn, TestEnvUtils.SM_TABLE_NAME)
+
+    def __sink(self, **conf) -> SnowflakeDirectSink:
+        return SnowflakeDirectSink(env='snowflake-test', state_manager=self.__state_manager, **conf)
+
+    def __state(self) -> list:
+        return TestEnvUtils.get_states(self.__conn, 'sink_entity, status, row_count')[0]
+
+    def test_write(self):
+        rows = self.__df.shape[0]
+        self.__write_pandas.return_value = (True, 1, rows, [])
+        self.__sink(table_name='DB.SCHEMA.TEST', chunk_size=50, parallel=8).produce(data_frame=self.__df,
+                                                                                    table_name='test')
+
+        self.__write_pandas.assert_called_once_with(self.__connection, self.__df, 'TEST', database='DB',
+                                                    schema='SCHEMA', chunk_size=50, compression='gzip', parallel=8,
+                                                    quote_identifiers=False)
+        self.assertEqual(['DB.SCHEMA.TEST', 'success', str(rows)], self.__state())
+
+    def test_produced_table(self):
+        self.__write_pandas.return_value = (True, 1, 1, [])
+        self.__sink().produce(data_frame=self.__df, table_name='schema.test')
+
+        _, kwargs = self.__write_pandas.call_args
+        self.assertEqual((None, 'schema', 100000), (kwargs['database'], kwargs['schema'], kwargs['chunk_size']))
+        self.assertEqual('test', self.__write_pandas.call_args[0][2])
+
+    def test_write_failed(self):
+        self.__write_pandas.return_value = (False, 2, 0, [])
+        self.__sink(table_name='TEST').produce(data_frame=self.__df)
+        self.assertEqual(['TEST', 'failure', None], self.__state())
+
+    def test_invalid_conf(self):
+        with self.assertRaises(ValueError):
+            self.__sink(chunk_size=0)
+        with self.assertRaises(ValueError):
+            self.__sink(compression='zstd')
@@ -0,0 +1,101 @@
+# Copyright © 2020 Hashmap, Inc
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+import glob
+import re
+from unittest import TestCase
+
+import pandas as pd
+
+from hdm.core.dao.snowflake import Snowflake
+from hdm.core.sink.snowflake_internal_stage_sink import SnowflakeInternalStageSink
+from hdm.core.utils.file_format import FileFormat
+from tests.core.Sagas.testenv_utils import TestEnvUtils
+
+
+class TestSnowflakeInternalStageSink(TestCase):
+    """
+    Unit Tests for the PUT, and COPY INTO, of SnowflakeInternalStageSink, with the Snowflake connection made up
+    """
+
+    def setUp(self) -> None:
+        self.__conn, self.__state_manager = TestEnvUtils.set_up_state_manager(self._testMethodName, 'netezza_source',
+                                                                              'NetezzaSource',
+                                                                              SnowflakeInternalStageSink.__name__)
+        self.__df = pd.DataFrame({'id': range(5000), 'name': [f'name {i}' for i in range(5000)]})
+
+        self.__queries = []
+        # file name -> dataframe read from the file, when it is PUT
+        self.__uploaded = {}
+        self.__patch, connection = TestEnvUtils.patch_property(Snowflake)
+        cursor = connection.cursor.return_value
+        cursor.execute.side_effect = self.__execute
+        cursor.description = [('file',), ('status',), ('rows_parsed',), ('rows_loaded',)]
+        cursor.fetchall.side_effect = lambda: [(name, 'LOADED', df.shape[0], df.shape[0])
+                                               for name, df in self.__uploaded.items()]
+        self.__patch.start()
+
+    def tearDown(self) -> None:
+        self.__patch.stop()
+        TestEnvUtils.delete_sm_table_sqlite(self.__conn, TestEnvUtils.SM_TABLE_NAME)
+
+    def __execute(self, query: str) -> None:
+        self.__queries.append(query)
+        if query.startswith('PUT'):
+            # the files are gone once the sink returns
+            pattern = re.match(r"PUT 'file://(\S+)'", query).group(1)
+            for file_name in sorted(glob.glob(pattern)):
+                self.__uploaded[file_name] = FileFormat.read_data_frame(file_name)
+
+    def __sink(self, **conf) -> SnowflakeInternalStageSink:
+        return SnowflakeInternalStageSink(env='snowflake-test', stage_name='TMP_STAGE', table_name='schema.test',
+                                          state_manager=self.__state_manager, **conf)
+
+    def __record_count(self) -> int:
+        return int(TestEnvUtils.get_states(self.__conn, 'row_count')[0][0])
+
+    def test_put_split_compressed(self):
+        self.__sink(max_file_size=8 * 1024, parallel=8).produce(data_frame=self.__df)
+
+        self.assertEqual(2, len(self.__queries))
+        self.assertEqual("CREATE STAGE IF NOT EXISTS TMP_STAGE", self.__queries[0])
+        self.assertRegex(self.__queries[1], r"^PUT 'file://\S+\.csv\.gz' @TMP_STAGE/schema__test/ PARALLEL = 8 "
+                                            r"AUTO_COMPRESS = FALSE SOURCE_COMPRESSION = GZIP OVERWRITE = TRUE$")
+        self.assertGreater(len(self.__uploaded), 1)
+        # every file is a gzip compressed csv with a header, together holding the frame
+        pd.testing.assert_frame_equal(self.__df, pd.concat(self.__uploaded.values(), ignore_index=True))
+        self.assertEqual(5000, self.__record_count())
+
+    def test_put_parquet_copy(self):
+        sink = self.__sink(file_format='parquet', copy=True)
+        sink.produce(data_frame=self.__df)
+
+        self.assertEqual(3, len(self.__queries))
+        self.assertIn(".parquet' @TMP_STAGE/schema__test/ PARALLEL = 4 AUTO_COMPRESS = FALSE OVERWRITE",
+                      self.__queries[1])
+        self.assertEqual(1, len(self.__uploaded))
+        self.assertRegex(self.__queries[2], r"^COPY INTO schema.test FROM @TMP_STAGE "
+                                            r"FILES = \('schema__test/hdm_\S+_1\.parquet'\) "
+                                            r"FILE_FORMAT = \(TYPE = PARQUET\)")
+        self.assertEqual(5000, self.__record_count())
+
+        # the stage is created once
+        sink.produce(data_frame=self.__df)
+        self.assertEqual(5, len(self.__queries))
+        self.assertTrue(self.__queries[3].startswith('PUT'))
+
+    def test_invalid_conf(self):
+        with self.assertRaises(ValueError):
+            self.__sink(max_file_size=0)
+        with self.assertRaises(ValueError):
+            self.__sink(compression='lz4')
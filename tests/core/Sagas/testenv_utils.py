@@ -15,13 +15,26 @@
 # Name of testing directory created for ingesting files
 # from unittest import TestCase
 import os
+import unittest
 from distutils.util import strtobool
 from typing import Union
+from unittest.mock import MagicMock, PropertyMock, patch
 import pandas as pd
 from sqlalchemy import schema, Table, Column, Text
+from hdm.core.dao.sqlite import SqLite
 from hdm.core.state_management.state_manager import StateManager
 from hdm.data_link_builder import DataLinkBuilder
 
+# Decorator running a test class against the moto S3 stand-in, which skips it when moto is not installed
+try:
+    from moto import mock_aws as mock_s3
+except ImportError:
+    try:
+        # moto 4 - moto 5 needs Python 3.8
+        from moto import mock_s3
+    except ImportError:
+        mock_s3 = unittest.skip("moto is not installed")
+
 
 class TestEnvUtils:
     PATH = os.path.dirname(os.path.realpath(__file__))
@@ -64,6 +77,9 @@ class TestEnvUtils:
     if not TEST_DB_NAME:
         TEST_DB_NAME = 'hdm'
 
+    # State manager table of the state-manager-sqlite connection
+    SM_TABLE_NAME = 'state_manager'
+
     @classmethod
     def create_test_env(cls):
         test_dir = os.path.abspath(cls.TEST_DIR)
@@ -163,6 +179,8 @@ class TestEnvUtils:
         try:
             with sqlite_connection.connection as conn:
                 conn.execute(f"DROP TABLE if exists {table_name}")
+                conn.execute(f"DROP TABLE if exists {table_name}_schema_version")
+                conn.execute(f"DROP TABLE if exists {table_name}_processed_files")
         finally:
             db_path = os.path.join(cls.PATH, f"{cls.TEST_DB_NAME}.db")
             if remove_sqlite_db and os.path.exists(db_path):
@@ -171,6 +189,43 @@ class TestEnvUtils:
                 except Exception:
                     raise ResourceWarning
 
+    @classmethod
+    def set_up_state_manager(cls,
+                             test_name: str,
+                             source_name: Union[str, None],
+                             source_type: Union[str, None],
+                             sink_type: Union[str, None]) -> tuple:
+        """
+        Create the state manager table of the state-manager-sqlite connection, and the state manager of a test, sinking
+        to test_name. Drop the table with delete_sm_table_sqlite.
+        Returns: (sqlite connection, state manager)
+        """
+        cls.set_environment_variables()
+        sqlite_connection = SqLite(connection='state-manager-sqlite')
+        cls.create_sm_table_sqlite(sqlite_connection, cls.SM_TABLE_NAME)
+        state_manager = cls.get_state_manager_details(StateManager.generate_id(), source_name, source_type, test_name,
+                                                      sink_type)
+        return sqlite_connection, state_manager
+
+    @classmethod
+    def get_states(cls, sqlite_connection, columns: str) -> list:
+        """
+        Read columns of the states of the state manager table, as lists, in the order they were sunk.
+        """
+        with sqlite_connection.connection as conn:
+            return pd.read_sql(f"SELECT {columns} FROM {cls.SM_TABLE_NAME} ORDER BY sinking_start_time",
+                               conn).values.tolist()
+
+    @classmethod
+    def patch_property(cls, dao_type: type, name: str = 'connection') -> tuple:
+        """
+        Patch a property of a DAO class, e.g. its connection, with a MagicMock that is its own context manager.
+        Returns: (patcher, to start and stop, MagicMock)
+        """
+        mock = MagicMock()
+        mock.__enter__.return_value = mock
+        return patch.object(dao_type, name, new_callable=PropertyMock, return_value=mock), mock
+
     @classmethod
     def get_state_manager_details(cls,
                                   job_id: str,
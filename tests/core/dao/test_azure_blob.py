@@ -0,0 +1,70 @@
+# Copyright © 2020 Hashmap, Inc
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+from unittest import TestCase
+from unittest.mock import patch
+
+from azure.storage.blob import BlobServiceClient
+
+from hdm.core.dao.azure_blob import AzureBLOB
+from tests.core.Sagas.testenv_utils import TestEnvUtils
+
+
+class TestAzureBLOB(TestCase):
+
+    def setUp(self) -> None:
+        TestEnvUtils.set_environment_variables()
+        # Start from an empty cache, and no container known to exist
+        self.__patches = [patch.dict(AzureBLOB._AzureBLOB__clients, clear=True),
+                          patch.object(AzureBLOB, '_AzureBLOB__containers', set()),
+                          patch.object(AzureBLOB, '_test_blob_container_existence', autospec=True,
+                                       return_value=True)]
+        self.__container_checks = [p.start() for p in self.__patches][-1]
+
+    def tearDown(self) -> None:
+        for p in reversed(self.__patches):
+            p.stop()
+
+    def test_client_cached_per_connection(self):
+        with patch('hdm.core.dao.azure_blob.BlobServiceClient', wraps=BlobServiceClient) as client_class:
+            containers = [AzureBLOB(connection='azure-test').container for _ in range(3)]
+
+        self.assertEqual(1, client_class.call_count)
+        self.assertEqual(1, self.__container_checks.call_count)
+        self.assertEqual({'hdm-test'}, {container.container_name for container in containers})
+
+    def test_container_checked_per_container(self):
+        AzureBLOB(connection='azure-test').connection
+        AzureBLOB(connection='azure-test', container='other').connection
+        AzureBLOB(connection='azure-test', container='other').connection
+
+        self.assertEqual(2, self.__container_checks.call_count)
+
+    def test_transport_shared_and_left_open(self):
+        with AzureBLOB(connection='azure-test').connection as client:
+            transport = client._pipeline._transport
+        with AzureBLOB(connection='azure-test', container='other').connection as client:
+            self.assertIs(transport, client._pipeline._transport)
+
+        # closing a client leaves the pool of the process open
+        self.assertIsNotNone(transport.session)
+
+    def test_client_per_transfer_settings(self):
+        default = AzureBLOB(connection='azure-test').connection
+        blocks = AzureBLOB(connection='azure-test', max_block_size=1024, max_single_put_size=1024).connection
+
+        self.assertIsNot(default, blocks)
+        self.assertEqual(1024, blocks._config.max_block_size)
+        self.assertIs(default._pipeline._transport, blocks._pipeline._transport)
+        self.assertIs(blocks, AzureBLOB(connection='azure-test', max_block_size=1024,
+                                        max_single_put_size=1024).connection)
@@ -12,9 +12,15 @@
 # See the License for the specific language governing permissions and
 # limitations under the License.
 import unittest
+from datetime import datetime, timezone
 from unittest import TestCase
+from unittest.mock import MagicMock, patch
 
 from hdm.core.dao.snowflake import Snowflake
+from hdm.core.dao.snowflake_azure_copy import SnowflakeAzureCopy
+from hdm.core.dao.snowflake_copy import SnowflakeCopy
+from hdm.core.dao.snowflake_s3_copy import SnowflakeS3Copy
+from tests.core.Sagas.testenv_utils import TestEnvUtils
 
 
 class TestSnowflake(TestCase):
@@ -51,3 +57,162 @@ class TestSnowflake(TestCase):
         with self._dao.connection as conn:
             result = conn.execute("select 1+1")
             self.assertEqual(result.fetchone()[0], 2)
+
+
+class TestSnowflakePool(TestCase):
+
+    def setUp(self) -> None:
+        TestEnvUtils.set_environment_variables()
+        # Start from empty pools, the sessions opened are mocks
+        self.__sessions = []
+        self.__patches = [patch.dict(Snowflake._Snowflake__pools, clear=True),
+                          patch.dict(Snowflake._Snowflake__profiles, clear=True),
+                          patch('hdm.core.dao.snowflake.connector.connect', side_effect=self.__connect)]
+        for p in self.__patches:
+            p.start()
+
+    def tearDown(self) -> None:
+        for p in reversed(self.__patches):
+            p.stop()
+
+    def __connect(self, **kwargs):
+        session = MagicMock()
+        session.is_closed.return_value = False
+        session._session_parameters = {}
+        session.cursor.return_value.__enter__.return_value.fetchone.return_value = (1,)
+        self.__sessions.append(session)
+        return session
+
+    def test_session_reused(self):
+        for _ in range(3):
+            with Snowflake(connection='snowflake-test').connection as conn:
+                conn.cursor().execute("SELECT 2")
+
+        self.assertEqual(1, len(self.__sessions))
+        self.assertEqual(3, self.__sessions[0].commit.call_count)
+        self.assertFalse(self.__sessions[0].close.called)
+        # no check of a session that has not been idle
+        self.assertFalse(self.__sessions[0].cursor.return_value.__enter__.called)
+
+    def test_session_rolled_back_on_error(self):
+        with self.assertRaises(RuntimeError):
+            with Snowflake(connection='snowflake-test').connection:
+                raise RuntimeError()
+        with Snowflake(connection='snowflake-test').connection as conn:
+            self.assertIs(self.__sessions[0], conn)
+
+        self.assertEqual(1, self.__sessions[0].rollback.call_count)
+
+    def test_idle_session_checked(self):
+        with Snowflake(connection='snowflake-test').connection:
+            pass
+        self.__sessions[0].cursor.return_value.__enter__.return_value.execute.side_effect = RuntimeError()
+
+        with patch.object(Snowflake, 'HEALTH_CHECK_IDLE', 0):
+            with Snowflake(connection='snowflake-test').connection as conn:
+                self.assertIs(self.__sessions[1], conn)
+
+        self.assertTrue(self.__sessions[0].close.called)
+
+    def test_pools_closed(self):
+        dao = Snowflake(connection='snowflake-test')
+        with dao.connection, dao.connection:
+            pass
+
+        Snowflake._close_pools()
+        self.assertEqual(2, len(self.__sessions))
+        self.assertTrue(all(session.close.called for session in self.__sessions))
+        with dao.connection as conn:
+            self.assertIs(self.__sessions[2], conn)
+
+    def test_concurrent_sessions(self):
+        dao = Snowflake(connection='snowflake-test')
+        with dao.connection as first, dao.connection as second:
+            self.assertIsNot(first, second)
+        with dao.connection as conn:
+            self.assertIn(conn, self.__sessions)
+
+        self.assertEqual(2, len(self.__sessions))
+
+    def __stage_statements(self, dao: SnowflakeCopy, stage_exists: bool) -> list:
+        """
+        Take a session for the dao, and return the statements run to provision its stage.
+        """
+        with patch.object(SnowflakeCopy, '_SnowflakeCopy__stages', {}) as stages:
+            with dao.connection as conn:
+                cursor = conn.cursor.return_value
+                cursor.fetchone.return_value = ('TMP_STAGE',) if stage_exists else None
+            stages.clear()
+            cursor.execute.reset_mock()
+            with dao.connection:
+                pass
+        return [call.args[0] for call in cursor.execute.call_args_list]
+
+    def test_stage_provisioned_once(self):
+        with patch.object(SnowflakeCopy, '_SnowflakeCopy__stages', {}), \
+                patch.object(SnowflakeAzureCopy, '_stage_not_exist', autospec=True, return_value=True) as not_exist, \
+                patch.object(SnowflakeAzureCopy, '_create_stage', autospec=True, return_value=None) as create_stage:
+            for _ in range(3):
+                with SnowflakeAzureCopy(connection='snowflake-test', stage_directory='data',
+                                        stage_name='TMP_STAGE').connection:
+                    pass
+
+        self.assertEqual(1, not_exist.call_count)
+        self.assertEqual(1, create_stage.call_count)
+
+    def test_azure_stage(self):
+        dao = SnowflakeAzureCopy(connection='snowflake-test', stage_directory='data', stage_name='TMP_STAGE')
+        with patch.object(SnowflakeAzureCopy, '_get_stage_profile',
+                          return_value={'url': 'https://account.blob.core.windows.net/', 'sas': 'sv=1&sig=2'}):
+            self.assertEqual(["SHOW STAGES LIKE 'TMP_STAGE'"], self.__stage_statements(dao, stage_exists=True))
+            statements = self.__stage_statements(dao, stage_exists=False)
+
+        self.assertEqual("CREATE STAGE IF NOT EXISTS TMP_STAGE URL = 'azure://account.blob.core.windows.net/data' "
+                         "CREDENTIALS = ( AZURE_SAS_TOKEN = 'sv=1&sig=2')", statements[-1])
+
+    def test_s3_stage(self):
+        dao = SnowflakeS3Copy(connection='snowflake-test', stage_directory='bucket/data', stage_name='TMP_STAGE',
+                              stage_env='s3-moto')
+        statements = self.__stage_statements(dao, stage_exists=False)
+
+        self.assertEqual("CREATE STAGE IF NOT EXISTS TMP_STAGE URL = 's3://bucket/data/' "
+                         "CREDENTIALS = ( AWS_KEY_ID = 'testing' AWS_SECRET_KEY = 'testing' )", statements[-1])
+        # long-term keys of a stage that exists are not replaced
+        self.assertEqual(["SHOW STAGES LIKE 'TMP_STAGE'"], self.__stage_statements(dao, stage_exists=True))
+
+    def test_s3_stage_temporary_credentials(self):
+        dao = SnowflakeS3Copy(connection='snowflake-test', stage_directory='bucket/data', stage_name='TMP_STAGE',
+                              stage_env='s3-moto')
+        with patch('hdm.core.dao.snowflake_s3_copy.S3') as s3:
+            credentials = s3.return_value.connection.get_credentials.return_value.get_frozen_credentials.return_value
+            credentials.access_key, credentials.secret_key, credentials.token = 'key', 'secret', 'token'
+            statements = self.__stage_statements(dao, stage_exists=True)
+
+        self.assertEqual(["SHOW STAGES LIKE 'TMP_STAGE'",
+                          "ALTER STAGE TMP_STAGE SET CREDENTIALS = ( AWS_KEY_ID = 'key' AWS_SECRET_KEY = 'secret' "
+                          "AWS_TOKEN = 'token' )"], statements)
+
+    def test_s3_stage_credentials_refreshed_when_expired(self):
+        dao = SnowflakeS3Copy(connection='snowflake-test', stage_directory='bucket/data', stage_name='TMP_STAGE',
+                              stage_env='s3-moto')
+        with patch.object(SnowflakeCopy, '_SnowflakeCopy__stages', {}), \
+                patch('hdm.core.dao.snowflake_s3_copy.S3') as s3, \
+                patch('hdm.core.dao.snowflake_copy.time.time') as now:
+            credentials = s3.return_value.connection.get_credentials.return_value
+            credentials._expiry_time = datetime(2030, 1, 1, tzinfo=timezone.utc)
+            frozen = credentials.get_frozen_credentials.return_value
+            frozen.access_key, frozen.secret_key, frozen.token = 'key', 'secret', 'token'
+            expiry = credentials._expiry_time.timestamp() - SnowflakeS3Copy.CREDENTIALS_REFRESH_MARGIN
+
+            statements = []
+            for now.return_value in [expiry - 60, expiry - 1, expiry]:
+                with dao.connection as conn:
+                    cursor = conn.cursor.return_value
+                    cursor.fetchone.return_value = ('TMP_STAGE',)
+                statements.extend(call.args[0] for call in cursor.execute.call_args_list)
+                cursor.execute.reset_mock()
+
+        # replaced when first used, and again once they are about to expire
+        self.assertEqual(["SHOW STAGES LIKE 'TMP_STAGE'", 'ALTER STAGE', 'ALTER STAGE'],
+                         [statement[:11] if statement.startswith('ALTER') else statement for statement in statements])
+
@@ -12,11 +12,40 @@
 # See the License for the specific language governing permissions and
 # limitations under the License.
 import os
+import threading
+import time
 
+from hdm.core.error.hdm_error import HDMError
 from hdm.core.orchestrator.batch_orchestrator import BatchOrchestrator
 from tests.hdm_test_case import HDMTestCase
 
 
+class _TimedLink:
+    """Stands in for a DataLink and records how many links were running at once."""
+    lock = threading.Lock()
+    running = 0
+    max_running = 0
+    finished = []
+
+    def __init__(self, name, pressureless=False, fail=False):
+        self.name = name
+        self.pressureless = pressureless
+        self.wall_time = None
+        self.__fail = fail
+
+    def run(self):
+        with _TimedLink.lock:
+            _TimedLink.running += 1
+            _TimedLink.max_running = max(_TimedLink.max_running, _TimedLink.running)
+        time.sleep(0.05)
+        with _TimedLink.lock:
+            _TimedLink.running -= 1
+            _TimedLink.finished.append(self.name)
+        self.wall_time = 0.05
+        if self.__fail:
+            raise RuntimeError(self.name)
+
+
 class TestBatchOrchestrator(HDMTestCase):
     def setUp(self) -> None:
         super().setUp()
@@ -44,4 +73,32 @@ class TestBatchOrchestrator(HDMTestCase):
 
         self.assertIsInstance(orchestrator, BatchOrchestrator)
 
+    def test_run_pipelines_bounded_concurrency(self):
+        os.environ['HDM_MANIFEST'] = os.path.join(os.getenv('HDM_MANIFESTS'), 'batch_example_1.yml')
+        orchestrator = BatchOrchestrator(back_pressure_factor=3)
+        self.assertEqual(len(orchestrator._data_links), 2)
+        self.assertFalse(any(link.pressureless for link in orchestrator._data_links))
+
+        _TimedLink.max_running = 0
+        _TimedLink.finished = []
+        orchestrator._data_links = [_TimedLink(f"link_{i}") for i in range(9)] + [_TimedLink("declared", pressureless=True)]
+        orchestrator.run_pipelines()
 
+        self.assertEqual(_TimedLink.max_running, 3)
+        self.assertEqual(len(_TimedLink.finished), 10)
+        self.assertEqual(_TimedLink.finished[-1], "declared")
+
+    def test_run_pipelines_reports_failures(self):
+        os.environ['HDM_MANIFEST'] = os.path.join(os.getenv('HDM_MANIFESTS'), 'batch_example_1.yml')
+        orchestrator = BatchOrchestrator(back_pressure_factor=2)
+
+        _TimedLink.finished = []
+        orchestrator._data_links = [_TimedLink("ok_1"), _TimedLink("bad", fail=True), _TimedLink("ok_2")]
+        with self.assertRaises(HDMError):
+            orchestrator.run_pipelines()
+        self.assertEqual(len(_TimedLink.finished), 3)
+
+    def test_invalid_back_pressure_factor(self):
+        os.environ['HDM_MANIFEST'] = os.path.join(os.getenv('HDM_MANIFESTS'), 'batch_example_1.yml')
+        with self.assertRaises(HDMError):
+            BatchOrchestrator(back_pressure_factor=0)
@@ -0,0 +1,193 @@
+# Copyright © 2020 Hashmap, Inc
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+import os
+from unittest import TestCase
+from unittest.mock import patch
+
+import pandas as pd
+
+from hdm.core.dao.sqlite import SqLite
+from hdm.core.state_management.sqlite_state_manager import SqLiteStateManager
+from hdm.core.state_management.state_manager import StateManager
+from tests.core.Sagas.testenv_utils import TestEnvUtils
+
+
+class TestStateManager(TestCase):
+
+    def setUp(self) -> None:
+        TestEnvUtils.set_environment_variables()
+        self.__conn = SqLite(connection='state-manager-sqlite')
+        self.__sm_table_name = 'state_manager'
+        TestEnvUtils.create_sm_table_sqlite(self.__conn, self.__sm_table_name)
+
+    def tearDown(self) -> None:
+        TestEnvUtils.delete_sm_table_sqlite(self.__conn, self.__sm_table_name)
+
+    def __state_manager(self, **conf) -> StateManager:
+        state_manager = SqLiteStateManager(connection='state-manager-sqlite', **conf)
+        state_manager.job_id = StateManager.generate_id()
+        state_manager.run_id = StateManager.generate_id()
+        state_manager.manifest_name = self._testMethodName
+        state_manager.source = {'name': 'fs_source', 'type': 'FSSource'}
+        state_manager.sink = {'name': 'fs_sink', 'type': 'FSSink'}
+        return state_manager
+
+    def __rows(self) -> pd.DataFrame:
+        with self.__conn.connection as conn:
+            return pd.read_sql(f"SELECT * FROM {self.__sm_table_name} ORDER BY source_entity", con=conn)
+
+    def __source(self, state_manager: StateManager, entity: str) -> dict:
+        state = state_manager.insert_state(source_entity=entity, source_filter=[{'seq': '1'}],
+                                           action='sourcing pre-pull', status='in_progress')
+        return state_manager.update_state(source_entity=entity, source_filter=[{'seq': '1'}],
+                                          action='sourcing post-pull', state_id=state['state_id'], status='success',
+                                          record_count=10, last_record_pulled=f'ID:{entity}')
+
+    def test_synchronous(self):
+        state_manager = self.__state_manager()
+        self.__source(state_manager, 'a.csv')
+
+        rows = self.__rows()
+        self.assertEqual(1, rows.shape[0])
+        self.assertEqual('sourcing post-pull', rows['action'][0])
+
+    def test_write_behind_reads_buffered_state(self):
+        state_manager = self.__state_manager(write_behind=True, flush_size=10, flush_interval=60)
+        state = self.__source(state_manager, 'a.csv')
+
+        self.assertTrue(self.__rows().empty)
+        self.assertEqual(state['state_id'], state_manager.get_current_state('a.csv', [{'seq': '1'}])['state_id'])
+        self.assertIsNone(state_manager.get_current_state('a.csv', [{'seq': '2'}]))
+        self.assertEqual('ID:a.csv', state_manager.get_last_record('a.csv'))
+
+        state_manager.flush()
+        rows = self.__rows()
+        self.assertEqual(1, rows.shape[0])
+        self.assertEqual(['sourcing post-pull', 'success', '10'],
+                         [rows['action'][0], rows['status'][0], rows['row_count'][0]])
+
+    def test_write_behind_flush_size(self):
+        state_manager = self.__state_manager(write_behind=True, flush_size=3, flush_interval=60)
+        state = self.__source(state_manager, 'a.csv')
+        self.__source(state_manager, 'b.csv')
+        self.assertTrue(self.__rows().empty)
+
+        # the third state buffered flushes, its update is buffered again
+        self.__source(state_manager, 'c.csv')
+        rows = self.__rows()
+        self.assertEqual(['a.csv', 'b.csv', 'c.csv'], rows['source_entity'].tolist())
+        self.assertEqual(['sourcing post-pull', 'sourcing post-pull', 'sourcing pre-pull'], rows['action'].tolist())
+
+        # flushed states are updated in place
+        state_manager.update_state(source_entity='a.csv', source_filter=[{'seq': '1'}], action='sinking post-push',
+                                   state_id=state['state_id'], status='success', record_count=10)
+        state_manager.flush()
+        rows = self.__rows()
+        self.assertEqual(['a.csv', 'b.csv', 'c.csv'], rows['source_entity'].tolist())
+        self.assertEqual(['sinking post-push', 'sourcing post-pull', 'sourcing post-pull'], rows['action'].tolist())
+
+    def test_write_behind_processing_history(self):
+        state_manager = self.__state_manager(write_behind=True, flush_size=10, flush_interval=60)
+        self.__source(state_manager, 'a.csv')
+        self.assertEqual([['a.csv']], state_manager.get_processing_history())
+
+    def test_invalid_flush_size(self):
+        with self.assertRaises(ValueError):
+            self.__state_manager(write_behind=True, flush_size=0)
+
+    def test_git_sha_override(self):
+        state_manager = self.__state_manager(git_sha='abc1234')
+        self.__source(state_manager, 'a.csv')
+        self.assertEqual('abc1234', self.__rows()['git_sha'][0])
+
+    def test_git_sha_resolved_once_per_process(self):
+        with patch.object(StateManager, '_StateManager__process_git_sha', None), \
+                patch('hdm.core.state_management.state_manager.git.Repo') as repo:
+            repo.return_value.git.rev_parse.return_value = 'def5678'
+            for entity in ['a.csv', 'b.csv']:
+                self.__source(self.__state_manager(), entity)
+
+            self.assertEqual(1, repo.call_count)
+            self.assertEqual(['def5678', 'def5678'], self.__rows()['git_sha'].tolist())
+
+    def test_git_sha_from_environment(self):
+        with patch.object(StateManager, '_StateManager__process_git_sha', None), \
+                patch.dict(os.environ, {'HDM_GIT_SHA': '0123abc'}), \
+                patch('hdm.core.state_management.state_manager.git.Repo') as repo:
+            self.__source(self.__state_manager(), 'a.csv')
+
+            repo.assert_not_called()
+            self.assertEqual('0123abc', self.__rows()['git_sha'][0])
+
+    def test_migrates_unindexed_table(self):
+        # setUp creates the table as schema version 1, without keys or indexes
+        self.__state_manager()
+        with self.__conn.connection as conn:
+            indexes = {row[1] for row in conn.execute(f"PRAGMA index_list({self.__sm_table_name})")}
+            versions = conn.execute(f"SELECT version FROM {self.__sm_table_name}_schema_version "
+                                    f"ORDER BY version").fetchall()
+        self.assertEqual({'ux_state_manager_state_id', 'ix_state_manager_job_entity',
+                          'ix_state_manager_manifest_entity', 'ix_state_manager_source_manifest'}, indexes)
+        self.assertEqual([(version,) for version in range(2, StateManager.SCHEMA_VERSION + 1)], versions)
+
+        # an up to date table is not migrated again
+        self.__state_manager()
+        with self.__conn.connection as conn:
+            versions = conn.execute(f"SELECT version FROM {self.__sm_table_name}_schema_version "
+                                    f"ORDER BY version").fetchall()
+        self.assertEqual([(version,) for version in range(2, StateManager.SCHEMA_VERSION + 1)], versions)
+
+    def test_current_state_lookup_uses_index(self):
+        self.__state_manager()
+        with self.__conn.connection as conn:
+            plan = conn.execute(f"EXPLAIN QUERY PLAN SELECT * FROM {self.__sm_table_name} WHERE job_id='a' "
+                                f"and source_entity='b' and source_filter='c'").fetchall()
+        self.assertIn('ix_state_manager_job_entity', str(plan))
+
+    def test_processed_files(self):
+        state_manager = self.__state_manager()
+        state_manager.record_processed_file('ADMIN__TEST1', 'a.csv', 10, 100)
+
+        self.assertEqual({'a.csv'}, state_manager.get_processed_files('ADMIN__TEST1', {'a.csv': (10, 100),
+                                                                                       'b.csv': (10, 100)}))
+        # changed since, or at another location
+        self.assertEqual(set(), state_manager.get_processed_files('ADMIN__TEST1', {'a.csv': (20, 200)}))
+        self.assertEqual(set(), state_manager.get_processed_files('ADMIN__TEST2', {'a.csv': (10, 100)}))
+
+        state_manager.record_processed_file('ADMIN__TEST1', 'a.csv', 20, 200)
+        self.assertEqual({'a.csv'}, state_manager.get_processed_files('ADMIN__TEST1', {'a.csv': (20, 200)}))
+
+    def test_write_behind_processed_files(self):
+        state_manager = self.__state_manager(write_behind=True, flush_size=10, flush_interval=60)
+        self.__source(state_manager, 'a.csv')
+        state_manager.record_processed_file('.', 'a.csv', 10, 100)
+
+        # buffered with its state, and read back before it is written
+        self.assertEqual({'a.csv'}, state_manager.get_processed_files('.', {'a.csv': (10, 100)}))
+        self.assertEqual(set(), self.__state_manager().get_processed_files('.', {'a.csv': (10, 100)}))
+
+        state_manager.flush()
+        self.assertEqual(1, self.__rows().shape[0])
+        self.assertEqual({'a.csv'}, self.__state_manager().get_processed_files('.', {'a.csv': (10, 100)}))
+
+    def test_processed_files_seeded_with_history(self):
+        # sourced before the processed file index existed
+        with self.__conn.connection as conn:
+            conn.execute(f"INSERT INTO {self.__sm_table_name} (state_id, source_name, manifest_name, source_entity) "
+                         f"VALUES ('1', 'fs_source', '{self._testMethodName}', 'a.csv')")
+        state_manager = self.__state_manager()
+
+        self.assertEqual({'a.csv'}, state_manager.get_processed_files('.', {'a.csv': (10, 100), 'b.csv': (10, 100)}))
+        # from now on recorded at its location
+        self.assertEqual(set(), state_manager.get_processed_files('.', {'a.csv': (20, 200)}))
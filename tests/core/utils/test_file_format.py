@@ -0,0 +1,66 @@
+# Copyright © 2020 Hashmap, Inc
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+import gzip
+import io
+from unittest import TestCase
+
+import pandas as pd
+
+from hdm.core.utils.file_format import FileFormat
+
+
+class TestFileFormat(TestCase):
+
+    def test_extension(self):
+        self.assertEqual('.csv', FileFormat.extension('csv'))
+        self.assertEqual('.csv.gz', FileFormat.extension('csv', 'gzip'))
+        self.assertEqual('.csv.zst', FileFormat.extension('CSV', 'ZSTD'))
+        self.assertEqual('.parquet', FileFormat.extension('parquet', 'snappy'))
+
+    def test_extension_unknown(self):
+        with self.assertRaises(ValueError):
+            FileFormat.extension('avro')
+        with self.assertRaises(ValueError):
+            FileFormat.extension('csv', 'bz2')
+
+    def test_detect(self):
+        self.assertEqual(('csv', None), FileFormat.detect('hdm_1.csv'))
+        self.assertEqual(('csv', None), FileFormat.detect('tmp_file_1.txt'))
+        self.assertEqual(('csv', 'gzip'), FileFormat.detect('hdm_1.csv.gz'))
+        self.assertEqual(('csv', 'zstd'), FileFormat.detect('hdm_1.csv.zst'))
+        self.assertEqual(('parquet', None), FileFormat.detect('hdm_1.parquet'))
+
+    def test_with_extension(self):
+        self.assertEqual('hdm_1', FileFormat.strip_extension('hdm_1.csv.gz'))
+        self.assertEqual('hdm_1.parquet', FileFormat.with_extension('hdm_1.csv', 'parquet'))
+        self.assertEqual('hdm_1.csv.zst', FileFormat.with_extension('hdm_1.parquet', 'csv', 'zstd'))
+
+    def test_encode_data_frame(self):
+        df = pd.DataFrame({'ID': range(25), 'NAME': [f'name_{i}' for i in range(25)]})
+
+        encoded = list(FileFormat.encode_data_frame(df, row_group_size=10))
+        self.assertEqual(3, len(encoded))
+        self.assertEqual(df.to_csv(index=False).encode(), b''.join(encoded))
+
+        encoded = b''.join(FileFormat.encode_data_frame(df, compression='gzip', row_group_size=10))
+        self.assertEqual(df.to_csv(index=False).encode(), gzip.decompress(encoded))
+
+        encoded = b''.join(FileFormat.encode_data_frame(df, file_format='parquet', row_group_size=10))
+        self.assertTrue(df.equals(pd.read_parquet(io.BytesIO(encoded))))
+
+    def test_open_encoded(self):
+        df = pd.DataFrame({'ID': range(25), 'NAME': [f'name_{i}' for i in range(25)]})
+        with FileFormat.open_encoded(df, row_group_size=10) as stream:
+            data = stream.read(7) + stream.read()
+        self.assertEqual(df.to_csv(index=False).encode(), data)
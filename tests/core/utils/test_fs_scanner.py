@@ -0,0 +1,71 @@
+# Copyright © 2020 Hashmap, Inc
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+import os
+import shutil
+import tempfile
+import time
+from unittest import TestCase
+
+from hdm.core.utils.fs_scanner import FSScanner
+
+
+class TestFSScanner(TestCase):
+
+    def setUp(self) -> None:
+        self.__test_directory = tempfile.mkdtemp()
+        # name -> seconds since modified
+        self.__files = {'b.csv': 300, 'a.csv': 100, 'c.tmp': 200, 'ADMIN__TEST2/d.csv': 400,
+                        'ADMIN__TEST1/e.csv': 0, 'ADMIN__TEST1/sub/f.csv': 500}
+        now = time.time()
+        for name, age in self.__files.items():
+            path = os.path.join(self.__test_directory, name)
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+            with open(path, 'wb') as file:
+                file.write(name.encode())
+            os.utime(path, (now - age, now - age))
+
+    def tearDown(self) -> None:
+        shutil.rmtree(self.__test_directory)
+
+    def __scan(self, **conf) -> list:
+        return [(os.path.relpath(path, self.__test_directory), list(files))
+                for path, files in FSScanner(**conf).scan(self.__test_directory)]
+
+    def test_scan(self):
+        self.assertEqual([('.', ['a.csv', 'b.csv', 'c.tmp']),
+                          ('ADMIN__TEST1', ['e.csv']),
+                          (os.path.join('ADMIN__TEST1', 'sub'), ['f.csv']),
+                          ('ADMIN__TEST2', ['d.csv'])], self.__scan())
+
+    def test_scan_stats(self):
+        (_, files), *_ = FSScanner().scan(self.__test_directory)
+        stat = os.stat(os.path.join(self.__test_directory, 'a.csv'))
+        self.assertEqual((stat.st_size, stat.st_mtime_ns), files['a.csv'])
+
+    def test_include_exclude(self):
+        self.assertEqual([('.', ['a.csv', 'b.csv']), ('ADMIN__TEST2', ['d.csv'])],
+                         self.__scan(include='*.csv', exclude=['ADMIN__TEST1/*', 'ADMIN__TEST1/*/*']))
+
+    def test_min_age(self):
+        self.assertEqual([('.', ['b.csv']), (os.path.join('ADMIN__TEST1', 'sub'), ['f.csv']),
+                          ('ADMIN__TEST2', ['d.csv'])], self.__scan(min_age=250))
+
+    def test_order_by_mtime(self):
+        self.assertEqual(['b.csv', 'c.tmp', 'a.csv'], self.__scan(order='mtime')[0][1])
+
+    def test_invalid_configuration(self):
+        with self.assertRaises(ValueError):
+            FSScanner(order='size')
+        with self.assertRaises(ValueError):
+            FSScanner(min_age=-1)
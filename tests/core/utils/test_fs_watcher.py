@@ -0,0 +1,85 @@
+# Copyright © 2020 Hashmap, Inc
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+import os
+import shutil
+import sys
+import tempfile
+import threading
+import time
+import unittest
+from unittest import TestCase
+from unittest.mock import patch
+
+from hdm.core.utils.fs_watcher import FSWatcher
+
+
+class TestFSWatcher(TestCase):
+
+    def setUp(self) -> None:
+        self.__test_directory = tempfile.mkdtemp()
+        self.__seen = set()
+
+    def tearDown(self) -> None:
+        shutil.rmtree(self.__test_directory)
+
+    def __scan(self):
+        for root, _, files in os.walk(self.__test_directory):
+            for file in sorted(set(os.path.join(root, file) for file in files) - self.__seen):
+                self.__seen.add(file)
+                yield os.path.relpath(file, self.__test_directory)
+
+    def __land(self, name: str, delay: float) -> threading.Thread:
+        def land():
+            time.sleep(delay)
+            path = os.path.join(self.__test_directory, name)
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+            with open(path, 'w') as file:
+                file.write(name)
+
+        thread = threading.Thread(target=land)
+        thread.start()
+        return thread
+
+    @unittest.skipUnless(sys.platform.startswith('linux'), 'inotify')
+    def test_watch_inotify(self):
+        self.__land('a.csv', 0)
+        self.__land(os.path.join('ADMIN__TEST1', 'b.csv'), 0.3).join()
+
+        start = time.monotonic()
+        landed = self.__land('c.csv', 0.3)
+        results = []
+        for result in FSWatcher(poll_interval=30, watch_timeout=1).watch(self.__test_directory, self.__scan):
+            results.append((result, time.monotonic() - start))
+        landed.join()
+
+        self.assertEqual(['a.csv', os.path.join('ADMIN__TEST1', 'b.csv'), 'c.csv'], [result for result, _ in results])
+        # picked up as it landed, not when polled
+        self.assertLess(results[-1][1], 1)
+
+    def test_watch_polling(self):
+        before_wait = []
+        with patch('hdm.core.utils.fs_watcher.ctypes.CDLL', side_effect=OSError('no inotify')):
+            landed = self.__land('b.csv', 0.2)
+            results = list(FSWatcher(poll_interval=0.1, watch_timeout=0.5).watch(
+                self.__test_directory, self.__scan, before_wait=lambda: before_wait.append(1)))
+            landed.join()
+
+        self.assertEqual(['b.csv'], results)
+        self.assertTrue(before_wait)
+
+    def test_invalid_configuration(self):
+        with self.assertRaises(ValueError):
+            FSWatcher(poll_interval=0)
+        with self.assertRaises(ValueError):
+            FSWatcher(watch_timeout=-1)
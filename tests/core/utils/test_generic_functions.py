@@ -0,0 +1,51 @@
+# Copyright © 2020 Hashmap, Inc
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+import os
+import tempfile
+from unittest import TestCase
+
+from hdm.core.utils.generic_functions import GenericFunctions
+
+
+class TestGenericFunctions(TestCase):
+
+    def setUp(self) -> None:
+        self.__test_directory = tempfile.mkdtemp()
+
+    def tearDown(self) -> None:
+        for file in os.listdir(self.__test_directory):
+            os.remove(os.path.join(self.__test_directory, file))
+        os.rmdir(self.__test_directory)
+
+    def __write(self, content: bytes) -> str:
+        file_name = os.path.join(self.__test_directory, 'test.csv')
+        with open(file_name, 'wb') as file:
+            file.write(content)
+        return file_name
+
+    def test_table_folder_round_trip(self):
+        self.assertEqual('ADMIN__TEST1', GenericFunctions.table_to_folder('ADMIN.TEST1'))
+        self.assertEqual('ADMIN.TEST1', GenericFunctions.folder_to_table('ADMIN__TEST1'))
+
+    def test_count_records(self):
+        file_name = self.__write(b'a,b\n1,2\n3,4\n')
+        self.assertEqual(2, GenericFunctions.count_records(file_name))
+        self.assertEqual(3, GenericFunctions.count_records(file_name, header=False))
+
+    def test_count_records_unterminated_last_line(self):
+        file_name = self.__write(b'a,b\r\n1,2\r\n3,4')
+        self.assertEqual(2, GenericFunctions.count_records(file_name, buffer_size=3))
+
+    def test_count_records_empty_file(self):
+        self.assertEqual(0, GenericFunctions.count_records(self.__write(b'')))
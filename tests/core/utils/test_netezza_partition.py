@@ -0,0 +1,67 @@
+# Copyright © 2020 Hashmap, Inc
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+import sqlite3
+from unittest import TestCase
+
+from hdm.core.utils.netezza_partition import NetezzaPartition
+
+
+class TestNetezzaPartition(TestCase):
+
+    def test_dataslice(self):
+        predicates = NetezzaPartition.predicates({'method': 'dataslice', 'count': 3}, 'ADMIN.TEST1')
+        self.assertEqual(predicates, ['MOD(DATASLICEID, 3) = 0', 'MOD(DATASLICEID, 3) = 1', 'MOD(DATASLICEID, 3) = 2'])
+
+    def test_hash(self):
+        predicates = NetezzaPartition.predicates({'method': 'HASH', 'column': 'ID', 'count': 2}, 'ADMIN.TEST1')
+        self.assertEqual(predicates, ['(MOD(ABS(hash4(ID)), 2) = 0 OR ID IS NULL)', 'MOD(ABS(hash4(ID)), 2) = 1'])
+
+    def test_hash_covers_every_row(self):
+        conn = sqlite3.connect(':memory:')
+        # hash4 of the Netezza SQL Extensions toolkit, NULL for NULL
+        conn.create_function('hash4', 1, lambda v: None if v is None else v * 2654435761 % 2 ** 32 - 2 ** 31)
+        conn.create_function('MOD', 2, lambda value, count: None if value is None else value % count)
+        conn.execute('CREATE TABLE T (ID INT)')
+        conn.executemany('INSERT INTO T VALUES (?)', [(i,) for i in range(100)] + [(None,), (None,)])
+        predicates = NetezzaPartition.predicates({'method': 'hash', 'column': 'ID', 'count': 3}, 'T')
+        counts = [conn.execute(f'SELECT COUNT(*) FROM T WHERE {predicate}').fetchone()[0] for predicate in predicates]
+        self.assertEqual(sum(counts), 102)
+
+    def test_range_with_bounds(self):
+        predicates = NetezzaPartition.predicates({'method': 'range', 'column': 'ID', 'count': 4,
+                                                  'lower_bound': 0, 'upper_bound': 100}, 'ADMIN.TEST1')
+        self.assertEqual(predicates, ['(ID < 25 OR ID IS NULL)', 'ID >= 25 AND ID < 50', 'ID >= 50 AND ID < 75',
+                                      'ID >= 75'])
+
+    def test_range_covers_every_row(self):
+        conn = sqlite3.connect(':memory:')
+        conn.execute('CREATE TABLE T (ID INT)')
+        conn.executemany('INSERT INTO T VALUES (?)', [(i,) for i in range(-5, 1000, 7)] + [(None,)])
+        predicates = NetezzaPartition.predicates({'method': 'range', 'column': 'ID', 'count': 6}, 'T', conn)
+        self.assertEqual(len(predicates), 6)
+        counts = [conn.execute(f'SELECT COUNT(*) FROM T WHERE {predicate}').fetchone()[0] for predicate in predicates]
+        self.assertEqual(sum(counts), conn.execute('SELECT COUNT(*) FROM T').fetchone()[0])
+
+    def test_range_of_empty_table(self):
+        conn = sqlite3.connect(':memory:')
+        conn.execute('CREATE TABLE T (ID INT)')
+        self.assertEqual(NetezzaPartition.predicates({'method': 'range', 'column': 'ID', 'count': 4}, 'T', conn), [None])
+
+    def test_invalid_configuration(self):
+        with self.assertRaises(ValueError):
+            NetezzaPartition.predicates({'method': 'dataslice', 'count': 0}, 'ADMIN.TEST1')
+        with self.assertRaises(ValueError):
+            NetezzaPartition.predicates({'method': 'range', 'count': 2}, 'ADMIN.TEST1')
+        with self.assertRaises(ValueError):
+            NetezzaPartition.predicates({'method': 'round_robin', 'column': 'ID', 'count': 2}, 'ADMIN.TEST1')
@@ -0,0 +1,119 @@
+# Copyright © 2020 Hashmap, Inc
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+import threading
+import time
+from unittest import TestCase
+
+from hdm.data_link import DataLink
+
+
+class _ListSource:
+    def __init__(self, count, delay=0.0):
+        self.__count = count
+        self.__delay = delay
+
+    def consume(self, **kwargs) -> dict:
+        for i in range(self.__count):
+            time.sleep(self.__delay)
+            yield dict(seq=i, skipped=(i == 0))
+
+
+class _ListSink:
+    def __init__(self, delay=0.0, fail_on=None):
+        self.produced = []
+        self.threads = set()
+        self.flushes = 0
+        self.__delay = delay
+        self.__fail_on = fail_on
+
+    def produce(self, **kwargs) -> None:
+        if kwargs['seq'] == self.__fail_on:
+            raise RuntimeError(f"failed on {kwargs['seq']}")
+        time.sleep(self.__delay)
+        self.threads.add(threading.current_thread().name)
+        self.produced.append(kwargs['seq'])
+
+    def flush(self) -> None:
+        self.flushes += 1
+
+
+class _FlushCounter:
+    def __init__(self):
+        self.flushes = 0
+
+    def flush(self) -> None:
+        self.flushes += 1
+
+
+class TestDataLink(TestCase):
+
+    def test_run_serial(self):
+        sink = _ListSink()
+        link = DataLink(source=_ListSource(5), sink=sink)
+        link.run()
+        self.assertFalse(link.pipelined)
+        self.assertEqual(sink.produced, [1, 2, 3, 4])
+        self.assertIsNotNone(link.wall_time)
+
+    def test_run_pipelined(self):
+        sink = _ListSink()
+        link = DataLink(source=_ListSource(5), sink=sink, queue_depth=2)
+        link.run()
+        self.assertTrue(link.pipelined)
+        self.assertEqual(sink.produced, [1, 2, 3, 4])
+        self.assertNotIn(threading.current_thread().name, sink.threads)
+
+    def test_run_pipelined_overlaps_source_and_sink(self):
+        serial = DataLink(source=_ListSource(6, delay=0.05), sink=_ListSink(delay=0.05))
+        serial.run()
+        pipelined = DataLink(source=_ListSource(6, delay=0.05), sink=_ListSink(delay=0.05), queue_depth=2)
+        pipelined.run()
+        self.assertLess(pipelined.wall_time, serial.wall_time)
+
+    def test_run_pipelined_parallel_sinks(self):
+        sinks = [_ListSink(delay=0.01) for _ in range(3)]
+        link = DataLink(source=_ListSource(31), sink=sinks[0], queue_depth=4, parallel_sinks=sinks[1:])
+        link.run()
+        self.assertEqual(sorted(seq for sink in sinks for seq in sink.produced), list(range(1, 31)))
+        self.assertEqual([1, 1, 1], [sink.flushes for sink in sinks])
+
+    def test_run_pipelined_sink_failure(self):
+        link = DataLink(source=_ListSource(50), sink=_ListSink(fail_on=3), queue_depth=1)
+        with self.assertRaises(RuntimeError):
+            link.run()
+        self.assertFalse(link.is_running)
+
+    def test_sink_flushed(self):
+        sink = _ListSink()
+        DataLink(source=_ListSource(5), sink=sink).run()
+        self.assertEqual(1, sink.flushes)
+
+        # what was produced before the failure is still completed
+        sink = _ListSink(fail_on=2)
+        with self.assertRaises(RuntimeError):
+            DataLink(source=_ListSource(5), sink=sink).run()
+        self.assertEqual(1, sink.flushes)
+
+    def test_negative_queue_depth(self):
+        with self.assertRaises(ValueError):
+            DataLink(source=_ListSource(1), sink=_ListSink(), queue_depth=-1)
+
+    def test_state_manager_flushed(self):
+        state_manager = _FlushCounter()
+        DataLink(source=_ListSource(5), sink=_ListSink(), state_manager=state_manager).run()
+        self.assertEqual(1, state_manager.flushes)
+
+        with self.assertRaises(RuntimeError):
+            DataLink(source=_ListSource(5), sink=_ListSink(fail_on=2), state_manager=state_manager).run()
+        self.assertEqual(2, state_manager.flushes)